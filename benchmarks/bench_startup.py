@@ -0,0 +1,111 @@
+"""Benchmark du démarrage à froid : temps jusqu'au premier affichage et jusqu'à la première requête.
+
+    python benchmarks/bench_startup.py --backend memory --runs 5
+
+Chaque mesure part d'un nouvel interpréteur Python (comme un réveil sur
+Streamlit Cloud). « Premier affichage » : formulaire de connexion rendu ;
+« première requête » : première page après connexion rendue, données comprises
+(mesurée à partir de la connexion).
+`--think-time` simule la saisie du mot de passe, pendant laquelle le client
+de stockage est préchauffé en arrière-plan. Le backend `firestore` nécessite
+des identifiants (secrets Streamlit ou serviceAccountKey.json).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "checklists_hygiene.py")
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "firebase_admin", "google.cloud.firestore")
+
+
+def _loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def run_one(started_at, think_time, user):
+    """Une mesure dans l'interpréteur courant ; `started_at` : horloge du parent avant le lancement"""
+    from streamlit.testing.v1 import AppTest
+
+    # Le préchauffage démarre juste après le rendu : on le retient le temps de relever
+    # les modules chargés par le chemin d'affichage lui-même
+    held, start = [], threading.Thread.start
+    threading.Thread.start = lambda thread: held.append(thread) if thread.name == "storage-warmup" else start(thread)
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+        at.run()
+    finally:
+        threading.Thread.start = start
+    first_paint = time.time() - started_at
+    loaded_at_paint = _loaded_heavy_modules()
+    paint_errors = len(at.exception)
+    for thread in held:
+        thread.start()
+
+    time.sleep(think_time)
+    query_started = time.time()
+    at.session_state["logged_in"] = True
+    at.session_state["user"] = user
+    at.run()
+    return {
+        "first_paint_s": round(first_paint, 3),
+        "first_query_s": round(time.time() - query_started, 3),
+        "modules_loaded_at_first_paint": loaded_at_paint,
+        "errors": paint_errors + len(at.exception),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("firestore", "memory", "sqlite"), default="memory")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=2.0, help="secondes entre l'affichage et la connexion")
+    parser.add_argument("--user", default="karima")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--run-one", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, args.think_time, args.user)))
+        return
+
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, CHECKLIST_STORAGE=args.backend,
+                   CHECKLIST_STORAGE_PATH=os.path.join(workdir, "startup.sqlite3"))
+        for i in range(args.runs):
+            started_at = time.time()
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-one", str(started_at),
+                 "--think-time", str(args.think_time), "--user", args.user],
+                capture_output=True, text=True, cwd=workdir, env=env,
+            )
+            if proc.returncode:
+                print(proc.stderr, file=sys.stderr)
+                sys.exit(proc.returncode)
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            print(f"run {i + 1}: {runs[-1]}", file=sys.stderr)
+
+    summary = {
+        "backend": args.backend,
+        "runs": len(runs),
+        "think_time_s": args.think_time,
+        "first_paint_median_s": round(statistics.median(r["first_paint_s"] for r in runs), 3),
+        "first_query_median_s": round(statistics.median(r["first_query_s"] for r in runs), 3),
+        "modules_loaded_at_first_paint": runs[-1]["modules_loaded_at_first_paint"],
+        "errors": sum(r["errors"] for r in runs),
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "runs": runs}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Benchmarks de performance sur un backend local (mémoire ou SQLite), sans projet Firebase.
+
+    python benchmarks/bench_storage.py --backend sqlite --sizes 10000 100000 1000000
+
+Pour chaque volume (un sous-processus par volume, pour une mesure mémoire propre) :
+génération de fiches synthétiques, latence de get_data_with_ids (à froid / à chaud),
+taux de succès du cache partagé, pages d'historique, débit d'export CSV / Parquet,
+mémoire (RSS max) et coût d'un rerun Streamlit par page (AppTest).
+Les résultats sont écrits en JSON (--output) pour suivre les régressions.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "checklists_hygiene.py")
+SEED_CHUNK = 500
+JOURNAL_RATIO = 10  # une note de journal pour 10 fiches
+
+
+def _peak_rss_mb():
+    # ru_maxrss : kilo-octets sous Linux, octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timings(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _timed(func, *args, **kwargs):
+    started = perf_counter()
+    result = func(*args, **kwargs)
+    return result, (perf_counter() - started) * 1000
+
+
+def seed(app, storage, size, days):
+    """Fiches synthétiques réparties sur `days` jours, agrégats et progression compris"""
+    rng = random.Random(42)
+    users = ["vice_major_fadoua", "vice_major_sanae", "hasnae", "karima", "professeur"]
+    statuses_pool = [app.STATUS_OUI] * 18 + [app.STATUS_NON, app.STATUS_NA]
+    now = datetime.now(timezone.utc)
+    step = timedelta(days=days) / size
+
+    ops = []
+    started = perf_counter()
+    for i in range(size):
+        salle = rng.choice(app.ZONES)
+        template = app.zone_template(salle, isolement_active=rng.random() < 0.1)
+        statuses = "".join(rng.choice(statuses_pool) for _ in app.catalogue_labels(template))
+        data = app._build_checklist_data(
+            rng.choice(users), rng.choice(app.TYPES_CHECKLIST), rng.choice(app.SERVICES),
+            salle, template, statuses, "",
+        )
+        ts = now - step * i
+        data.update(date=ts.strftime("%Y-%m-%d"), heure=ts.strftime("%H:%M:%S"), timestamp=ts)
+        doc_id = f"bench{i:08d}"
+        ops.append(("set", "checklists", doc_id, data, False))
+        for collection, derived_id, fields in app._derived_writes("checklists", doc_id, data):
+            ops.append(("set", collection, derived_id, fields, True))
+        if i % JOURNAL_RATIO == 0:
+            ops.append(("set", "journal", f"bench{i:08d}", {
+                "user": data["user"], "date": data["date"], "heure": data["heure"],
+                "message": f"Note de transmission {i}", "timestamp": ts,
+            }, False))
+        if len(ops) >= SEED_CHUNK:
+            storage.commit(ops)
+            ops = []
+    if ops:
+        storage.commit(ops)
+    elapsed = perf_counter() - started
+    return {"seconds": round(elapsed, 2), "docs_per_s": round(size / elapsed)}
+
+
+def bench_reads(app, rounds):
+    """get_data_with_ids sans listener : lecture à froid, puis cache partagé"""
+    app.LIVE_LISTENERS_ENABLED = False
+    app._get_shared_cache.clear()
+
+    cold = [_timed(app.get_data_with_ids, name, limit)[1]
+            for name, limit in (("checklists", app.LIMIT_HISTORY), ("journal", app.LIMIT_JOURNAL_FEED))]
+    warm = [_timed(app.get_data_with_ids, "checklists", app.LIMIT_HISTORY)[1] for _ in range(rounds)]
+
+    # Charge mixte : plusieurs vues, une écriture simulée toutes les 50 lectures
+    app._get_shared_cache.clear()
+    for i in range(rounds):
+        if i % 50 == 49:
+            app._bump_write_version("checklists")
+        app.get_data_with_ids("checklists", app.LIMIT_HISTORY)
+        app.get_data_with_ids("journal", app.LIMIT_JOURNAL_FEED)
+    stats = app.get_cache_stats()
+
+    return {
+        "cold_ms": [round(ms, 3) for ms in cold],
+        "warm": _timings(warm),
+        "cache_hit_ratio": round(stats["hit_ratio"], 4),
+    }
+
+
+def bench_history(app, pages):
+    """Parcours des pages d'historique filtrées (curseur (timestamp, id))"""
+    app._get_shared_cache.clear()
+    samples, cursor = [], None
+    for _ in range(pages):
+        (items, has_more), ms = _timed(app.get_history_page, "checklists", cursor, {"service": app.SERVICES[0]})
+        samples.append(ms)
+        if not has_more:
+            break
+        cursor = app.history_cursor(items[-1])
+    return _timings(samples)
+
+
+def bench_export(app, days):
+    end = datetime.now().date()
+    start = end - timedelta(days=days)
+    results = {}
+    for fmt in ("CSV", "Parquet"):
+        (out, rows), ms = _timed(app.stream_export, "checklists", start, end, fmt)
+        size = out.seek(0, os.SEEK_END) if out is not None else 0
+        if out is not None:
+            out.close()
+        results[fmt] = {
+            "rows": rows,
+            "seconds": round(ms / 1000, 2),
+            "rows_per_s": round(rows / (ms / 1000)) if ms else 0,
+            "bytes": size,
+        }
+    return results
+
+
+def bench_reruns(app):
+    """Coût d'un rerun complet par page du menu (session admin), à froid puis à chaud"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    at.session_state["logged_in"] = True
+    at.session_state["user"] = app.ADMIN_USER
+    at.run()
+    results = {}
+    for page in at.sidebar.radio[0].options:
+        _, cold = _timed(at.sidebar.radio[0].set_value(page).run)
+        _, warm = _timed(at.run)
+        results[page] = {"cold_ms": round(cold, 1), "warm_ms": round(warm, 1), "errors": len(at.exception)}
+    return results
+
+
+def run_one(backend, size, days, rounds, workdir):
+    """Un volume, dans le processus courant (appelé par main via sous-processus)"""
+    os.environ["CHECKLIST_STORAGE"] = backend
+    os.environ["CHECKLIST_STORAGE_PATH"] = (
+        os.path.join(workdir, "bench.sqlite3") if backend == "sqlite" else "bench"
+    )
+    os.chdir(workdir)  # file d'écriture locale hors du dépôt
+    sys.path.insert(0, ROOT)
+    import checklists_hygiene as app
+
+    storage = app.get_storage()
+    result = {"backend": backend, "size": size, "rss_start_mb": _peak_rss_mb()}
+    result["seed"] = seed(app, storage, size, days)
+    result["rss_after_seed_mb"] = _peak_rss_mb()
+    result["get_data_with_ids"] = bench_reads(app, rounds)
+    result["history_pages"] = bench_history(app, pages=10)
+    result["export"] = bench_export(app, days)
+    result["rss_after_export_mb"] = _peak_rss_mb()
+    result["reruns"] = bench_reruns(app)
+    result["rss_peak_mb"] = _peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--days", type=int, default=365, help="période couverte par les fiches générées")
+    parser.add_argument("--rounds", type=int, default=500, help="lectures par mesure de cache")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(json.dumps(run_one(args.backend, args.run_one, args.days, args.rounds, workdir)))
+        return
+
+    results = []
+    for size in args.sizes:
+        print(f"[{args.backend}] {size} fiches...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, __file__, "--backend", args.backend, "--run-one", str(size),
+             "--days", str(args.days), "--rounds", str(args.rounds)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode:
+            print(proc.stderr, file=sys.stderr)
+            sys.exit(proc.returncode)
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print(json.dumps(results[-1], indent=2, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,182 @@
 import streamlit as st
-import pandas as pd
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta, time, timezone
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+from time import perf_counter
+import copy
+import csv
+import functools
+import gzip
+import hashlib
+import hmac
+import html
+import importlib
+import io
 import json
+import logging
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import uuid
+
+from storage import (
+    BACKENDS as STORAGE_BACKENDS, DELETE_FIELD, SERVER_TIMESTAMP, Increment, PreconditionFailed, open_storage,
+)
+
+logger = logging.getLogger("checklist_hygiene")
+
+class _LazyModule:
+    """Module importé au premier attribut utilisé (pandas / numpy hors du chemin de démarrage)"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        setattr(self, attr, getattr(module, attr))
+        return getattr(module, attr)
+
+pd = _LazyModule("pandas")
+np = _LazyModule("numpy")
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Checklist Hygiène", page_icon="🏥", layout="centered")
 
 # --- PARAMÈTRES TECHNIQUES (quota / perf) ---
 CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 256
+DELTA_FULL_RESYNC_SECONDS = 600
+LIVE_LISTENERS_ENABLED = True
+LIVE_COLLECTIONS = ("journal", "checklists")
+LIVE_WINDOW_SIZE = 50
+LIVE_FEED_REFRESH_SECONDS = 10
+WRITE_QUEUE_PATH = os.environ.get("CHECKLIST_WRITE_QUEUE", "write_queue.sqlite3")
+WRITE_QUEUE_BATCH_SIZE = 100
+WRITE_QUEUE_POLL_SECONDS = 5
+WRITE_QUEUE_RETRY_MAX_SECONDS = 300
+WRITE_QUEUE_MAX_ATTEMPTS = 10  # au-delà : écriture abandonnée, visible dans les diagnostics
+WRITE_QUEUE_SENDING_WAIT_SECONDS = 30
+WRITE_PENDING, WRITE_SENDING, WRITE_DEAD = "pending", "sending", "dead"
+EXPORT_PAGE_SIZE = 500
+EXPORT_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+ROLLUP_COLLECTION = "rollups_daily"
+ROUND_PROGRESS_COLLECTION = "round_progress"
+ROUND_POSTES = ("Matin", "Après-midi")
+ANALYTICS_CACHE_TTL_SECONDS = 600
 LIMIT_JOURNAL_FEED = 20
 LIMIT_HISTORY = 50
+HISTORY_PAGE_SIZE = 20
+DIAGNOSTICS_ENABLED = os.environ.get("CHECKLIST_DIAGNOSTICS", "0") == "1"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Backend de stockage : firestore (production), memory ou sqlite (tests de charge / benchmarks)
+STORAGE_BACKEND = os.environ.get("CHECKLIST_STORAGE", "firestore")
+STORAGE_LOCATION = os.environ.get("CHECKLIST_STORAGE_PATH", "checklists.sqlite3")
+USERS_COLLECTION = "utilisateurs"
+USER_DIRECTORY_TTL_SECONDS = 300
+USER_DIRECTORY_RETRY_SECONDS = 10  # après un échec de chargement
+USER_RECORD_MAX_AGE_SECONDS = 60  # au-delà, la connexion relit le compte avant de l'accepter
+PASSWORD_HASH_ITERATIONS = 240_000
+AUTH_MEMO_TTL_SECONDS = 900
+AUTH_MEMO_MAX_ENTRIES = 256
+ARCHIVE_DIR = os.environ.get("CHECKLIST_ARCHIVE_DIR", "archives")
+# Bucket Cloud Storage des archives (ARCHIVE_DIR y sert de préfixe) : obligatoire pour purger Firestore
+# depuis Streamlit Cloud, dont le disque local est effacé à chaque redéploiement
+ARCHIVE_BUCKET = os.environ.get("CHECKLIST_ARCHIVE_BUCKET", "")
+ARCHIVE_ALLOW_LOCAL = os.environ.get("CHECKLIST_ARCHIVE_ALLOW_LOCAL", "0") == "1"  # poste fixe sauvegardé
+ARCHIVE_MANIFEST_TTL_SECONDS = 60
+ARCHIVE_RETENTION_DAYS = 365
+ARCHIVE_DELETE_BATCH = 500
+ARCHIVE_EPOCH = datetime(2000, 1, 1)
+SEARCH_INDEX_PATH = os.environ.get("CHECKLIST_SEARCH_INDEX", "search_index.sqlite3")
+SEARCH_SYNC_FALLBACK_SECONDS = 1800  # écritures faites par d'autres processus ; les locales réveillent l'indexeur
+SEARCH_SYNC_OVERLAP_SECONDS = 30
+SEARCH_RESULTS_LIMIT = 50
+REPORTS_DIR = os.environ.get("CHECKLIST_REPORTS_DIR", "reports")
+REPORT_SCHEDULER_POLL_SECONDS = 60
+REPORT_GRACE_MINUTES = 15  # fiches encore dans la file d'écriture à la fin du poste
+# Unités de soins : l'unité par défaut garde les collections racine, les autres sont sous units/<unité>/
+# Document de configuration units/<unité>, parent des collections de données units/<unité>/<collection>
+UNITS_COLLECTION = "units"
+DEFAULT_UNIT_ID = "rea"
+UNIT_CONFIG_TTL_SECONDS = 300
+UNIT_CONFIG_RETRY_SECONDS = 10  # après un échec de chargement
+UNIT_EXPORT_WORKERS = 6
+UNIT_SCOPED_FILTERS = ("service", "salle")  # secteurs et zones diffèrent d'une unité à l'autre
 
 # --- DONNÉES DE CONFIGURATION ---
 ADMIN_USER = "admin"
+USER_ROLES = ("soignant", "admin")
 
+# Unité par défaut (DEFAULT_UNIT_ID) ; les autres unités sont décrites dans UNITS_COLLECTION
 ROOMS_ENFANT = ["Salle A", "Salle B", "Salle C", "Salle D", "Salle E"]
 ROOMS_FEMME = ["Salle F", "Salle G", "Salle H", "Salle I", "Salle J"]
 
-# --- GESTION DES NOMS D'UTILISATEURS (NOUVEAU) ---
-def get_user_display_name(username):
-    """Convertit l'identifiant technique en nom d'affichage convivial"""
-    mapping = {
-        "vice_major_fadoua": "Mme Fadoua",
-        "vice_major_sanae": "Mme Sanae",
-        "hasnae": "Mme Hasnae",
-        "karima": "Mme Karima",
-        "professeur": "Mme/Mr Professeur",
-        "admin": "Administrateur"
-    }
-    # Retourne le nom mappé ou l'identifiant original si inconnu
-    return mapping.get(username, username)
+SERVICES = ["Réa Enfant", "Réa Femme", "Autre"]
+TYPES_CHECKLIST = ["Matin", "Après-midi", "Désinfection matériel", "Désinfection respi", "Désinfection salle"]
+ZONES = ROOMS_ENFANT + ROOMS_FEMME + ["Hall", "Lavabo 1", "Lavabo 2", "Lavabo 3", "Lavabo 4", "N/A"]
+# Zones d'une tournée Matin / Après-midi par secteur
+SECTOR_ZONES = {
+    "Réa Enfant": ROOMS_ENFANT + ["Hall", "Lavabo 1", "Lavabo 2"],
+    "Réa Femme": ROOMS_FEMME + ["Hall", "Lavabo 3", "Lavabo 4"],
+}
+# Heure de fin de chaque poste de tournée : le rapport est produit peu après
+SHIFT_END_TIMES = {"Matin": time(14, 0), "Après-midi": time(20, 0)}
+
+# Schéma d'export typé (champs écrits par add_checklist_entry / add_journal_entry).
+# Le `timestamp` n'est pas exporté : il ne sert que de curseur de pagination.
+EXPORT_SCHEMAS = {
+    "checklists": {
+        "user": "string",
+        "date": "date",
+        "heure": "time",
+        "poste": "string",
+        "service": "string",
+        "salle": "string",
+        "taches_ok": "string",
+        "taches_nok": "string",
+        "nb_taches": "int",
+        "total_items": "int",
+        "items_v": "int",
+        "items_tpl": "string",
+        "items": "string",
+        "nb_ok": "int",
+        "nb_nok": "int",
+        "nb_na": "int",
+        "isolement": "bool",
+        "has_nok": "bool",
+        "observation": "string",
+        "taches": "string",
+    },
+    "journal": {
+        "user": "string",
+        "date": "date",
+        "heure": "time",
+        "message": "string",
+    },
+}
+EXPORT_FIELDS = {name: list(schema) for name, schema in EXPORT_SCHEMAS.items()}
+
+# Format -> (extension, type MIME)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# --- GESTION DES NOMS D'UTILISATEURS ---
+# Repli quand l'annuaire `utilisateurs` ne fournit pas de display_name (voir ANNUAIRE)
+DEFAULT_DISPLAY_NAMES = {
+    "vice_major_fadoua": "Mme Fadoua",
+    "vice_major_sanae": "Mme Sanae",
+    "hasnae": "Mme Hasnae",
+    "karima": "Mme Karima",
+    "professeur": "Mme/Mr Professeur",
+    "admin": "Administrateur"
+}
 
 # --- CHECKLISTS (Contenu Intouché) ---
 CHECKLIST_ITEMS_ROOM = [
@@ -75,9 +220,235 @@ CHECKLIST_ITEMS_LAVABO = [
     "Papiers essuie-main disponibles"
 ]
 
+CHECKLIST_ITEMS_DESINFECTION = [
+    "Désinfection effectuée",
+    "Matériel rangé"
+]
+
+# --- CATALOGUE VERSIONNÉ DES ITEMS (encodage compact des résultats) ---
+# Chaque fiche stocke `items_v` (version), `items_tpl` (gabarits, ex. "salle+isolement")
+# et `items` : un caractère de statut par item, dans l'ordre du catalogue.
+# Une version publiée ne doit plus jamais changer : ajouter une nouvelle version.
+ITEM_CATALOGUE_VERSION = 1
+ITEM_CATALOGUES = {
+    1: {
+        "salle": tuple(CHECKLIST_ITEMS_ROOM),
+        "isolement": tuple(ISOLEMENT_ITEMS),
+        "hall": tuple(CHECKLIST_ITEMS_HALL),
+        "lavabo": tuple(CHECKLIST_ITEMS_LAVABO),
+        "desinfection": tuple(CHECKLIST_ITEMS_DESINFECTION),
+    },
+}
+
+STATUS_OUI = "O"
+STATUS_NON = "N"
+STATUS_NA = "A"
+STATUS_VIDE = "-"
+STATUS_BY_CHOICE = {"Oui": STATUS_OUI, "Non": STATUS_NON, "N/A": STATUS_NA, None: STATUS_VIDE}
+
+def catalogue_labels(template, version=ITEM_CATALOGUE_VERSION):
+    """Libellés affichés d'un gabarit, dans l'ordre d'encodage.
+
+    Une partie « unité:liste@version » désigne une liste d'items de la configuration d'unité.
+    """
+    catalogue = ITEM_CATALOGUES[version]
+    labels = []
+    for part in template.split("+") if template else []:
+        if ":" in part:
+            labels.extend(unit_item_labels(part))
+            continue
+        prefix = "[ISOLEMENT] " if part == "isolement" else ""
+        labels.extend(prefix + label for label in catalogue[part])
+    return labels
+
+def zone_template(salle, isolement_active=False):
+    if salle.startswith("Salle"):
+        return "salle+isolement" if isolement_active else "salle"
+    if salle == "Hall":
+        return "hall"
+    if salle.startswith("Lavabo"):
+        return "lavabo"
+    return ""
+
+def decode_checklist_items(item):
+    """(taches_ok, taches_nok) en libellés, pour une fiche encodée ou ancienne"""
+    if "items" not in item:
+        # Ancien format : chaînes déjà lisibles
+        return item.get("taches_ok", item.get("taches", "")), item.get("taches_nok", "")
+
+    template = item.get("items_tpl", "")
+    taches_ok = []
+    taches_nok = []
+    for label, status in zip(catalogue_labels(template, item.get("items_v", 1)), item["items"]):
+        if status == STATUS_OUI:
+            taches_ok.append(label)
+        elif status == STATUS_NA:
+            taches_ok.append(f"{label} (N/A)")
+        elif status == STATUS_NON:
+            taches_nok.append(label)
+        else:
+            taches_nok.append(f"{label} (Non renseigné)")
+    if template == "salle":
+        taches_ok.append("Pas d'isolement (Auto)")
+    return ", ".join(taches_ok), ", ".join(taches_nok)
+
+def legacy_item_statuses(item):
+    """(gabarit, statuts) reconstitués depuis les chaînes d'une ancienne fiche"""
+    t_ok = item.get("taches_ok") or ""
+    t_nok = item.get("taches_nok") or ""
+    if item.get("salle") == "N/A":
+        template = "desinfection"
+    else:
+        template = zone_template(item.get("salle") or "", "[ISOLEMENT]" in t_ok + t_nok)
+
+    statuses = []
+    for label in catalogue_labels(template):
+        if f"{label} (N/A)" in t_ok:
+            statuses.append(STATUS_NA)
+        elif label in t_ok:
+            statuses.append(STATUS_OUI)
+        elif label in t_nok and f"{label} (Non renseigné)" not in t_nok:
+            statuses.append(STATUS_NON)
+        else:
+            statuses.append(STATUS_VIDE)
+    return template, "".join(statuses)
+
+# --- INSTRUMENTATION (quota Firestore / latence) ---
+
+metrics_logger = logging.getLogger("checklist_hygiene.metrics")
+_metrics_local = threading.local()
+
+def _configure_metrics_logger():
+    """Une ligne JSON par appel instrumenté sur la sortie d'erreur (logs Streamlit Cloud).
+
+    Sans niveau ni handler, les lignes INFO seraient filtrées par le niveau WARNING du logger racine.
+    Le script étant relancé à chaque rerun, le handler n'est ajouté qu'une fois.
+    """
+    metrics_logger.setLevel(logging.INFO)
+    if not metrics_logger.handlers:
+        metrics_logger.addHandler(logging.StreamHandler())
+
+if DIAGNOSTICS_ENABLED:
+    _configure_metrics_logger()
+
+@st.cache_resource
+def _get_metrics():
+    """Compteurs du processus par opération : appels, documents lus/écrits, histogramme de latence"""
+    return {"lock": threading.Lock(), "ops": {}, "since": datetime.now()}
+
+def _metrics_frames() -> list:
+    """Pile des appels instrumentés en cours dans ce thread"""
+    frames = getattr(_metrics_local, "frames", None)
+    if frames is None:
+        frames = _metrics_local.frames = []
+    return frames
+
+def record_io(reads: int = 0, writes: int = 0):
+    """Compte des documents Firestore lus/écrits, imputés à tous les appels instrumentés en cours"""
+    if not DIAGNOSTICS_ENABLED:
+        return
+    for frame in _metrics_frames():
+        frame["reads"] += reads
+        frame["writes"] += writes
+
+def instrumented(op: str):
+    """Décorateur : latence, lectures/écritures et erreurs de `op`.
+
+    Désactivé (par défaut), la fonction est retournée telle quelle : aucun surcoût.
+    Les compteurs sont inclusifs (main_app cumule les lectures de tout le rerun).
+    """
+    def decorate(func):
+        if not DIAGNOSTICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frames = _metrics_frames()
+            frame = {"reads": 0, "writes": 0}
+            frames.append(frame)
+            failed = False
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                # st.rerun / st.stop (BaseException) ne sont pas des erreurs
+                elapsed_ms = (perf_counter() - start) * 1000
+                frames.pop()
+                _record_call(op, elapsed_ms, frame, failed)
+        return wrapper
+    return decorate
+
+def _record_call(op, elapsed_ms, frame, failed):
+    metrics = _get_metrics()
+    with metrics["lock"]:
+        stats = metrics["ops"].setdefault(op, {
+            "calls": 0, "reads": 0, "writes": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        })
+        stats["calls"] += 1
+        stats["reads"] += frame["reads"]
+        stats["writes"] += frame["writes"]
+        stats["errors"] += failed
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound), len(LATENCY_BUCKETS_MS))
+        stats["buckets"][bucket] += 1
+    metrics_logger.info(json.dumps({
+        "event": "call", "op": op, "ms": round(elapsed_ms, 2),
+        "reads": frame["reads"], "writes": frame["writes"], "error": failed,
+    }))
+
+def _histogram_percentile(buckets, q):
+    """Borne haute (ms) du seuil contenant le quantile `q` ; None au-delà du dernier seuil"""
+    total = sum(buckets)
+    if not total:
+        return 0
+    target = q * total
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + (None,), buckets):
+        seen += count
+        if seen >= target:
+            return bound
+    return None
+
+def get_metrics_snapshot() -> "pd.DataFrame":
+    """Tableau des opérations instrumentées pour le panneau Diagnostics"""
+    metrics = _get_metrics()
+    with metrics["lock"]:
+        ops = {op: dict(stats, buckets=list(stats["buckets"])) for op, stats in metrics["ops"].items()}
+    rows = []
+    for op, stats in sorted(ops.items()):
+        p50 = _histogram_percentile(stats["buckets"], 0.5)
+        p95 = _histogram_percentile(stats["buckets"], 0.95)
+        rows.append({
+            "Opération": op,
+            "Appels": stats["calls"],
+            "Lectures": stats["reads"],
+            "Écritures": stats["writes"],
+            "Erreurs": stats["errors"],
+            "Moy. (ms)": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0,
+            "p50 (ms)": f"≤ {p50}" if p50 is not None else f"> {LATENCY_BUCKETS_MS[-1]}",
+            "p95 (ms)": f"≤ {p95}" if p95 is not None else f"> {LATENCY_BUCKETS_MS[-1]}",
+            "Max (ms)": round(stats["max_ms"], 1),
+        })
+    return pd.DataFrame(rows)
+
+def reset_metrics():
+    metrics = _get_metrics()
+    with metrics["lock"]:
+        metrics["ops"].clear()
+        metrics["since"] = datetime.now()
+
 # --- CONNEXION FIREBASE ---
 @st.cache_resource
 def get_db():
+    # Import différé : firebase_admin / google-cloud-firestore coûtent ~0,5 s au démarrage
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     if not firebase_admin._apps:
         try:
             # 1. Essayer de charger depuis les SECRETS Streamlit (Cloud)
@@ -97,42 +468,510 @@ def get_db():
             
     return firestore.client()
 
-try:
-    db = get_db()
-except Exception as e:
-    st.error(f"Erreur DB : {e}")
-    st.stop()
+@st.cache_resource
+def get_storage():
+    """Backend choisi par CHECKLIST_STORAGE ; Firestore par défaut"""
+    if STORAGE_BACKEND not in STORAGE_BACKENDS:
+        raise ValueError(f"CHECKLIST_STORAGE inconnu : {STORAGE_BACKEND}")
+    if STORAGE_BACKEND == "firestore":
+        return open_storage("firestore", firestore_client=get_db())
+    return open_storage(STORAGE_BACKEND, STORAGE_LOCATION)
+
+class _LazyStorage:
+    """Backend résolu au premier appel : aucun client créé avant le formulaire de connexion"""
+
+    def __getattr__(self, attr):
+        return getattr(get_storage(), attr)
+
+storage = _LazyStorage()
+
+@st.cache_resource
+def warm_storage_async():
+    """Crée le client (et charge pandas) en arrière-plan pendant que la connexion s'affiche"""
+    def warm():
+        try:
+            get_storage()
+            importlib.import_module("pandas")
+        except BaseException:
+            # Échec (st.stop de get_db compris) : nouvel essai au premier accès réel
+            logger.warning("Préchauffage du stockage impossible", exc_info=True)
+
+    thread = threading.Thread(target=warm, name="storage-warmup", daemon=True)
+    thread.start()
+    return thread
 
-# --- OUTILS CACHE LOCAL LECTURE ---
+# --- CACHE DE LECTURE PARTAGÉ (processus) ---
 
-def _get_refresh_token(collection_name: str) -> int:
-    return st.session_state.get(f"_refresh_token_{collection_name}", 0)
+@st.cache_resource
+def _get_shared_cache():
+    """Cache unique pour toutes les sessions : LRU borné + TTL + version d'écriture par collection"""
+    return {
+        "lock": threading.Lock(),
+        "entries": OrderedDict(),
+        "versions": {},
+        "inflight": {},
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
+    }
 
-def _bump_refresh_token(collection_name: str):
-    key = f"_refresh_token_{collection_name}"
-    st.session_state[key] = st.session_state.get(key, 0) + 1
+def _cache_key(collection_name: str, limit: int) -> tuple:
+    return (collection_name, limit)
+
+def _get_write_version(collection_name: str) -> int:
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        return cache["versions"].get(collection_name, 0)
+
+def _bump_write_version(collection_name: str):
+    """Marque la collection comme modifiée pour toutes les sessions (rafraîchissement delta au prochain accès)"""
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        cache["versions"][collection_name] = cache["versions"].get(collection_name, 0) + 1
+    if collection_kind(collection_name) in SEARCH_SOURCES:
+        _get_search_wake().set()
+
+def _cache_get(key: tuple, immutable: bool = False, count_miss: bool = True):
+    """Retourne la donnée si elle est fraîche, sinon None (l'entrée périmée est conservée pour le delta).
+
+    `immutable` : entrée qui ne dépend ni du TTL ni des nouvelles écritures (page d'historique à curseur fixé).
+    `count_miss=False` : premier essai hors verrou, le défaut n'est compté qu'à la vérification sous verrou.
+    """
+    cache = _get_shared_cache()
+    now_ts = datetime.now().timestamp()
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry is not None:
+            fresh = immutable or (
+                (now_ts - entry["fetched_at"]) < CACHE_TTL_SECONDS
+                and entry["version"] == cache["versions"].get(key[0], 0)
+            )
+            if fresh:
+                cache["entries"].move_to_end(key)
+                cache["hits"] += 1
+                return entry["data"]
+        if count_miss:
+            cache["misses"] += 1
+        return None
+
+def _cache_peek(key: tuple):
+    """Entrée brute (même périmée), base de la lecture incrémentale"""
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        return cache["entries"].get(key)
+
+def _cache_put(key: tuple, data, version: int, full_at: float):
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        # Si une écriture a eu lieu pendant la lecture, la version stockée est déjà périmée :
+        # la fenêtre sert quand même de base au prochain delta.
+        cache["entries"][key] = {
+            "data": data,
+            "fetched_at": datetime.now().timestamp(),
+            "full_at": full_at,
+            "version": version
+        }
+        cache["entries"].move_to_end(key)
+        while len(cache["entries"]) > CACHE_MAX_ENTRIES:
+            cache["entries"].popitem(last=False)
+            cache["evictions"] += 1
+
+def _cache_discard_doc(collection_name: str, doc_id: str):
+    """Oublie les fenêtres et pages en cache qui contiennent un document supprimé.
+
+    Une page amputée d'une ligne ne dirait plus s'il reste des documents après elle :
+    elle est relue (une requête) au prochain affichage, les autres pages restent en cache.
+    """
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        stale = [
+            key for key, entry in cache["entries"].items()
+            if key[0] == collection_name and any(d["id"] == doc_id for d in entry["data"])
+        ]
+        for key in stale:
+            del cache["entries"][key]
+
+def _cache_drop_collection(collection_name: str):
+    """Oublie toutes les entrées de la collection (pages d'historique figées comprises)"""
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        for key in [key for key in cache["entries"] if key[0] == collection_name]:
+            del cache["entries"][key]
+
+@contextmanager
+def _fetch_lock(key: tuple):
+    """Un seul chargement Firestore à la fois par clé (les autres sessions attendent le résultat).
+
+    Le verrou est oublié dès que plus aucune session ne l'attend : une page lue une seule fois
+    ne laisse rien derrière elle.
+    """
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        inflight = cache["inflight"].setdefault(key, {"lock": threading.Lock(), "waiters": 0})
+        inflight["waiters"] += 1
+    try:
+        with inflight["lock"]:
+            yield
+    finally:
+        with cache["lock"]:
+            inflight["waiters"] -= 1
+            if not inflight["waiters"]:
+                del cache["inflight"][key]
+
+def get_cache_stats() -> dict:
+    cache = _get_shared_cache()
+    with cache["lock"]:
+        total = cache["hits"] + cache["misses"]
+        return {
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "evictions": cache["evictions"],
+            "entries": len(cache["entries"]),
+            "hit_ratio": (cache["hits"] / total) if total else 0.0,
+        }
 
-    # Invalidation cache local de cette collection
-    prefix = f"_cache_{collection_name}_"
-    keys_to_delete = [k for k in st.session_state.keys() if k.startswith(prefix)]
-    for k in keys_to_delete:
-        del st.session_state[k]
+# --- FLUX EN DIRECT (listeners Firestore) ---
 
-def _cache_key(collection_name: str, limit: int) -> str:
-    return f"_cache_{collection_name}_{limit}"
+@st.cache_resource
+def _get_live_state():
+    """Un listener par collection et par processus, fenêtre partagée par toutes les sessions"""
+    return {
+        "lock": threading.Lock(),
+        "watches": {},
+        "starting": set(),
+        "windows": {},
+        "revisions": {},
+        "hits": 0,
+    }
+
+@instrumented("live_snapshot")
+def _on_live_snapshot(collection_name, items, changed=0):
+    """Callback du listener (thread Firestore) : remplace la fenêtre partagée"""
+    record_io(reads=changed)  # Firestore facture chaque document ajouté/modifié
+    state = _get_live_state()
+    with state["lock"]:
+        state["windows"][collection_name] = items
+        state["revisions"][collection_name] = state["revisions"].get(collection_name, 0) + 1
+
+def start_live_listener(collection_name):
+    """Abonne le processus à la collection (sans effet si le backend ne le permet pas)"""
+    state = _get_live_state()
+    with state["lock"]:
+        watch = state["watches"].get(collection_name)
+        if watch is not None and getattr(watch, "is_active", True):
+            return
+        if collection_name in state["starting"]:
+            return  # Abonnement en cours dans une autre session
+        state["starting"].add(collection_name)
+        # Listener absent ou arrêté (erreur réseau) : on repart d'une fenêtre vide
+        state["windows"].pop(collection_name, None)
+    # Hors du verrou : le premier snapshot peut arriver (et prendre le verrou) avant le retour
+    try:
+        watch = storage.watch_latest(
+            collection_name, LIVE_WINDOW_SIZE,
+            lambda items, changed: _on_live_snapshot(collection_name, items, changed)
+        )
+    finally:
+        with state["lock"]:
+            state["starting"].discard(collection_name)
+    if watch is not None:
+        with state["lock"]:
+            state["watches"][collection_name] = watch
+
+def stop_live_listener(collection_name):
+    state = _get_live_state()
+    with state["lock"]:
+        watch = state["watches"].pop(collection_name, None)
+        state["windows"].pop(collection_name, None)
+    if watch is not None:
+        watch.unsubscribe()
+
+def _get_live_window(collection_name, limit):
+    """Fenêtre tenue à jour par le listener, ou None si indisponible (repli sur le cache TTL)"""
+    if (
+        not LIVE_LISTENERS_ENABLED
+        or collection_kind(collection_name) not in LIVE_COLLECTIONS
+        or limit > LIVE_WINDOW_SIZE
+    ):
+        return None
+    try:
+        start_live_listener(collection_name)
+    except Exception:
+        return None
+
+    state = _get_live_state()
+    with state["lock"]:
+        window = state["windows"].get(collection_name)
+        if window is None:
+            return None
+        state["hits"] += 1
+        return window[:limit]
+
+def _live_discard_doc(collection_name: str, doc_id: str):
+    """Effet immédiat d'une suppression locale, avant le prochain snapshot"""
+    state = _get_live_state()
+    with state["lock"]:
+        window = state["windows"].get(collection_name)
+        if window is not None:
+            state["windows"][collection_name] = [d for d in window if d["id"] != doc_id]
+
+# --- FILE D'ÉCRITURE DIFFÉRÉE (journal local SQLite) ---
+
+def _open_write_queue(path):
+    """Connexion à la file locale (schéma créé au besoin) ; sans thread d'envoi"""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS pending_writes (
+            doc_id TEXT PRIMARY KEY,
+            collection TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            batch_id TEXT,
+            state TEXT NOT NULL DEFAULT '%s'
+        )""" % WRITE_PENDING
+    )
+    # Envoi interrompu par un arrêt du processus : il a pu aboutir, le renvoi vérifiera
+    conn.execute(
+        "UPDATE pending_writes SET state = ?, attempts = MAX(attempts, 1) WHERE state = ?",
+        (WRITE_PENDING, WRITE_SENDING)
+    )
+    lock = threading.Lock()
+    return {"conn": conn, "lock": lock, "sent": threading.Condition(lock), "wake": threading.Event()}
+
+@st.cache_resource
+def _get_write_queue():
+    """File locale durable + thread d'envoi vers Firestore (un par processus)"""
+    queue = _open_write_queue(WRITE_QUEUE_PATH)
+    worker = threading.Thread(target=_write_queue_worker, args=(queue,), name="write-behind", daemon=True)
+    worker.start()
+    return queue
+
+def enqueue_writes(writes):
+    """Ajoute [(collection, data), ...] à la file en une transaction locale.
+
+    Les identifiants de documents sont générés ici : un renvoi après une erreur
+    réseau réécrit le même document au lieu d'en créer un doublon.
+    Les écritures d'un même appel forment un lot (une tournée) envoyé dans un
+    seul commit. Le `timestamp` serveur est posé au moment de l'envoi.
+    """
+    queue = _get_write_queue()
+    now_ts = datetime.now().timestamp()
+    batch_id = uuid.uuid4().hex
+    rows = []
+    for collection_name, data in writes:
+        payload = {k: v for k, v in data.items() if k != "timestamp"}
+        rows.append((uuid.uuid4().hex, collection_name, json.dumps(payload, ensure_ascii=False), now_ts, batch_id))
+    with queue["lock"]:
+        with queue["conn"]:
+            queue["conn"].executemany(
+                "INSERT INTO pending_writes (doc_id, collection, payload, created_at, batch_id) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+    queue["wake"].set()
+    return [row[0] for row in rows]
+
+def _discard_pending_write(doc_id):
+    """Retire un document de la file ; attend la fin d'un envoi en cours.
+
+    Sans cette attente, un commit en vol aboutirait après la suppression
+    et recréerait le document supprimé.
+    """
+    queue = _get_write_queue()
+    with queue["sent"]:
+        sending = lambda: queue["conn"].execute(
+            "SELECT 1 FROM pending_writes WHERE doc_id = ? AND state = ?", (doc_id, WRITE_SENDING)
+        ).fetchone()
+        if not queue["sent"].wait_for(lambda: not sending(), timeout=WRITE_QUEUE_SENDING_WAIT_SECONDS):
+            raise TimeoutError("Envoi en cours vers le serveur, réessayez dans un instant.")
+        with queue["conn"]:
+            queue["conn"].execute("DELETE FROM pending_writes WHERE doc_id = ?", (doc_id,))
+
+def get_pending_write_stats() -> dict:
+    queue = _get_write_queue()
+    with queue["lock"]:
+        count, failing, dead = queue["conn"].execute(
+            "SELECT COALESCE(SUM(state != ?), 0), COALESCE(SUM(state != ? AND attempts > 0), 0), "
+            "COALESCE(SUM(state = ?), 0) FROM pending_writes",
+            (WRITE_DEAD, WRITE_DEAD, WRITE_DEAD)
+        ).fetchone()
+    return {"pending": count, "failing": failing, "dead": dead}
+
+def list_dead_writes():
+    """Écritures abandonnées après WRITE_QUEUE_MAX_ATTEMPTS essais (plus ancienne d'abord)"""
+    queue = _get_write_queue()
+    with queue["lock"]:
+        rows = queue["conn"].execute(
+            "SELECT doc_id, collection, created_at, attempts, last_error FROM pending_writes "
+            "WHERE state = ? ORDER BY created_at", (WRITE_DEAD,)
+        ).fetchall()
+    return [
+        {
+            "doc_id": doc_id,
+            "collection": collection_name,
+            "created_at": datetime.fromtimestamp(created_at),
+            "attempts": attempts,
+            "last_error": last_error,
+        }
+        for doc_id, collection_name, created_at, attempts, last_error in rows
+    ]
+
+def retry_dead_writes():
+    """Remet les écritures abandonnées dans la file (un seul nouvel essai chacune)"""
+    queue = _get_write_queue()
+    with queue["lock"]:
+        with queue["conn"]:
+            queue["conn"].execute(
+                "UPDATE pending_writes SET state = ?, attempts = ?, next_attempt_at = 0 WHERE state = ?",
+                (WRITE_PENDING, WRITE_QUEUE_MAX_ATTEMPTS - 1, WRITE_DEAD)
+            )
+    queue["wake"].set()
+
+def _next_write_groups(queue, now_ts):
+    """Lots à envoyer : tournées entières, au plus WRITE_QUEUE_BATCH_SIZE lignes (sauf lot plus gros).
+
+    Un lot déjà en échec part seul : une ligne rejetée ne bloque pas les autres lots.
+    Les lignes d'avant l'ajout de batch_id forment chacune leur propre lot.
+    """
+    groups = queue["conn"].execute(
+        "SELECT COALESCE(batch_id, doc_id) AS grp, COUNT(*), MAX(attempts) FROM pending_writes "
+        "WHERE state = ? GROUP BY grp HAVING MAX(next_attempt_at) <= ? ORDER BY MIN(created_at)",
+        (WRITE_PENDING, now_ts)
+    ).fetchall()
+    selected, size = [], 0
+    for group, count, attempts in groups:
+        if selected and (attempts or size + count > WRITE_QUEUE_BATCH_SIZE):
+            break
+        selected.append(group)
+        size += count
+        if attempts:
+            break
+    return selected, len(selected) < len(groups)
+
+@instrumented("write_queue_drain")
+def _drain_write_queue_once(queue) -> bool:
+    """Envoie un commit de la file ; retourne True s'il faut enchaîner avec le suivant"""
+    now_ts = datetime.now().timestamp()
+    with queue["lock"]:
+        groups, more = _next_write_groups(queue, now_ts)
+        if not groups:
+            return False
+        marks = ",".join("?" * len(groups))
+        rows = queue["conn"].execute(
+            "SELECT doc_id, collection, payload, attempts FROM pending_writes "
+            f"WHERE state = ? AND COALESCE(batch_id, doc_id) IN ({marks}) ORDER BY created_at, rowid",
+            [WRITE_PENDING] + groups
+        ).fetchall()
+        with queue["conn"]:
+            queue["conn"].executemany(
+                "UPDATE pending_writes SET state = ? WHERE doc_id = ?", [(WRITE_SENDING, row[0]) for row in rows]
+            )
+
+    try:
+        already_sent = set()
+        if any(row[3] for row in rows):
+            # Renvoi après échec : le commit précédent a pu aboutir sans réponse.
+            # On ne rejoue pas les incréments des documents déjà présents.
+            already_sent = storage.existing_ids([(row[1], row[0]) for row in rows])
+            record_io(reads=len(rows))
+
+        ops = []
+        touched = {row[1] for row in rows}
+        for doc_id, collection_name, payload, _ in rows:
+            if doc_id in already_sent:
+                continue
+            data = json.loads(payload)
+            data["timestamp"] = SERVER_TIMESTAMP
+            ops.append(("set", collection_name, doc_id, data, False))
+            for derived_collection, derived_id, fields in _derived_writes(collection_name, doc_id, data):
+                ops.append(("set", derived_collection, derived_id, fields, True))
+                touched.add(derived_collection)
+        if ops:
+            storage.commit(ops)
+        record_io(writes=len(ops))
+    except Exception as e:
+        logger.warning("Envoi différé en échec (%s document(s)) : %s", len(rows), e)
+        with queue["sent"]:
+            with queue["conn"]:
+                queue["conn"].executemany(
+                    "UPDATE pending_writes SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                    "WHERE doc_id = ?",
+                    [
+                        (
+                            WRITE_DEAD if attempts + 1 >= WRITE_QUEUE_MAX_ATTEMPTS else WRITE_PENDING,
+                            attempts + 1,
+                            now_ts + min(2 ** attempts, WRITE_QUEUE_RETRY_MAX_SECONDS),
+                            str(e),
+                            doc_id,
+                        )
+                        for doc_id, _, _, attempts in rows
+                    ]
+                )
+            queue["sent"].notify_all()
+        # Les autres lots repartent au prochain réveil, sans attendre celui-ci
+        return False
+
+    with queue["sent"]:
+        with queue["conn"]:
+            queue["conn"].executemany(
+                "DELETE FROM pending_writes WHERE doc_id = ?", [(row[0],) for row in rows]
+            )
+        queue["sent"].notify_all()
+    for collection_name in touched:
+        _bump_write_version(collection_name)
+    return more
+
+def _write_queue_worker(queue):
+    while True:
+        queue["wake"].wait(WRITE_QUEUE_POLL_SECONDS)
+        queue["wake"].clear()
+        try:
+            while _drain_write_queue_once(queue):
+                pass
+        except Exception:
+            logger.exception("Erreur inattendue dans la file d'écriture")
 
 # --- FONCTIONS LOGIQUE MÉTIER ---
 
+@instrumented("delete_document")
 def delete_document(collection, doc_id):
     try:
-        db.collection(collection).document(doc_id).delete()
-        _bump_refresh_token(collection)
+        _discard_pending_write(doc_id)
+        if collection_kind(collection) == "checklists":
+            # Lecture du document pour retirer sa contribution aux agrégats, dans le même commit
+            data = storage.get(collection, doc_id)
+            record_io(reads=1)
+            progress_collection = sibling_collection(collection, ROUND_PROGRESS_COLLECTION)
+            if data is not None:
+                # Suppression conditionnée à l'existence du document : si une autre session l'a
+                # supprimé entre la lecture et le commit, les décréments ne sont pas rejoués
+                ops = [("delete_existing", collection, doc_id, None, None)]
+                rollups = _rollup_writes(data, -1, sibling_collection(collection, ROLLUP_COLLECTION))
+                for rollup_collection, rollup_id, fields in rollups:
+                    ops.append(("set", rollup_collection, rollup_id, fields, True))
+                ops += _release_round_zone(doc_id, data, progress_collection)
+                try:
+                    storage.commit(ops)
+                    record_io(writes=len(ops))
+                except PreconditionFailed:
+                    logger.info("Fiche %s déjà supprimée", doc_id)
+                _bump_write_version(progress_collection)
+        else:
+            storage.delete(collection, doc_id)
+            record_io(writes=1)
+        _cache_discard_doc(collection, doc_id)
+        _live_discard_doc(collection, doc_id)
+        _search_discard_doc(collection, doc_id)
     except Exception as e:
         st.error(f"Erreur suppression ({collection}) : {e}")
 
 def can_manage_entry(entry_user, entry_timestamp):
     current_user = st.session_state.get("user")
-    if current_user == ADMIN_USER:
+    if is_admin_user(current_user):
         return True
 
     if current_user == entry_user and entry_timestamp:
@@ -148,32 +987,76 @@ def can_manage_entry(entry_user, entry_timestamp):
 
 # --- FONCTIONS CRUD ---
 
-def add_checklist_entry(user, type_checklist, service, salle, taches_ok, taches_nok, obs):
-    """Enregistre les tâches faites ET non faites"""
+def _build_checklist_data(user, type_checklist, service, salle, template, statuses, obs):
     now_local = datetime.now()
     date_now = now_local.strftime("%Y-%m-%d")
     heure_now = now_local.strftime("%H:%M:%S")
 
-    data = {
+    nb_ok = statuses.count(STATUS_OUI)
+    nb_na = statuses.count(STATUS_NA)
+    nb_nok = len(statuses) - nb_ok - nb_na
+    # Compteurs historiques : "Pas d'isolement (Auto)" comptait comme tâche faite
+    nb_taches = nb_ok + nb_na + (1 if template == "salle" else 0)
+
+    return {
         "user": user,
         "date": date_now,
         "heure": heure_now,
         "poste": type_checklist,
         "service": service,
         "salle": salle,
-        "taches_ok": ", ".join(taches_ok),
-        "taches_nok": ", ".join(taches_nok),
-        "nb_taches": len(taches_ok),
-        "total_items": len(taches_ok) + len(taches_nok),
+        "items_v": ITEM_CATALOGUE_VERSION,
+        "items_tpl": template,
+        "items": statuses,
+        "nb_taches": nb_taches,
+        "total_items": nb_taches + nb_nok,
+        "nb_ok": nb_ok,
+        "nb_nok": nb_nok,
+        "nb_na": nb_na,
+        "isolement": "isolement" in template.split("+"),
+        "has_nok": nb_nok > 0,
+        "has_observation": bool(obs and obs.strip()),  # filtre de synchronisation de la recherche
         "observation": obs,
-        "timestamp": firestore.SERVER_TIMESTAMP
+        "timestamp": SERVER_TIMESTAMP
     }
+
+@instrumented("add_checklist_entry")
+def add_checklist_entry(user, type_checklist, service, salle, template, statuses, obs):
+    """Enregistre le statut de chaque item du gabarit (envoi différé)"""
+    data = _build_checklist_data(user, type_checklist, service, salle, template, statuses, obs)
     try:
-        db.collection("checklists").add(data)
-        _bump_refresh_token("checklists")
+        enqueue_writes([(unit_collection("checklists"), data)])
     except Exception as e:
         st.error(f"Erreur enregistrement checklist : {e}")
 
+@instrumented("add_checklist_entries_batch")
+def add_checklist_entries_batch(entries, unit_id=None):
+    """Enregistre une tournée complète : une transaction locale, envoyée en un seul WriteBatch"""
+    if not entries:
+        return True
+    try:
+        collection_name = unit_collection("checklists", unit_id)
+        enqueue_writes([(collection_name, data) for data in entries])
+        return True
+    except Exception as e:
+        st.error(f"Erreur enregistrement du secteur : {e}")
+        return False
+
+def stage_round_entry(data):
+    """Met en attente une zone validée (envoyée avec le reste du secteur)"""
+    st.session_state.setdefault("pending_round_entries", {})[data["salle"]] = data
+
+def flush_pending_round():
+    """Envoie les zones en attente ; elles restent en attente si le commit échoue"""
+    pending = st.session_state.get("pending_round_entries", {})
+    # Les zones en attente appartiennent à la tournée courante (et donc à son unité)
+    round_key = st.session_state.get("current_round_key")
+    if add_checklist_entries_batch(list(pending.values()), round_key[3] if round_key else None):
+        st.session_state["pending_round_entries"] = {}
+        return True
+    return False
+
+@instrumented("add_journal_entry")
 def add_journal_entry(user, message):
     now_local = datetime.now()
     date_now = now_local.strftime("%Y-%m-%d")
@@ -184,87 +1067,1568 @@ def add_journal_entry(user, message):
         "date": date_now,
         "heure": heure_now,
         "message": message,
-        "timestamp": firestore.SERVER_TIMESTAMP
+        "timestamp": SERVER_TIMESTAMP
     }
     try:
-        db.collection("journal").add(data)
-        _bump_refresh_token("journal")
+        enqueue_writes([(unit_collection("journal"), data)])
     except Exception as e:
         st.error(f"Erreur enregistrement journal : {e}")
 
+def _fetch_window(collection_name, limit, base):
+    """Recharge la fenêtre des `limit` derniers documents.
+
+    Avec une fenêtre déjà en cache, seuls les documents plus récents que son
+    `timestamp` le plus récent sont lus (coût O(nouveaux documents)). Une
+    relecture complète est faite périodiquement pour réconcilier les
+    suppressions faites hors de ce processus.
+    """
+    now_ts = datetime.now().timestamp()
+    cursor = None
+    if base and base["data"] and (now_ts - base["full_at"]) < DELTA_FULL_RESYNC_SECONDS:
+        cursor = base["data"][0].get("timestamp")
+
+    if cursor is None:
+        items = storage.stream_latest(collection_name, limit)
+        record_io(reads=max(len(items), 1))  # Une requête coûte au moins une lecture
+        return items, now_ts
+
+    new_items = storage.stream_latest(collection_name, limit, after=cursor)
+    record_io(reads=max(len(new_items), 1))
+    if not new_items:
+        return base["data"], base["full_at"]
+
+    new_ids = {item["id"] for item in new_items}
+    merged = new_items + [d for d in base["data"] if d["id"] not in new_ids]
+    return merged[:limit], base["full_at"]
+
+@instrumented("get_data_with_ids")
 def get_data_with_ids(collection_name, limit=20):
-    """Lecture rapide pour l'affichage (limitée)"""
+    """Lecture rapide pour l'affichage (limitée), partagée entre les sessions"""
+    live = _get_live_window(collection_name, limit)
+    if live is not None:
+        return live
+
     ck = _cache_key(collection_name, limit)
-    # Simple timestamp local pour le cache
-    now_ts = datetime.now().timestamp()
-    refresh_token = _get_refresh_token(collection_name)
+    cached = _cache_get(ck, count_miss=False)
+    if cached is not None:
+        return cached
+
+    with _fetch_lock(ck):
+        # Une autre session a peut-être chargé la donnée pendant l'attente
+        cached = _cache_get(ck)
+        if cached is not None:
+            return cached
+
+        version = _get_write_version(collection_name)
+        try:
+            items, full_at = _fetch_window(collection_name, limit, _cache_peek(ck))
+            _cache_put(ck, items, version, full_at)
+            return items
+        except Exception as e:
+            st.error(f"Erreur lecture {collection_name} : {e}")
+            return []
+
+# Filtres d'égalité supportés côté serveur (index composites : firestore.indexes.json)
+QUERY_FILTER_FIELDS = {
+    "checklists": ("service", "salle", "poste", "user", "date", "has_nok", "has_observation"),
+    "journal": ("user", "date"),
+}
+
+def checked_filters(collection_name, filters=None):
+    """Filtres d'égalité poussés vers le stockage, limités aux champs indexés"""
+    filters = filters or {}
+    allowed = QUERY_FILTER_FIELDS.get(collection_kind(collection_name), ())
+    for field in filters:
+        if field not in allowed:
+            raise ValueError(f"Filtre non supporté pour {collection_name} : {field}")
+    return filters
+
+def history_cursor(item):
+    """Curseur de la page suivante : (timestamp, id) du dernier document affiché.
+
+    Le timestamp seul ne suffit pas : une tournée envoyée en un seul WriteBatch
+    partage le même timestamp serveur, et une page coupée au milieu perdrait le reste.
+    """
+    return (item["timestamp"], item["id"])
+
+@instrumented("get_history_page")
+def get_history_page(collection_name, cursor=None, filters=None, page_size=HISTORY_PAGE_SIZE):
+    """(documents, has_more) : page de `page_size` documents après `cursor` (voir history_cursor).
+
+    Un document de plus est lu pour savoir s'il existe une page suivante. Les filtres
+    sont des égalités poussées vers Firestore. Une page à curseur fixé ne change plus
+    (les nouveaux documents arrivent en tête) : elle n'est lue qu'une fois par processus ;
+    une suppression l'évince du cache (_cache_discard_doc).
+    """
+    filters = filters or {}
+    if cursor is None and not filters:
+        items = get_data_with_ids(collection_name, limit=page_size + 1)
+        return items[:page_size], len(items) > page_size
+
+    key = (collection_name, "page", tuple(sorted(filters.items())), page_size, cursor)
+    immutable = cursor is not None
+    cached = _cache_get(key, immutable, count_miss=False)
+    if cached is None:
+        with _fetch_lock(key):
+            cached = _cache_get(key, immutable)
+            if cached is None:
+                version = _get_write_version(collection_name)
+                try:
+                    cached = storage.stream_latest(
+                        collection_name, page_size + 1, filters=checked_filters(collection_name, filters), before=cursor
+                    )
+                    record_io(reads=max(len(cached), 1))
+                    _cache_put(key, cached, version, datetime.now().timestamp())
+                except Exception as e:
+                    st.error(f"Erreur lecture {collection_name} : {e}")
+                    return [], False
+    return cached[:page_size], len(cached) > page_size
+
+def iter_export_pages(collection_name, start_date, end_date, page_size=EXPORT_PAGE_SIZE, filters=None):
+    """Parcourt la plage de dates par pages de `page_size` documents (curseur géré par le stockage)"""
+    # Start: 00:00:00 du jour / End: 23:59:59 du jour
+    dt_start = datetime.combine(start_date, time.min)
+    dt_end = datetime.combine(end_date, time.max)
+
+    fields = EXPORT_FIELDS.get(collection_kind(collection_name))
+    fields = fields + ["timestamp"] if fields else None
+    filters = checked_filters(collection_name, filters)
+    # Mois archivés lus depuis les fichiers, le reste depuis le stockage (du plus récent au plus ancien)
+    for month, seg_start, seg_end in _export_segments(dt_start, dt_end, archived_months(collection_name)):
+        if month is None:
+            pages = storage.iter_range(
+                collection_name, "timestamp", seg_start, seg_end,
+                filters=filters, fields=fields, page_size=page_size,
+            )
+        else:
+            pages = _iter_archive_pages(collection_name, month, seg_start, seg_end, filters, fields, page_size)
+        yield from _export_rows(collection_name, pages, count_reads=month is None)
+
+def _export_rows(collection_name, pages, count_reads=True):
+    for rows in pages:
+        if count_reads:
+            record_io(reads=len(rows))
+        for row in rows:
+            # On ne garde pas l'ID technique dans l'Excel, juste les données
+            row.pop("id", None)
+            # Fiches encodées : libellés reconstitués depuis le catalogue
+            if collection_kind(collection_name) == "checklists" and "items" in row:
+                row["taches_ok"], row["taches_nok"] = decode_checklist_items(row)
+        yield rows
+
+def iter_units_export_pages(collection_kind_name, unit_ids, start_date, end_date, filters=None):
+    """Export multi-unités : les unités sont lues en parallèle, chaque page est rendue dès réception.
+
+    Les pages restent triées par date au sein d'une unité (colonne `unite` ajoutée), pas entre unités.
+    File bornée : un lecteur rapide attend que l'écriture du fichier suive.
+    Les filtres propres à une unité (secteur, zone) sont refusés : leurs valeurs n'ont pas de sens
+    dans les autres unités.
+    """
+    unit_scoped = sorted(set(filters or {}) & set(UNIT_SCOPED_FILTERS))
+    if unit_scoped:
+        raise ValueError(f"Filtres propres à une unité, non applicables à toutes les unités : {', '.join(unit_scoped)}")
+    pages = Queue(maxsize=2 * UNIT_EXPORT_WORKERS)
+    stop = threading.Event()
+
+    def put(item):
+        """False si l'export est abandonné : le lecteur doit s'arrêter"""
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except Full:
+                continue
+        return False
 
-    cached = st.session_state.get(ck)
-    if cached:
-        # Check TTL
-        if cached["refresh_token"] == refresh_token and (now_ts - cached["fetched_at"]) < CACHE_TTL_SECONDS:
-            return cached["data"]
+    def read_unit(unit_id):
+        try:
+            collection_name = unit_collection(collection_kind_name, unit_id)
+            for page in iter_export_pages(collection_name, start_date, end_date, filters=filters):
+                for row in page:
+                    row["unite"] = unit_id
+                if not put(page):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(None)
 
+    with ThreadPoolExecutor(max_workers=min(UNIT_EXPORT_WORKERS, len(unit_ids)) or 1) as executor:
+        for unit_id in unit_ids:
+            executor.submit(read_unit, unit_id)
+        try:
+            remaining = len(unit_ids)
+            while remaining:
+                item = pages.get()
+                if item is None:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            # Abandon (erreur, fermeture du générateur) : les lecteurs s'arrêtent à la page suivante
+            stop.set()
+
+def _coerce_export_row(row, schema):
+    """Convertit une ligne Firestore vers les types du schéma (None si invalide)"""
+    typed = {}
+    for name, kind in schema.items():
+        value = row.get(name)
+        if value is not None and kind != "string":
+            try:
+                if kind == "date":
+                    value = datetime.strptime(value, "%Y-%m-%d").date()
+                elif kind == "time":
+                    value = datetime.strptime(value, "%H:%M:%S").time()
+                elif kind == "int":
+                    value = int(value)
+                elif kind == "bool":
+                    value = bool(value)
+            except (TypeError, ValueError):
+                value = None
+        elif value is not None:
+            value = str(value)
+        typed[name] = value
+    return typed
+
+def _csv_export_writer(out, schema, compress):
+    raw = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    writer = csv.DictWriter(text, fieldnames=list(schema), extrasaction="ignore")
+    writer.writeheader()
+
+    def close():
+        text.flush()
+        text.detach()
+        if compress:
+            raw.close()
+
+    return writer.writerows, close
+
+def _parquet_export_writer(out, schema):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        "string": pa.string(), "date": pa.date32(), "time": pa.time32("s"), "int": pa.int32(), "bool": pa.bool_()
+    }
+    arrow_schema = pa.schema([(name, arrow_types[kind]) for name, kind in schema.items()])
+    writer = pq.ParquetWriter(out, arrow_schema, compression="zstd")
+
+    def write(rows):
+        typed = [_coerce_export_row(row, schema) for row in rows]
+        writer.write_table(pa.Table.from_pylist(typed, schema=arrow_schema))
+
+    return write, writer.close
+
+def _xlsx_export_writer(out, schema):
+    from openpyxl import Workbook
+
+    # Mode write_only : les lignes sont écrites au fil de l'eau
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("export")
+    sheet.append(list(schema))
+
+    def write(rows):
+        for row in rows:
+            typed = _coerce_export_row(row, schema)
+            sheet.append([typed[name] for name in schema])
+
+    return write, lambda: workbook.save(out)
+
+@instrumented("stream_export")
+def stream_export(collection_name, start_date, end_date, fmt="CSV", compress=False, on_progress=None, filters=None,
+                  units=None):
+    """Export écrit page par page dans un fichier temporaire (CSV, Parquet ou Excel).
+
+    La mémoire reste bornée par la taille de page, pas par la plage de dates, jusqu'au
+    fichier produit ; le téléchargement (st.download_button) le charge ensuite en entier.
+    `units` : export de toutes ces unités (collection_name est alors le nom de base, ex. "checklists").
+    Retourne (fichier positionné au début, nombre de lignes), ou (None, 0) en cas d'erreur.
+    """
+    schema = EXPORT_SCHEMAS[collection_kind(collection_name)]
+    if units:
+        schema = dict(schema, unite="string")
+        pages = iter_units_export_pages(collection_name, units, start_date, end_date, filters)
+    else:
+        pages = iter_export_pages(collection_name, start_date, end_date, filters=filters)
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+
+    rows = 0
+    started = perf_counter()
     try:
-        docs = (
-            db.collection(collection_name)
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .limit(limit)
-            .stream()
+        if fmt == "Parquet":
+            write, close = _parquet_export_writer(out, schema)
+        elif fmt == "Excel":
+            write, close = _xlsx_export_writer(out, schema)
+        else:
+            write, close = _csv_export_writer(out, schema, compress)
+
+        for page in pages:
+            write(page)
+            rows += len(page)
+            if on_progress:
+                on_progress(rows, perf_counter() - started)
+        close()
+    except Exception as e:
+        out.close()
+        st.error(f"Erreur lors de l'export ({fmt}) : {e}")
+        return None, 0
+
+    out.seek(0)
+    return out, rows
+
+def render_streaming_export(collection_name, start_date, end_date, file_stem, fmt, compress, filters=None, units=None):
+    """Prépare l'export avec suivi de progression, puis propose le téléchargement.
+
+    Le fichier produit est chargé en mémoire pour le téléchargement (taille de l'export).
+    """
+    progress = st.empty()
+
+    def report(rows, elapsed):
+        rate = rows / elapsed if elapsed > 0 else 0
+        progress.caption(f"⏳ {rows} lignes récupérées ({rate:.0f} lignes/s)")
+
+    started = perf_counter()
+    out, rows = stream_export(collection_name, start_date, end_date, fmt, compress, report, filters, units)
+    if out is None:
+        return 0
+    elapsed = perf_counter() - started
+    progress.caption(f"{rows} lignes en {elapsed:.1f} s ({rows / elapsed if elapsed > 0 else 0:.0f} lignes/s)")
+    if rows:
+        extension, mime = EXPORT_FORMATS[fmt]
+        if fmt == "CSV" and compress:
+            extension, mime = "csv.gz", "application/gzip"
+        # st.download_button ne sait servir que des octets en mémoire : le fichier est lu
+        # en entier ici, la borne mémoire de stream_export s'arrête à cette étape
+        with out:
+            st.download_button(
+                f"📥 Télécharger le fichier {fmt}",
+                out.read(),
+                f"{file_stem}.{extension}",
+                mime
+            )
+    return rows
+
+# --- ARCHIVAGE ET PURGE (rétention) ---
+# Un fichier JSONL.gz par collection et par mois entier hors rétention ; le manifeste suit
+# l'état de chaque mois ("writing" -> "deleting" -> "archived") pour reprendre après interruption.
+# Archives et manifeste vont dans un bucket Cloud Storage (ARCHIVE_BUCKET) ou, à défaut, dans ARCHIVE_DIR.
+
+class _LocalArchiveStore:
+    """Archives dans un dossier local : durable sur un poste fixe, pas sur Streamlit Cloud"""
+    durable = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def describe(self):
+        return os.path.abspath(self.root)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.root, name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+class _BucketArchiveStore:
+    """Archives dans un bucket Cloud Storage du projet Firebase : survivent aux redéploiements"""
+    durable = True
+
+    def __init__(self, bucket_name, prefix):
+        from firebase_admin import storage as cloud_storage
+
+        get_db()  # initialise l'application Firebase (identifiants)
+        self.bucket = cloud_storage.bucket(bucket_name)
+        self.prefix = prefix.strip("/")
+
+    def describe(self):
+        return f"gs://{self.bucket.name}/{self.prefix}"
+
+    def _blob(self, name):
+        return self.bucket.blob(f"{self.prefix}/{name}" if self.prefix else name)
+
+    def read(self, name):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self._blob(name).download_as_bytes()
+        except NotFound:
+            return None
+
+    def write(self, name, data):
+        self._blob(name).upload_from_string(data, content_type="application/octet-stream")
+
+@st.cache_resource
+def _get_archive_store():
+    if ARCHIVE_BUCKET:
+        return _BucketArchiveStore(ARCHIVE_BUCKET, ARCHIVE_DIR)
+    return _LocalArchiveStore(ARCHIVE_DIR)
+
+def archive_store_is_durable():
+    """Purge autorisée : archives hors du disque de l'instance, ou données elles-mêmes locales"""
+    return _get_archive_store().durable or STORAGE_BACKEND != "firestore" or ARCHIVE_ALLOW_LOCAL
+
+@st.cache_resource
+def _get_archive_state():
+    """Verrou de purge et manifeste en cache (relu après ARCHIVE_MANIFEST_TTL_SECONDS)"""
+    return {"lock": threading.Lock(), "manifest": None, "loaded_at": 0.0}
+
+def _archive_name(collection_name, month):
+    return f"{collection_name}/{month}.jsonl.gz"
+
+def load_archive_manifest() -> dict:
+    state = _get_archive_state()
+    now_ts = datetime.now().timestamp()
+    if state["manifest"] is None or now_ts - state["loaded_at"] >= ARCHIVE_MANIFEST_TTL_SECONDS:
+        data = _get_archive_store().read("manifest.json")
+        state["manifest"] = json.loads(data) if data else {}
+        state["loaded_at"] = now_ts
+    return copy.deepcopy(state["manifest"])
+
+def _save_archive_manifest(manifest):
+    _get_archive_store().write("manifest.json", json.dumps(manifest, indent=1, ensure_ascii=False).encode("utf-8"))
+    state = _get_archive_state()
+    state["manifest"], state["loaded_at"] = copy.deepcopy(manifest), datetime.now().timestamp()
+
+def archived_months(collection_name) -> set:
+    """Mois dont le fichier d'archive est complet (documents supprimés ou en cours de suppression)"""
+    months = load_archive_manifest().get(collection_name, {})
+    return {month for month, entry in months.items() if entry["status"] in ("deleting", "archived")}
+
+def _as_utc(value):
+    # Même convention que le stockage : datetime naïf = UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def _month_start(month):
+    return datetime.strptime(month, "%Y-%m")
+
+def _next_month(dt):
+    return (dt.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def _export_segments(dt_start, dt_end, archived):
+    """Découpe la plage en (mois archivé ou None, début, fin), du plus récent au plus ancien"""
+    segments = []
+    month_start = dt_end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while True:
+        seg_start = max(month_start, dt_start)
+        seg_end = min(_next_month(month_start) - timedelta(microseconds=1), dt_end)
+        month = month_start.strftime("%Y-%m")
+        if month in archived:
+            segments.append((month, seg_start, seg_end))
+        elif segments and segments[-1][0] is None:
+            # Mois consécutifs non archivés : une seule requête
+            segments[-1] = (None, seg_start, segments[-1][2])
+        else:
+            segments.append((None, seg_start, seg_end))
+        if month_start <= dt_start:
+            return segments
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+
+def _decode_archive(data):
+    for line in gzip.decompress(data).decode("utf-8").splitlines():
+        row = json.loads(line)
+        if row.get("timestamp"):
+            row["timestamp"] = _as_utc(datetime.fromisoformat(row["timestamp"]))
+        yield row
+
+def _read_archive(collection_name, month, missing_ok=False):
+    data = _get_archive_store().read(_archive_name(collection_name, month))
+    if data is None:
+        if missing_ok:
+            return iter(())
+        raise FileNotFoundError(f"Archive introuvable : {_archive_name(collection_name, month)}")
+    return _decode_archive(data)
+
+def _iter_archive_pages(collection_name, month, seg_start, seg_end, filters, fields, page_size):
+    seg_start, seg_end = _as_utc(seg_start), _as_utc(seg_end)
+    rows = [
+        row for row in _read_archive(collection_name, month)
+        if row.get("timestamp") and seg_start <= row["timestamp"] <= seg_end
+        and all(row.get(field) == value for field, value in filters.items())
+    ]
+    for i in range(0, len(rows), page_size):
+        page = rows[i:i + page_size]
+        if fields:
+            page = [{name: row[name] for name in fields if name in row} for row in page]
+        yield page
+
+def _write_month_archive(collection_name, month, rows, manifest):
+    """Écrit (ou complète) l'archive du mois, puis la relit avant d'autoriser la purge.
+
+    Les documents restent en base tant que la relecture ne retrouve pas chacun d'eux.
+    """
+    merged = {row["id"]: row for row in _read_archive(collection_name, month, missing_ok=True)}
+    merged.update({row["id"]: row for row in rows})
+
+    manifest.setdefault(collection_name, {})[month] = {"status": "writing"}
+    _save_archive_manifest(manifest)
+    lines = (
+        json.dumps(dict(row, timestamp=row["timestamp"].isoformat()), ensure_ascii=False) + "\n"
+        for row in sorted(merged.values(), key=lambda r: r["timestamp"], reverse=True)
+    )
+    _get_archive_store().write(_archive_name(collection_name, month), gzip.compress("".join(lines).encode("utf-8")))
+    stored_ids = {row["id"] for row in _read_archive(collection_name, month)}
+    if stored_ids != set(merged):
+        raise RuntimeError(f"Archive {collection_name} {month} incomplète à la relecture : purge annulée")
+    manifest[collection_name][month] = {"status": "deleting", "rows": len(merged), "deleted": 0}
+    _save_archive_manifest(manifest)
+
+def _purge_archived_month(collection_name, month, manifest, on_progress=None):
+    """Supprime les documents archivés par lots de ARCHIVE_DELETE_BATCH, en notant l'avancement"""
+    entry = manifest[collection_name][month]
+    ids = [row["id"] for row in _read_archive(collection_name, month)]
+    start = entry.get("deleted", 0)
+    for i in range(start, len(ids), ARCHIVE_DELETE_BATCH):
+        chunk = ids[i:i + ARCHIVE_DELETE_BATCH]
+        storage.commit([("delete", collection_name, doc_id, None, None) for doc_id in chunk])
+        record_io(writes=len(chunk))
+        entry["deleted"] = i + len(chunk)
+        _save_archive_manifest(manifest)
+        if on_progress:
+            on_progress(collection_name, month, entry["deleted"], len(ids))
+    entry["status"] = "archived"
+    _save_archive_manifest(manifest)
+    return len(ids) - start
+
+@instrumented("archive_and_purge")
+def archive_and_purge(collection_name, retention_days=ARCHIVE_RETENTION_DAYS, on_progress=None):
+    """Archive puis supprime les mois entièrement antérieurs à la fenêtre de rétention.
+
+    Relançable : les suppressions interrompues reprennent au dernier lot validé.
+    Refusé si les archives resteraient sur le disque de l'instance (voir archive_store_is_durable).
+    """
+    if not archive_store_is_durable():
+        raise RuntimeError(
+            "Archives sur le disque local de l'instance (effacé au redéploiement) : "
+            "configurer CHECKLIST_ARCHIVE_BUCKET avant de purger."
         )
-        items = []
-        for doc in docs:
-            item = doc.to_dict()
-            item["id"] = doc.id
-            items.append(item)
-
-        st.session_state[ck] = {
-            "data": items,
-            "fetched_at": now_ts,
-            "refresh_token": refresh_token
+    cutoff = datetime.combine((datetime.now() - timedelta(days=retention_days)).date().replace(day=1), time.min)
+    summary = {"months": 0, "archived": 0, "deleted": 0}
+    with _get_archive_state()["lock"]:
+        manifest = load_archive_manifest()
+        for month, entry in sorted(manifest.get(collection_name, {}).items()):
+            if entry["status"] == "deleting":
+                summary["deleted"] += _purge_archived_month(collection_name, month, manifest, on_progress)
+
+        def flush(month, rows):
+            _write_month_archive(collection_name, month, rows, manifest)
+            summary["months"] += 1
+            summary["archived"] += len(rows)
+            summary["deleted"] += _purge_archived_month(collection_name, month, manifest, on_progress)
+
+        # Lecture du plus récent au plus ancien : un mois est complet dès qu'on passe au suivant
+        current, rows = None, []
+        pages = storage.iter_range(collection_name, "timestamp", ARCHIVE_EPOCH, cutoff - timedelta(microseconds=1))
+        for page in pages:
+            record_io(reads=len(page))
+            for row in page:
+                month = row["timestamp"].strftime("%Y-%m")
+                if month != current and rows:
+                    flush(current, rows)
+                    rows = []
+                current = month
+                rows.append(row)
+        if rows:
+            flush(current, rows)
+
+    if summary["deleted"]:
+        _bump_write_version(collection_name)
+        _cache_drop_collection(collection_name)
+        if collection_kind(collection_name) == "checklists":
+            load_item_results.clear()
+    return summary
+
+# --- RECHERCHE PLEIN TEXTE (index local SQLite FTS5) ---
+# Index par processus, sans accents, alimenté par un thread d'arrière-plan depuis le dernier
+# `timestamp` indexé de chaque collection : une recherche ne lit jamais Firestore et n'attend pas
+# la synchronisation. Les mois archivés restent dans l'index.
+
+# (champ texte, champs lus, filtre des synchronisations incrémentales)
+SEARCH_SOURCES = {
+    "journal": ("message", ["message", "user", "date", "heure", "timestamp"], {}),
+    "checklists": (
+        "observation", ["observation", "user", "date", "heure", "salle", "timestamp"], {"has_observation": True},
+    ),
+}
+@st.cache_resource
+def _get_search_index():
+    conn = sqlite3.connect(SEARCH_INDEX_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # index reconstructible depuis le stockage
+    conn.executescript(
+        """CREATE TABLE IF NOT EXISTS search_docs (
+            rowid INTEGER PRIMARY KEY,
+            collection TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            user TEXT, date TEXT, heure TEXT, salle TEXT,
+            UNIQUE (collection, doc_id)
+        );
+        CREATE INDEX IF NOT EXISTS search_docs_ts ON search_docs (ts DESC);
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_text USING fts5(
+            text, tokenize = 'unicode61 remove_diacritics 2'
+        );
+        CREATE TABLE IF NOT EXISTS search_cursor (
+            collection TEXT PRIMARY KEY,
+            ts REAL NOT NULL
+        );"""
+    )
+    return {"conn": conn, "lock": threading.Lock(), "synced_at": 0.0, "versions": {}}
+
+def _search_upsert(conn, collection_name, row, text):
+    conn.execute(
+        "INSERT INTO search_docs (collection, doc_id, ts, user, date, heure, salle) VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (collection, doc_id) DO UPDATE SET ts = excluded.ts",
+        (collection_name, row["id"], row["timestamp"].timestamp(),
+         row.get("user"), row.get("date"), row.get("heure"), row.get("salle")),
+    )
+    rowid = conn.execute(
+        "SELECT rowid FROM search_docs WHERE collection = ? AND doc_id = ?", (collection_name, row["id"])
+    ).fetchone()[0]
+    conn.execute("DELETE FROM search_text WHERE rowid = ?", (rowid,))
+    conn.execute("INSERT INTO search_text (rowid, text) VALUES (?, ?)", (rowid, text))
+
+def _search_discard_doc(collection_name, doc_id):
+    if collection_kind(collection_name) not in SEARCH_SOURCES:
+        return
+    index = _get_search_index()
+    with index["lock"], index["conn"] as conn:
+        row = conn.execute(
+            "SELECT rowid FROM search_docs WHERE collection = ? AND doc_id = ?", (collection_name, doc_id)
+        ).fetchone()
+        if row:
+            conn.execute("DELETE FROM search_text WHERE rowid = ?", row)
+            conn.execute("DELETE FROM search_docs WHERE rowid = ?", row)
+
+@instrumented("search_sync")
+def sync_search_index(collections=None) -> int:
+    """Indexe les documents postérieurs au curseur de chaque collection ; retourne le nombre indexé.
+
+    Le curseur recule de SEARCH_SYNC_OVERLAP_SECONDS pour rattraper les horodatages serveur
+    posés dans le désordre (réindexation idempotente). Sans curseur, la collection est
+    parcourue en entier ; ensuite, seuls les documents qui ont un texte sont lus.
+    `collections` : chemins à synchroniser (toutes les collections indexées par défaut).
+    """
+    index = _get_search_index()
+    indexed = 0
+    for collection_name in collections or _search_collections():
+        text_field, fields, incremental_filters = SEARCH_SOURCES[collection_kind(collection_name)]
+        with index["lock"]:
+            row = index["conn"].execute(
+                "SELECT ts FROM search_cursor WHERE collection = ?", (collection_name,)
+            ).fetchone()
+        start = (
+            datetime.fromtimestamp(row[0] - SEARCH_SYNC_OVERLAP_SECONDS, timezone.utc) if row else ARCHIVE_EPOCH
+        )
+        end = datetime.now(timezone.utc) + timedelta(days=1)
+        newest = row[0] if row else None
+        filters = checked_filters(collection_name, incremental_filters) if row else None
+        pages = 0
+        for page in storage.iter_range(collection_name, "timestamp", start, end, filters=filters, fields=fields):
+            pages += 1
+            record_io(reads=len(page))
+            with index["lock"], index["conn"] as conn:
+                for item in page:
+                    if not item.get("timestamp"):
+                        continue
+                    newest = max(newest or 0, item["timestamp"].timestamp())
+                    if item.get(text_field):
+                        _search_upsert(conn, collection_name, item, item[text_field])
+                        indexed += 1
+        if not pages:
+            record_io(reads=1)  # Une requête sans résultat coûte une lecture
+        # Collection encore vide : le curseur marque quand même la fin du premier parcours
+        with index["lock"], index["conn"] as conn:
+            conn.execute(
+                "INSERT INTO search_cursor (collection, ts) VALUES (?, ?) "
+                "ON CONFLICT (collection) DO UPDATE SET ts = excluded.ts",
+                (collection_name, newest if newest is not None else _as_utc(start).timestamp()),
+            )
+    return indexed
+
+def _search_collections(unit_ids=None):
+    """Collections indexées (chemins), pour toutes les unités par défaut"""
+    return [unit_collection(kind, unit_id) for unit_id in unit_ids or load_units() for kind in SEARCH_SOURCES]
+
+def _stale_search_collections(index, collections=None) -> list:
+    """Collections écrites par ce processus depuis leur synchronisation ; toutes une fois
+    SEARCH_SYNC_FALLBACK_SECONDS écoulées (écritures des autres processus)"""
+    collections = collections or _search_collections()
+    if datetime.now().timestamp() - index["synced_at"] > SEARCH_SYNC_FALLBACK_SECONDS:
+        return collections
+    return [name for name in collections if index["versions"].get(name) != _get_write_version(name)]
+
+@st.cache_resource
+def _get_search_wake():
+    """Réveil de l'indexeur, posé à chaque écriture locale d'une collection indexée"""
+    return threading.Event()
+
+def _fts_query(text):
+    # Chaque mot devient un préfixe entre guillemets : pas de syntaxe FTS5 côté utilisateur
+    terms = [term.replace('"', "") for term in text.split()]
+    return " ".join(f'"{term}"*' for term in terms if term)
+
+def _search_indexer_loop(indexer):
+    while True:
+        index = _get_search_index()
+        collections = _search_collections()
+        stale = _stale_search_collections(index, collections)
+        if stale:
+            # Versions lues avant la synchronisation : une écriture pendant celle-ci la relancera
+            versions = {name: _get_write_version(name) for name in stale}
+            try:
+                sync_search_index(stale)
+                index["versions"].update(versions)
+                if len(stale) == len(collections):
+                    index["synced_at"] = datetime.now().timestamp()
+            except Exception:
+                logger.exception("Synchronisation de l'index de recherche en échec")
+        indexer["wake"].wait(SEARCH_SYNC_FALLBACK_SECONDS)
+        indexer["wake"].clear()
+
+@st.cache_resource
+def start_search_indexer():
+    """Thread de synchronisation de l'index de recherche (un par processus)"""
+    indexer = {"wake": _get_search_wake()}
+    worker = threading.Thread(target=_search_indexer_loop, args=(indexer,), name="search-index", daemon=True)
+    worker.start()
+    return indexer
+
+def search_index_ready(unit_id=DEFAULT_UNIT_ID) -> bool:
+    """Premier parcours terminé pour les collections de l'unité"""
+    collections = _search_collections([unit_id])
+    index = _get_search_index()
+    with index["lock"]:
+        done = index["conn"].execute(
+            f"SELECT COUNT(*) FROM search_cursor WHERE collection IN ({', '.join('?' * len(collections))})",
+            collections,
+        ).fetchone()[0]
+    return done == len(collections)
+
+def search_entries(text, unit_id=DEFAULT_UNIT_ID, limit=SEARCH_RESULTS_LIMIT) -> list:
+    """Documents du journal / observations de l'unité contenant tous les mots saisis, du plus récent au plus ancien.
+
+    Lit l'index tel quel ; s'il est en retard (écriture locale, délai de repli écoulé), le thread
+    d'indexation est réveillé et la recherche suivante verra les nouveaux documents.
+    """
+    query = _fts_query(text)
+    if not query:
+        return []
+    index = _get_search_index()
+    if _stale_search_collections(index):
+        start_search_indexer()["wake"].set()
+    collections = _search_collections([unit_id])
+    with index["lock"]:
+        rows = index["conn"].execute(
+            "SELECT d.collection, d.doc_id, d.ts, d.user, d.date, d.heure, d.salle, "
+            "snippet(search_text, 0, '**', '**', '…', 16) "
+            "FROM search_text JOIN search_docs d ON d.rowid = search_text.rowid "
+            f"WHERE search_text MATCH ? AND d.collection IN ({', '.join('?' * len(collections))}) "
+            "ORDER BY d.ts DESC LIMIT ?",
+            (query, *collections, limit),
+        ).fetchall()
+    return [
+        {"collection": c, "id": doc_id, "timestamp": datetime.fromtimestamp(ts, timezone.utc),
+         "user": user, "date": date, "heure": heure, "salle": salle, "extrait": extrait}
+        for c, doc_id, ts, user, date, heure, salle, extrait in rows
+    ]
+
+# --- AGRÉGATS DE CONFORMITÉ (par jour / service / salle) ---
+
+def _rollup_counts(data):
+    """Compteurs d'une fiche ; les anciennes fiches sans compteurs sont relues depuis les chaînes"""
+    if "nb_nok" in data:
+        return {
+            "items_ok": data.get("nb_ok", 0),
+            "items_nok": data.get("nb_nok", 0),
+            "items_na": data.get("nb_na", 0),
+            "isolement": 1 if data.get("isolement") else 0,
         }
-        return items
-    except Exception as e:
-        st.error(f"Erreur lecture {collection_name} : {e}")
+    t_ok = data.get("taches_ok", "") or ""
+    t_nok = data.get("taches_nok", "") or ""
+    nb_na = t_ok.count("(N/A)")
+    nb_auto = t_ok.count("(Auto)")
+    nb_taches = data.get("nb_taches", 0) or 0
+    return {
+        "items_ok": max(nb_taches - nb_na - nb_auto, 0),
+        "items_nok": max((data.get("total_items", 0) or 0) - nb_taches, 0),
+        "items_na": nb_na,
+        "isolement": 1 if "[ISOLEMENT]" in t_ok + t_nok else 0,
+    }
+
+def _rollup_doc_id(date_str, service, salle):
+    # "/" est interdit dans un identifiant Firestore (ex. salle "N/A")
+    return f"{date_str}__{service}__{salle}".replace("/", "-")
+
+def _rollup_writes(data, sign=1, rollup_collection=ROLLUP_COLLECTION):
+    """Incréments atomiques (set merge) du document d'agrégat de la fiche"""
+    if not data.get("date"):
         return []
+    counts = _rollup_counts(data)
+    fields = {
+        "date": data["date"],
+        "service": data.get("service"),
+        "salle": data.get("salle"),
+        "rounds": Increment(sign),
+    }
+    for name, value in counts.items():
+        fields[name] = Increment(sign * value)
+    doc_id = _rollup_doc_id(data["date"], data.get("service"), data.get("salle"))
+    return [(rollup_collection, doc_id, fields)]
+
+def _derived_writes(collection_name, doc_id, data):
+    """Écritures dérivées (collection, id, champs) envoyées dans le même WriteBatch que le document"""
+    if collection_kind(collection_name) == "checklists":
+        return (
+            _rollup_writes(data, 1, sibling_collection(collection_name, ROLLUP_COLLECTION))
+            + _round_progress_writes(doc_id, data, sibling_collection(collection_name, ROUND_PROGRESS_COLLECTION))
+        )
+    return []
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def load_rollups(start_date, end_date, unit_id=DEFAULT_UNIT_ID):
+    """Lit les agrégats de la période : O(jours × zones) petits documents"""
+    pages = storage.iter_range(
+        unit_collection(ROLLUP_COLLECTION, unit_id), "date",
+        start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
+    )
+    rows = [row for page in pages for row in page]
+    record_io(reads=max(len(rows), 1))
+    return pd.DataFrame(rows).drop(columns="id", errors="ignore")
+
+@instrumented("rebuild_rollups")
+def rebuild_rollups(start_date, end_date, unit_id=DEFAULT_UNIT_ID):
+    """Reconstruit les agrégats de la période depuis l'historique des fiches de l'unité.
+
+    Refusé sur les mois archivés : leurs fiches ne sont plus en base, les agrégats
+    existants sont alors la seule trace et restent intacts.
+    """
+    start_str = start_date.strftime("%Y-%m-%d")
+    end_str = end_date.strftime("%Y-%m-%d")
+    archived = sorted(
+        month for month in archived_months(unit_collection("checklists", unit_id))
+        if start_str[:7] <= month <= end_str[:7]
+    )
+    if archived:
+        raise ValueError(f"Mois archivés dans la période ({', '.join(archived)}) : choisir une période plus récente.")
+    rollup_collection = unit_collection(ROLLUP_COLLECTION, unit_id)
+
+    totals = {}
+    scanned = 0
+    pages = storage.iter_range(unit_collection("checklists", unit_id), "date", start_str, end_str)
+    for data in (row for page in pages for row in page):
+        scanned += 1
+        key = _rollup_doc_id(data["date"], data.get("service"), data.get("salle"))
+        row = totals.setdefault(key, {
+            "date": data["date"], "service": data.get("service"), "salle": data.get("salle"),
+            "rounds": 0, "items_ok": 0, "items_nok": 0, "items_na": 0, "isolement": 0,
+        })
+        row["rounds"] += 1
+        for name, value in _rollup_counts(data).items():
+            row[name] += value
+
+    existing = [
+        row["id"] for page in storage.iter_range(rollup_collection, "date", start_str, end_str, fields=["date"])
+        for row in page
+    ]
+    record_io(reads=max(scanned, 1) + max(len(existing), 1))
+    ops = [("delete", rollup_collection, key, None, None) for key in existing if key not in totals]
+    ops += [("set", rollup_collection, key, row, False) for key, row in totals.items()]
+    for i in range(0, len(ops), 500):
+        storage.commit(ops[i:i + 500])
+    record_io(writes=len(ops))
+    load_rollups.clear()
+    return len(totals)
+
+# --- PROGRESSION DES TOURNÉES (Matin / Après-midi) ---
+
+def _round_progress_id(date_str, poste, service):
+    return f"{date_str}__{poste}__{service}".replace("/", "-")
+
+def _round_progress_writes(doc_id, data, progress_collection=ROUND_PROGRESS_COLLECTION):
+    """Marque la zone comme faite dans le document de progression de la tournée"""
+    if data.get("poste") not in ROUND_POSTES:
+        return []
+    progress_id = _round_progress_id(data["date"], data["poste"], data.get("service"))
+    fields = {
+        "date": data["date"],
+        "poste": data["poste"],
+        "service": data.get("service"),
+        "zones": {data["salle"]: {"user": data.get("user"), "heure": data.get("heure"), "entry_id": doc_id}},
+    }
+    return [(progress_collection, progress_id, fields)]
 
-def export_data_by_date(collection_name, start_date, end_date):
-    """Fonction dédiée à l'exportation massive par date"""
+def _release_round_zone(doc_id, data, progress_collection=ROUND_PROGRESS_COLLECTION):
+    """Fiche supprimée : la zone redevient à faire si c'est elle qui l'avait validée (opérations à ajouter au commit)"""
+    if data.get("poste") not in ROUND_POSTES or not data.get("date"):
+        return []
+    progress_id = _round_progress_id(data["date"], data["poste"], data.get("service"))
+    progress = storage.get(progress_collection, progress_id)
+    record_io(reads=1)
+    zone = (progress or {}).get("zones", {}).get(data.get("salle"), {})
+    if zone.get("entry_id") == doc_id:
+        return [("set", progress_collection, progress_id, {"zones": {data["salle"]: DELETE_FIELD}}, True)]
+    return []
+
+@instrumented("load_round_progress")
+def load_round_progress(date_str, poste, service, unit_id=DEFAULT_UNIT_ID):
+    """Zones déjà validées de la tournée : {salle: {user, heure, entry_id}} (une lecture ponctuelle)"""
+    doc_id = _round_progress_id(date_str, poste, service)
+    progress_collection = unit_collection(ROUND_PROGRESS_COLLECTION, unit_id)
+    key = (progress_collection, doc_id)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    version = _get_write_version(progress_collection)
     try:
-        # Conversion des dates sélectionnées en datetime complet pour la requête
-        # Start: 00:00:00 du jour
-        dt_start = datetime.combine(start_date, time.min)
-        # End: 23:59:59 du jour
-        dt_end = datetime.combine(end_date, time.max)
-        
-        # Requête Firestore
-        docs = (
-            db.collection(collection_name)
-            .where("timestamp", ">=", dt_start)
-            .where("timestamp", "<=", dt_end)
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .stream()
-        )
-        
-        items = []
-        for doc in docs:
-            # On ne garde pas l'ID technique dans l'Excel, juste les données
-            items.append(doc.to_dict())
-            
-        return pd.DataFrame(items)
+        progress = storage.get(progress_collection, doc_id)
+        record_io(reads=1)
+        zones = (progress or {}).get("zones", {})
+        _cache_put(key, zones, version, datetime.now().timestamp())
+        return zones
     except Exception as e:
-        st.error(f"Erreur lors de l'export : {e}")
-        return pd.DataFrame()
+        st.error(f"Erreur lecture progression : {e}")
+        return {}
+
+def zone_done_best_effort(date_str, poste, service, salle, unit_id=DEFAULT_UNIT_ID):
+    """La zone a-t-elle déjà été validée sur un autre appareil ? Contrôle au mieux, non atomique.
+
+    Lecture directe (hors cache) du document de progression, juste avant la validation.
+    Un doublon reste possible : fiche encore dans la file d'écriture de l'autre appareil
+    (ou hors ligne), ou deux validations simultanées. Les deux fiches sont alors gardées ;
+    la progression pointe sur la dernière envoyée (son entry_id remplace le précédent).
+    """
+    progress_collection = unit_collection(ROUND_PROGRESS_COLLECTION, unit_id)
+    try:
+        progress = storage.get(progress_collection, _round_progress_id(date_str, poste, service))
+        record_io(reads=1)
+    except Exception:
+        # Contrôle de confort : hors ligne, la validation passe (envoi différé)
+        return salle in load_round_progress(date_str, poste, service, unit_id)
+    return salle in (progress or {}).get("zones", {})
+
+# --- RAPPORTS DE FIN DE POSTE (pré-calculés en arrière-plan) ---
+# Un thread par processus produit, après chaque fin de tournée, un rapport CSV + HTML par secteur
+# dans REPORTS_DIR/<date>/<poste>/ (REPORTS_DIR/units/<unité>/... hors unité par défaut) ;
+# l'affichage lit ces fichiers sans aucune lecture Firestore.
+
+REPORT_FORMATS = {"HTML": ("html", "text/html"), "CSV": ("csv", "text/csv")}
+
+def _reports_root(unit_id):
+    return REPORTS_DIR if unit_id == DEFAULT_UNIT_ID else os.path.join(REPORTS_DIR, UNITS_COLLECTION, unit_id)
+
+def _report_path(date_str, poste, service, fmt, unit_id=DEFAULT_UNIT_ID):
+    return os.path.join(_reports_root(unit_id), date_str, poste, f"{service}.{REPORT_FORMATS[fmt][0]}")
+
+def _write_file_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    os.replace(path + ".tmp", path)
+
+def _shift_report(zones, entries):
+    """Synthèse d'un secteur : une ligne par zone attendue (ou contrôlée hors liste)"""
+    latest = {}
+    for data in sorted(entries, key=lambda d: d.get("heure") or ""):
+        latest[data.get("salle")] = data  # dernière fiche de la zone
+    rows = []
+    for salle in zones + sorted(z for z in latest if z not in zones):
+        data = latest.get(salle)
+        if data is None:
+            rows.append({"salle": salle, "statut": "manquante", "user": "", "heure": "",
+                         "nb_nok": 0, "taches_nok": "", "isolement": False, "observation": ""})
+            continue
+        taches_nok = decode_checklist_items(data)[1]
+        rows.append({
+            "salle": salle,
+            "statut": "faite",
+            "user": get_user_display_name(data.get("user")),
+            "heure": data.get("heure") or "",
+            "nb_nok": data.get("nb_nok", 0),
+            "taches_nok": taches_nok,
+            "isolement": bool(data.get("isolement")),
+            "observation": data.get("observation") or "",
+        })
+    return rows
+
+def _report_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return "\ufeff" + out.getvalue()  # BOM : ouverture directe dans Excel
+
+def _report_html(date_str, poste, service, rows):
+    esc = html.escape
+    done = [r for r in rows if r["statut"] == "faite"]
+    missing = [r["salle"] for r in rows if r["statut"] == "manquante"]
+    nok = [r for r in done if r["nb_nok"]]
+    isolement = [r["salle"] for r in done if r["isolement"]]
+    observations = [r for r in done if r["observation"]]
+
+    parts = [
+        f"<h3>{esc(service)} — {esc(poste)} du {esc(date_str)}</h3>",
+        f"<p><b>Zones faites :</b> {len(done)} / {len(rows)}"
+        f" — <b>manquantes :</b> {esc(', '.join(missing)) or 'aucune'}</p>",
+        f"<p><b>Isolement :</b> {esc(', '.join(isolement)) or 'aucun'}</p>",
+        "<h4>Non-conformités</h4>",
+    ]
+    if nok:
+        parts.append("<table><tr><th>Zone</th><th>Items NOK</th><th>Contrôlé par</th></tr>")
+        parts += [
+            f"<tr><td>{esc(r['salle'])}</td><td>{esc(r['taches_nok'])}</td><td>{esc(r['user'])} ({esc(r['heure'])})</td></tr>"
+            for r in nok
+        ]
+        parts.append("</table>")
+    else:
+        parts.append("<p>Aucune.</p>")
+    parts.append("<h4>Observations</h4>")
+    parts += [f"<p><b>{esc(r['salle'])}</b> ({esc(r['user'])}) : {esc(r['observation'])}</p>" for r in observations]
+    if not observations:
+        parts.append("<p>Aucune.</p>")
+    return "\n".join(parts)
+
+@instrumented("build_shift_reports")
+def build_shift_reports(date_str, poste, unit_id=DEFAULT_UNIT_ID) -> list:
+    """Lit une fois les fiches de la tournée et écrit les rapports de chaque secteur ; retourne les secteurs"""
+    sectors = unit_sectors(unit_id)
+    pages = storage.iter_range(
+        unit_collection("checklists", unit_id), "timestamp",
+        ARCHIVE_EPOCH, datetime.now(timezone.utc) + timedelta(days=1),
+        filters=checked_filters("checklists", {"date": date_str, "poste": poste}),
+    )
+    by_service = {service: [] for service in sectors}
+    for page in pages:
+        record_io(reads=max(len(page), 1))
+        for data in page:
+            by_service.setdefault(data.get("service"), []).append(data)
+
+    built = []
+    for service, entries in by_service.items():
+        if not entries and service not in sectors:
+            continue
+        rows = _shift_report(sectors.get(service, []), entries)
+        if not rows:
+            continue
+        _write_file_atomic(_report_path(date_str, poste, service, "CSV", unit_id), _report_csv(rows))
+        _write_file_atomic(
+            _report_path(date_str, poste, service, "HTML", unit_id), _report_html(date_str, poste, service, rows)
+        )
+        built.append(service)
+    return built
+
+def _due_shifts(now):
+    """Tournées terminées (hier et aujourd'hui) dont la fin + délai de grâce est passée"""
+    for day in (now.date() - timedelta(days=1), now.date()):
+        for poste, end in SHIFT_END_TIMES.items():
+            if now >= datetime.combine(day, end) + timedelta(minutes=REPORT_GRACE_MINUTES):
+                yield day.strftime("%Y-%m-%d"), poste
+
+def run_due_reports(now=None) -> int:
+    """Produit les rapports échus pas encore écrits (reprise après redémarrage comprise)"""
+    built = 0
+    for unit_id in load_units():
+        for date_str, poste in _due_shifts(now or datetime.now()):
+            services = unit_sectors(unit_id)
+            if all(os.path.exists(_report_path(date_str, poste, service, "HTML", unit_id)) for service in services):
+                continue
+            built += len(build_shift_reports(date_str, poste, unit_id))
+    return built
+
+def _report_scheduler_loop(scheduler):
+    while True:
+        try:
+            run_due_reports()
+        except Exception:
+            logger.exception("Erreur du planificateur de rapports de fin de poste")
+        scheduler["wake"].wait(REPORT_SCHEDULER_POLL_SECONDS)
+        scheduler["wake"].clear()
+
+@st.cache_resource
+def start_report_scheduler():
+    """Thread planificateur des rapports (un par processus)"""
+    scheduler = {"wake": threading.Event()}
+    worker = threading.Thread(target=_report_scheduler_loop, args=(scheduler,), name="shift-reports", daemon=True)
+    worker.start()
+    return scheduler
+
+def list_shift_reports(unit_id=DEFAULT_UNIT_ID) -> dict:
+    """{date: {poste: [secteurs]}} des rapports présents sur disque, dates décroissantes"""
+    reports = {}
+    root = _reports_root(unit_id)
+    if not os.path.isdir(root):
+        return reports
+    for date_str in sorted(os.listdir(root), reverse=True):
+        if date_str == UNITS_COLLECTION:
+            continue
+        for poste in SHIFT_END_TIMES:
+            folder = os.path.join(root, date_str, poste)
+            if os.path.isdir(folder):
+                services = sorted(name[:-5] for name in os.listdir(folder) if name.endswith(".html"))
+                reports.setdefault(date_str, {})[poste] = services
+    return reports
+
+def read_shift_report(date_str, poste, service, fmt, unit_id=DEFAULT_UNIT_ID) -> str:
+    with open(_report_path(date_str, poste, service, fmt, unit_id), encoding="utf-8") as f:
+        return f.read()
+
+# --- ANALYSE DE CONFORMITÉ (vectorisée) ---
+
+ANALYTICS_DIMENSIONS = {
+    "Par item": "item",
+    "Par salle": "salle",
+    "Par secteur": "service",
+    "Par poste": "poste",
+    "Par utilisateur": "user",
+}
+
+@st.cache_resource(ttl=ANALYTICS_CACHE_TTL_SECONDS, show_spinner=False)
+def load_item_results(start_date, end_date, unit_id=DEFAULT_UNIT_ID):
+    """Une ligne par (fiche, item) sur la période, mémorisée par plage de dates et par unité.
+
+    Partagé en lecture seule entre les sessions (pas de copie à chaque accès).
+    Une erreur de lecture est propagée : rien n'est mémorisé, le prochain affichage relit.
+    """
+    pages = iter_export_pages(unit_collection("checklists", unit_id), start_date, end_date)
+    df = pd.DataFrame([row for page in pages for row in page])
+    columns = ["date", "service", "salle", "poste", "user", "item", "status"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = df.reindex(columns=["date", "service", "salle", "poste", "user", "items_v", "items_tpl", "items", "taches_ok", "taches_nok"])
+    df["items_v"] = df["items_v"].fillna(1).astype(int)
+
+    # Anciennes fiches : conversion ligne à ligne, limitée aux documents au format texte
+    legacy = df["items"].isna()
+    if legacy.any():
+        converted = [legacy_item_statuses(row) for row in df.loc[legacy].to_dict("records")]
+        df.loc[legacy, "items_tpl"] = [c[0] for c in converted]
+        df.loc[legacy, "items"] = [c[1] for c in converted]
+    df["items_tpl"] = df["items_tpl"].fillna("")
+
+    frames = []
+    for (version, template), group in df.groupby(["items_v", "items_tpl"], sort=False):
+        labels = catalogue_labels(template, version)
+        width = len(labels)
+        group = group[group["items"].str.len() == width]
+        if not width or group.empty:
+            continue
+        # Matrice (fiches × items) des codes de statut, sans boucle Python
+        codes = np.frombuffer("".join(group["items"]).encode("ascii"), dtype="S1").reshape(len(group), width)
+        rows = np.repeat(np.arange(len(group)), width)
+        frame = group[["date", "service", "salle", "poste", "user"]].iloc[rows].reset_index(drop=True)
+        frame["item"] = np.tile(np.array(labels, dtype=object), len(group))
+        frame["status"] = codes.ravel().astype(str)
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    result = pd.concat(frames, ignore_index=True)
+    for name in ["service", "salle", "poste", "user", "item", "status"]:
+        result[name] = result[name].astype("category")
+    return result
+
+def _nonconformity_rates(results, by):
+    """Taux de non-conformité (Non + non renseigné) / items évalués (hors N/A)"""
+    status = results["status"].astype(str)
+    counts = pd.DataFrame({
+        by: results[by],
+        "non_conformes": status.isin([STATUS_NON, STATUS_VIDE]).astype(int),
+        "evalues": (status != STATUS_NA).astype(int),
+    }).groupby(by, observed=True).sum()
+    counts["taux_nc"] = (counts["non_conformes"] / counts["evalues"].where(counts["evalues"] > 0)).round(3)
+    return counts.sort_values("taux_nc", ascending=False)
+
+@st.cache_data(ttl=ANALYTICS_CACHE_TTL_SECONDS, show_spinner=False)
+def compute_compliance_analytics(start_date, end_date, service=None, unit_id=DEFAULT_UNIT_ID):
+    """Tous les indicateurs de la période, calculés une fois par (plage, secteur)"""
+    results = load_item_results(start_date, end_date, unit_id)
+    if service:
+        results = results[results["service"] == service]
+    if results.empty:
+        return {}
+
+    analytics = {label: _nonconformity_rates(results, by) for label, by in ANALYTICS_DIMENSIONS.items()}
+
+    status = results["status"].astype(str)
+    nonconform = status.isin([STATUS_NON, STATUS_VIDE])  # même définition que les taux
+    trend = pd.DataFrame({
+        "date": pd.to_datetime(results["date"].astype(str), errors="coerce"),
+        "non_conformes": nonconform.astype(int),
+        "evalues": (status != STATUS_NA).astype(int),
+    }).groupby("date").sum()
+    trend["taux_nc"] = trend["non_conformes"] / trend["evalues"].where(trend["evalues"] > 0)
+    analytics["Tendance"] = trend
+
+    failures = results[nonconform]
+    analytics["Top non-conformités"] = (
+        failures.groupby(["item", "salle"], observed=True).size()
+        .rename("occurrences").sort_values(ascending=False).head(15).reset_index()
+    )
+    return analytics
+
+# --- UNITÉS DE SOINS (configuration et partitionnement) ---
+# Secteurs, zones, gabarits et listes d'items de chaque unité sont lus dans UNITS_COLLECTION (cache processus).
+# L'unité par défaut garde les collections racine (données existantes) ; les autres unités écrivent
+# sous units/<unité>/<collection> : historique, exports, listeners et agrégats ne lisent que leur unité.
+
+# Gabarits du catalogue utilisables pour une zone (l'isolement s'ajoute à "salle" pendant la tournée)
+BUILTIN_ZONE_TEMPLATES = tuple(name for name in ITEM_CATALOGUES[ITEM_CATALOGUE_VERSION] if name != "isolement")
+
+DEFAULT_UNIT = {
+    "name": "Réanimation",
+    "sectors": SECTOR_ZONES,
+    "templates": {zone: zone_template(zone) for zones in SECTOR_ZONES.values() for zone in zones},
+    "items": {},
+}
+
+@st.cache_resource
+def _get_unit_registry():
+    return {"lock": threading.Lock(), "units": {DEFAULT_UNIT_ID: DEFAULT_UNIT}, "expires_at": 0.0, "version": -1}
+
+def _units_are_fresh(registry, now_ts):
+    return (
+        registry["version"] == _get_write_version(UNITS_COLLECTION)
+        and now_ts < registry["expires_at"]
+    )
+
+def load_units() -> dict:
+    """{identifiant: {name, sectors, templates, items}}, unité par défaut comprise.
+
+    `sectors` : {secteur: [zones]} ; `templates` : {zone: gabarit du catalogue ou liste de l'unité} ;
+    `items` : {liste: {version: [libellés]}}, versions publiées jamais modifiées.
+    """
+    registry = _get_unit_registry()
+    now_ts = datetime.now().timestamp()
+    if _units_are_fresh(registry, now_ts):
+        return registry["units"]
+
+    with registry["lock"]:
+        if _units_are_fresh(registry, now_ts):
+            return registry["units"]
+        version = _get_write_version(UNITS_COLLECTION)
+        try:
+            items = storage.stream_all(UNITS_COLLECTION)
+            record_io(reads=max(len(items), 1))
+            units = {DEFAULT_UNIT_ID: DEFAULT_UNIT}
+            for item in items:
+                unit_id = item.pop("id")
+                base = units.get(unit_id, {})
+                units[unit_id] = {
+                    "name": item.get("name") or unit_id,
+                    "sectors": item.get("sectors") or base.get("sectors", {}),
+                    "templates": item.get("templates") or base.get("templates", {}),
+                    "items": item.get("items") or {},
+                }
+            registry["units"] = units
+            registry["expires_at"] = now_ts + UNIT_CONFIG_TTL_SECONDS
+        except Exception:
+            logger.warning("Configuration des unités indisponible", exc_info=True)
+            registry["expires_at"] = now_ts + UNIT_CONFIG_RETRY_SECONDS
+        registry["version"] = version
+        return registry["units"]
+
+def get_unit(unit_id):
+    return load_units().get(unit_id) or {"name": unit_id, "sectors": {}, "templates": {}, "items": {}}
+
+def unit_sectors(unit_id) -> dict:
+    return get_unit(unit_id)["sectors"]
+
+def unit_zones(unit_id) -> list:
+    return list(dict.fromkeys(zone for zones in unit_sectors(unit_id).values() for zone in zones))
+
+def unit_zone_template(unit_id, salle, isolement_active=False):
+    """Gabarit de la zone configuré pour l'unité ("" si aucun).
+
+    Une liste d'items de l'unité est désignée par sa dernière version (« unité:liste@version »).
+    """
+    unit = get_unit(unit_id)
+    template = unit["templates"].get(salle, "")
+    versions = unit["items"].get(template)
+    if versions:
+        return f"{unit_id}:{template}@{max(versions, key=int)}"
+    return f"{template}+isolement" if template == "salle" and isolement_active else template
+
+def unit_item_labels(template_id):
+    """Libellés d'une version publiée d'une liste d'items d'unité ; vide si elle est inconnue"""
+    ref, _, version = template_id.rpartition("@")
+    unit_id, _, name = ref.partition(":")
+    return get_unit(unit_id)["items"].get(name, {}).get(version, [])
+
+def _is_config_id(value):
+    return bool(value) and value.isascii() and value.replace("-", "").replace("_", "").isalnum()
+
+def save_unit(unit_id, name, sectors, templates, items=None):
+    """Enregistre toute la configuration de l'unité : secteurs et gabarits remplacent les précédents.
+
+    Chaque zone doit avoir un gabarit (BUILTIN_ZONE_TEMPLATES ou liste de `items`, {liste: [libellés]}).
+    Une liste modifiée est publiée comme nouvelle version ; les anciennes restent lisibles par les
+    fiches qui les référencent. Lève ValueError si la configuration est incomplète.
+    """
+    items = items or {}
+    invalid = sorted(t for t in items if not _is_config_id(t) or t in BUILTIN_ZONE_TEMPLATES)
+    if invalid:
+        raise ValueError(f"Nom de liste invalide ou réservé : {', '.join(invalid)}")
+    empty = sorted(t for t, labels in items.items() if not labels)
+    if empty:
+        raise ValueError(f"Liste d'items vide : {', '.join(empty)}")
+
+    current = storage.get(UNITS_COLLECTION, unit_id) or {}
+    record_io(reads=1)
+    published = copy.deepcopy(current.get("items") or {})
+    for template, labels in items.items():
+        versions = published.setdefault(template, {})
+        if not versions or versions[max(versions, key=int)] != list(labels):
+            versions[str(len(versions) + 1)] = list(labels)
+
+    zones = list(dict.fromkeys(zone for zone_list in sectors.values() for zone in zone_list))
+    missing = [
+        zone for zone in zones
+        if templates.get(zone) not in BUILTIN_ZONE_TEMPLATES and templates.get(zone) not in published
+    ]
+    if missing:
+        raise ValueError(f"Zone(s) sans gabarit : {', '.join(missing)}")
+
+    config = {
+        "name": name,
+        "sectors": sectors,
+        "templates": {zone: templates[zone] for zone in zones},
+        "items": published,
+    }
+    # Document remplacé (pas de fusion) : un secteur ou une zone retiré(e) disparaît vraiment
+    storage.commit([("set", UNITS_COLLECTION, unit_id, config, False)])
+    record_io(writes=1)
+    _bump_write_version(UNITS_COLLECTION)
+
+def unit_collection(name, unit_id=None):
+    """Chemin de la collection `name` pour l'unité (par défaut : celle de la session)"""
+    unit_id = unit_id or current_unit()
+    return name if unit_id == DEFAULT_UNIT_ID else f"{UNITS_COLLECTION}/{unit_id}/{name}"
+
+def collection_kind(collection_name):
+    """Nom de base d'un chemin de collection ("units/x/checklists" -> "checklists")"""
+    return collection_name.rsplit("/", 1)[-1]
+
+def collection_unit(collection_name):
+    parts = collection_name.split("/")
+    return parts[1] if len(parts) == 3 and parts[0] == UNITS_COLLECTION else DEFAULT_UNIT_ID
+
+def sibling_collection(collection_name, name):
+    """Collection `name` de la même unité (agrégats, progression des tournées)"""
+    return unit_collection(name, collection_unit(collection_name))
+
+def current_unit():
+    """Unité de la session : choisie par un admin, sinon celle du compte"""
+    return st.session_state.get("unit") or get_user_unit(st.session_state.get("user"))
+
+# --- ANNUAIRE DES UTILISATEURS (cache processus) ---
+
+@st.cache_resource
+def _get_user_directory():
+    """Annuaire partagé par les sessions, rechargé après TTL ou écriture locale"""
+    return {
+        "lock": threading.Lock(),
+        "users": {},
+        "read_at": {},  # identifiant -> date de lecture de son entrée
+        "expires_at": 0.0,
+        "version": -1,
+        # Vérifications réussies récentes : HMAC (clé du processus) -> expiration
+        "memo_lock": threading.Lock(),
+        "memo": OrderedDict(),
+        "memo_key": secrets.token_bytes(32),
+    }
+
+def _directory_is_fresh(directory, now_ts):
+    return (
+        directory["version"] == _get_write_version(USERS_COLLECTION)
+        and now_ts < directory["expires_at"]
+    )
+
+def load_user_directory() -> dict:
+    """{identifiant: document utilisateur} ; une lecture de la collection par TTL et par processus"""
+    directory = _get_user_directory()
+    now_ts = datetime.now().timestamp()
+    if _directory_is_fresh(directory, now_ts):
+        return directory["users"]
+
+    with directory["lock"]:
+        # Une autre session a peut-être rechargé l'annuaire pendant l'attente
+        if _directory_is_fresh(directory, now_ts):
+            return directory["users"]
+        version = _get_write_version(USERS_COLLECTION)
+        try:
+            items = storage.stream_all(USERS_COLLECTION)
+            record_io(reads=max(len(items), 1))
+            directory["users"] = {item.pop("id"): item for item in items}
+            directory["read_at"] = dict.fromkeys(directory["users"], now_ts)
+            directory["expires_at"] = now_ts + USER_DIRECTORY_TTL_SECONDS
+        except Exception:
+            # On garde l'annuaire précédent (ou les noms par défaut) ; nouvel essai peu après
+            logger.warning("Annuaire utilisateurs indisponible", exc_info=True)
+            directory["expires_at"] = now_ts + USER_DIRECTORY_RETRY_SECONDS
+        directory["version"] = version
+        return directory["users"]
+
+def get_user_display_name(username):
+    """Convertit l'identifiant technique en nom d'affichage convivial (sans lecture hors TTL)"""
+    record = load_user_directory().get(username)
+    if record and record.get("display_name"):
+        return record["display_name"]
+    # Retourne le nom par défaut ou l'identifiant original si inconnu
+    return DEFAULT_DISPLAY_NAMES.get(username, username)
+
+def get_user_role(username):
+    record = load_user_directory().get(username)
+    if record and record.get("role") in USER_ROLES:
+        return record["role"]
+    return "admin" if username == ADMIN_USER else "soignant"
+
+def is_admin_user(username):
+    return get_user_role(username) == "admin"
+
+def get_user_unit(username):
+    record = load_user_directory().get(username)
+    return (record or {}).get("unit") or DEFAULT_UNIT_ID
+
+def hash_password(password, iterations=PASSWORD_HASH_ITERATIONS):
+    """PBKDF2-SHA256 salé : "pbkdf2_sha256$itérations$sel$empreinte" """
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+def _check_password_hash(stored, password):
+    try:
+        algorithm, iterations, salt_hex, digest_hex = stored.split("$")
+        if algorithm != "pbkdf2_sha256":
+            return False
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), digest_hex)
+
+def save_user(username, display_name, role, password=None, unit_id=DEFAULT_UNIT_ID):
+    """Crée ou met à jour un compte ; le mot de passe n'est stocké que haché"""
+    fields = {"display_name": display_name, "role": role, "unit": unit_id}
+    if password:
+        fields["password_hash"] = hash_password(password)
+        fields["password"] = DELETE_FIELD
+    storage.commit([("set", USERS_COLLECTION, username, fields, True)])
+    record_io(writes=1)
+    _bump_write_version(USERS_COLLECTION)
+
+def _upgrade_legacy_password(username, password):
+    """Ancien compte en clair : remplacé par son empreinte à la première connexion réussie"""
+    password_hash = hash_password(password)
+    try:
+        storage.commit([("set", USERS_COLLECTION, username, {
+            "password_hash": password_hash, "password": DELETE_FIELD,
+        }, True)])
+        record_io(writes=1)
+        _bump_write_version(USERS_COLLECTION)
+        return password_hash
+    except Exception:
+        logger.warning("Migration du mot de passe de %s impossible", username, exc_info=True)
+        return None
+
+def _auth_memo_key(directory, username, stored, password_input):
+    # Lié à l'empreinte stockée : un changement de mot de passe invalide la mémoire
+    return hmac.new(
+        directory["memo_key"], f"{username}\0{stored}\0{password_input}".encode("utf-8"), hashlib.sha256
+    ).digest()
+
+def verify_password(username, record, password_input):
+    """Vérifie le mot de passe ; les succès récents sont mémorisés (pas de re-hachage lent)"""
+    directory = _get_user_directory()
+    stored = record.get("password_hash") or ""
+    memo_key = _auth_memo_key(directory, username, stored, password_input)
+    now_ts = datetime.now().timestamp()
+    with directory["memo_lock"]:
+        expires_at = directory["memo"].get(memo_key)
+        if expires_at is not None and expires_at > now_ts:
+            directory["memo"].move_to_end(memo_key)
+            return True
+
+    if stored:
+        ok = _check_password_hash(stored, password_input)
+    else:
+        legacy = record.get("password")
+        ok = legacy is not None and hmac.compare_digest(str(legacy).encode("utf-8"), password_input.encode("utf-8"))
+        if ok:
+            stored = _upgrade_legacy_password(username, password_input) or stored
+            memo_key = _auth_memo_key(directory, username, stored, password_input)
+
+    if ok:
+        with directory["memo_lock"]:
+            directory["memo"][memo_key] = now_ts + AUTH_MEMO_TTL_SECONDS
+            directory["memo"].move_to_end(memo_key)
+            while len(directory["memo"]) > AUTH_MEMO_MAX_ENTRIES:
+                directory["memo"].popitem(last=False)
+    return ok
+
+def _refresh_directory_entry(username, record):
+    """Remplace l'entrée en cache d'un compte par le document qui vient d'être lu"""
+    directory = _get_user_directory()
+    with directory["lock"]:
+        users = dict(directory["users"])
+        if record is None:
+            users.pop(username, None)
+        else:
+            users[username] = dict(record)
+        read_at = dict(directory["read_at"])
+        read_at[username] = datetime.now().timestamp()
+        directory["users"] = users
+        directory["read_at"] = read_at
+
+def _cached_user_record(username):
+    """Entrée de l'annuaire et son âge en secondes (None, inf si absente)"""
+    directory = _get_user_directory()
+    record = load_user_directory().get(username)
+    read_at = directory["read_at"].get(username)
+    return record, (datetime.now().timestamp() - read_at) if read_at is not None else float("inf")
 
 # --- AUTHENTIFICATION ---
+@instrumented("check_login_db")
 def check_login_db(username, password_input):
+    """Vérifie d'abord sur l'annuaire en cache, puis sur le document à jour si besoin.
+
+    Le compte n'est relu (une lecture) que si la vérification en cache échoue ou si l'entrée
+    date de plus de USER_RECORD_MAX_AGE_SECONDS : un mot de passe ou un compte créé depuis un
+    autre processus est pris en compte tout de suite, un ancien mot de passe cesse d'être
+    accepté au plus tard après ce délai. Si la lecture échoue, l'annuaire sert de repli.
+    """
     try:
-        doc_ref = db.collection("utilisateurs").document(username)
-        doc = doc_ref.get()
-        if doc.exists:
-            user_data = doc.to_dict()
-            if user_data.get("password") == password_input:
+        record, age = _cached_user_record(username)
+        checked = None
+        if record is not None and age < USER_RECORD_MAX_AGE_SECONDS:
+            if verify_password(username, record, password_input):
                 return True
+            checked = record
+
+        try:
+            fresh = storage.get(USERS_COLLECTION, username)
+            record_io(reads=1)
+        except Exception:
+            logger.warning("Lecture du compte %s impossible : annuaire en cache", username, exc_info=True)
+            fresh = record
+        else:
+            _refresh_directory_entry(username, fresh)
+        # Document inchangé depuis l'échec en cache : inutile de recalculer l'empreinte
+        if fresh is not None and fresh != checked:
+            return verify_password(username, fresh, password_input)
     except Exception:
         return False
     return False
@@ -283,7 +2647,531 @@ def login():
             else:
                 st.error("Erreur d'identifiants")
 
+# --- AFFICHAGE (fragments à relance locale) ---
+
+def render_journal_feed():
+    """Fil du journal (exécuté comme fragment, éventuellement rafraîchi périodiquement)"""
+    items = get_data_with_ids(unit_collection("journal"), limit=LIMIT_JOURNAL_FEED)
+    for item in items:
+        # Affichage NOM CONVIVIAL
+        display_user = get_user_display_name(item.get('user'))
+        st.info(f"**{display_user}** ({item.get('date')} {item.get('heure')}):\n\n{item.get('message')}")
+
+def render_query_filters(collection_name, key_prefix, with_date=True, unit_filters=True):
+    """Widgets de filtres serveur ; seuls les champs renseignés sont retournés.
+
+    `unit_filters=False` : sans secteur ni zone (UNIT_SCOPED_FILTERS), pour les requêtes multi-unités.
+    """
+    filters = {}
+    c1, c2 = st.columns(2)
+    if collection_kind(collection_name) == "checklists":
+        if unit_filters:
+            unit_id = current_unit()
+            services = list(unit_sectors(unit_id)) + ["Autre"]
+            filters["service"] = c1.selectbox("Secteur", ["Tous"] + services, key=f"{key_prefix}_service")
+            filters["salle"] = c2.selectbox(
+                "Zone", ["Toutes"] + unit_zones(unit_id) + ["N/A"], key=f"{key_prefix}_salle"
+            )
+        filters["poste"] = c1.selectbox("Type", ["Tous"] + TYPES_CHECKLIST, key=f"{key_prefix}_poste")
+    filters["user"] = c2.text_input("Identifiant utilisateur", key=f"{key_prefix}_user").strip()
+    if with_date and c1.checkbox("Filtrer par date", key=f"{key_prefix}_use_date"):
+        filters["date"] = c1.date_input("Date", key=f"{key_prefix}_date").strftime("%Y-%m-%d")
+    if collection_kind(collection_name) == "checklists" and c2.checkbox(
+        "Uniquement les non-conformités",
+        key=f"{key_prefix}_has_nok",
+        help="Fiches enregistrées avec au moins un item non conforme ou non renseigné."
+    ):
+        filters["has_nok"] = True
+    return {k: v for k, v in filters.items() if v and v not in ("Tous", "Toutes")}
+
+def render_history_filters(collection_name):
+    with st.expander("🔎 Filtres"):
+        return render_query_filters(collection_name, f"flt_{collection_name}")
+
+def _history_move(state_key, step, cursor=None):
+    pager = st.session_state[state_key]
+    if step > 0 and pager["index"] + 1 == len(pager["cursors"]):
+        pager["cursors"].append(cursor)
+    pager["index"] = max(pager["index"] + step, 0)
+
+def get_visible_history_page(collection_name, filters):
+    """Page visible de l'historique ; les curseurs des pages déjà chargées sont gardés en session"""
+    state_key = f"history_pager_{collection_name}"
+    filters_key = tuple(sorted(filters.items()))
+    pager = st.session_state.get(state_key)
+    if pager is None or pager["filters"] != filters_key:
+        pager = {"filters": filters_key, "cursors": [None], "index": 0}
+        st.session_state[state_key] = pager
+    items, has_more = get_history_page(collection_name, pager["cursors"][pager["index"]], filters)
+    return state_key, pager, items, has_more
+
+def render_history_pager(state_key, pager, items, has_more):
+    c1, c2, c3 = st.columns([1, 1, 1])
+    if pager["index"] > 0:
+        c1.button("⬅️ Plus récents", key=f"{state_key}_prev", on_click=_history_move, args=(state_key, -1))
+    c2.caption(f"Page {pager['index'] + 1}")
+    if has_more and items[-1].get("timestamp") is not None:
+        c3.button(
+            "Charger plus ➡️", key=f"{state_key}_next",
+            on_click=_history_move, args=(state_key, 1, history_cursor(items[-1]))
+        )
+
+def render_checklist_history():
+    """Liste des fiches (exécutée comme fragment : une suppression ne relance que la liste)"""
+    filters = render_history_filters("checklists")
+    collection_name = unit_collection("checklists")
+    state_key, pager, items_c, has_more = get_visible_history_page(collection_name, filters)
+    if not items_c:
+        st.info("Aucune fiche.")
+    for item in items_c:
+        with st.container(border=True):
+            c1, c2 = st.columns([4, 1])
+            with c1:
+                salle_info = f" | 📍 {item.get('salle')}" if item.get("salle") else ""
+                # Affichage NOM CONVIVIAL
+                display_user = get_user_display_name(item.get('user'))
+                st.markdown(f"**{item.get('date')} - {item.get('heure')}** | 👤 {display_user}")
+                st.caption(f"Type : {item.get('poste')} | Secteur : {item.get('service')}{salle_info}")
+
+                if item.get("observation"):
+                    st.warning(f"📝 Note : {item.get('observation')}")
+
+                with st.expander("Voir détails Conformité"):
+                    t_ok, t_nok = decode_checklist_items(item)
+
+                    if t_ok:
+                        st.success(f"✅ **Validé :**\n\n{t_ok}")
+                    if t_nok:
+                        st.error(f"❌ **NON Validé / Manquant :**\n\n{t_nok}")
+                    elif not t_ok and not t_nok:
+                        st.info(f"Détails : {item.get('taches')}")
+
+            with c2:
+                ts = item.get("timestamp")
+                if can_manage_entry(item.get("user"), ts):
+                    st.button(
+                        "🗑️", key=f"del_c_{item['id']}", type="primary",
+                        on_click=delete_document, args=(collection_name, item["id"])
+                    )
+                else:
+                    st.caption("🔒")
+
+    render_history_pager(state_key, pager, items_c, has_more)
+
+def _validate_zone(type_checklist, secteur, salle, template, nb_items, round_batch):
+    """Callback du formulaire de zone : exécuté avant la relance du fragment"""
+    date_str, _, _, unit_id = st.session_state["current_round_key"]
+    if zone_done_best_effort(date_str, type_checklist, secteur, salle, unit_id):
+        # Déjà envoyée depuis un autre appareil : on évite le doublon quand c'est visible
+        st.session_state["current_rooms_status"][salle] = True
+        return
+
+    statuses = "".join(
+        STATUS_BY_CHOICE[st.session_state.get(f"rad_{salle}_{idx}")] for idx in range(nb_items)
+    )
+    data = _build_checklist_data(
+        user=st.session_state["user"],
+        type_checklist=type_checklist,
+        service=secteur,
+        salle=salle,
+        template=template,
+        statuses=statuses,
+        obs=st.session_state.get(f"obs_{salle}", "")
+    )
+    stage_round_entry(data)
+    st.session_state["current_rooms_status"][salle] = True
+    # Dernière zone (ou mode unitaire) : un seul commit pour tout ce qui attend
+    if not round_batch or all(st.session_state["current_rooms_status"].values()):
+        flush_pending_round()
+
+@st.fragment
+def render_sector_round(type_checklist, secteur, round_batch):
+    """Progression + formulaire de zone : chaque interaction ne relance que ce bloc"""
+    unit_id = current_unit()
+    round_key = (datetime.now().strftime("%Y-%m-%d"), type_checklist, secteur, unit_id)
+    if "current_rooms_status" not in st.session_state or st.session_state.get("current_round_key") != round_key:
+        # Changement de secteur / type / jour / unité : on n'abandonne pas les zones déjà validées
+        flush_pending_round()
+        st.session_state["current_round_key"] = round_key
+        items_to_check = unit_sectors(unit_id).get(secteur, [])
+        st.session_state["current_rooms_status"] = {item: False for item in items_to_check}
+
+    # Reprise : zones déjà envoyées depuis cet appareil ou un autre
+    done_zones = load_round_progress(*round_key)
+    rooms_status = st.session_state["current_rooms_status"]
+    for room_name in rooms_status:
+        if room_name in done_zones:
+            rooms_status[room_name] = True
+
+    st.warning("⚠️ Merci de cocher l'état de chaque élément dans la salle (Oui/Non/Non Applicable).")
+
+    st.write("Progression :")
+    cols = st.columns(len(rooms_status))
+    for i, (room_name, is_done) in enumerate(rooms_status.items()):
+        with cols[i]:
+            color = "✅" if is_done else "⏳"
+            st.caption(f"{color} {room_name}")
+            if room_name in done_zones:
+                st.caption(get_user_display_name(done_zones[room_name].get("user")))
+    st.divider()
+
+    salle_active = st.radio("Zone à contrôler :", list(rooms_status.keys()), horizontal=True)
+
+    if salle_active in done_zones:
+        done = done_zones[salle_active]
+        st.success(
+            f"✅ Checklist validée pour **{salle_active}** par "
+            f"{get_user_display_name(done.get('user'))} à {done.get('heure')}."
+        )
+    elif rooms_status[salle_active]:
+        st.success(f"✅ Checklist validée pour **{salle_active}**.")
+    else:
+        st.markdown(f"### 🩺 Contrôle : {salle_active}")
+        isolement_active = False
+        
+        if unit_zone_template(unit_id, salle_active) == "salle":
+            if st.checkbox("⚠️ Salle en isolement ?", key=f"iso_{salle_active}"):
+                isolement_active = True
+
+        template = unit_zone_template(unit_id, salle_active, isolement_active)
+        theoretical_items = catalogue_labels(template)
+
+        with st.form(f"form_{salle_active}"):
+            st.write("**Veuillez renseigner chaque point :**")
+
+            for idx, item in enumerate(theoretical_items):
+                st.markdown(f"**{item}**")
+                st.radio(
+                    label=f"Choix pour {item}",
+                    options=["Oui", "Non", "N/A"],
+                    horizontal=True,
+                    key=f"rad_{salle_active}_{idx}",
+                    label_visibility="collapsed",
+                    index=None 
+                )
+
+            st.markdown("---")
+            st.text_input("Observation (Optionnel)", key=f"obs_{salle_active}")
+
+            st.form_submit_button(
+                f"Valider {salle_active}",
+                type="primary",
+                on_click=_validate_zone,
+                args=(type_checklist, secteur, salle_active, template, len(theoretical_items), round_batch)
+            )
+
+    pending = st.session_state.get("pending_round_entries", {})
+    if pending:
+        st.info(f"📦 {len(pending)} zone(s) validée(s) en attente d'envoi.")
+        st.button("📤 Envoyer le secteur", on_click=flush_pending_round)
+
+    if all(rooms_status.values()) and not pending:
+        st.balloons()
+        st.success(f"🎉 Secteur {secteur} terminé !")
+        st.caption("Choisissez un autre secteur ou type de checklist pour continuer.")
+
+@st.fragment
+def render_journal_history():
+    collection_name = unit_collection("journal")
+    latest_j = get_data_with_ids(collection_name, limit=LIMIT_HISTORY)
+    if latest_j:
+        df_j = pd.DataFrame(latest_j).drop(columns=["id", "timestamp"], errors="ignore")
+        st.download_button("📥 Télécharger Journal (50 derniers)", df_j.to_csv(index=False).encode("utf-8-sig"), "journal.csv", "text/csv")
+
+    filters = render_history_filters("journal")
+    state_key, pager, items_j, has_more = get_visible_history_page(collection_name, filters)
+    for item in items_j:
+        with st.container(border=True):
+            c1, c2 = st.columns([4, 1])
+            with c1:
+                # Affichage NOM CONVIVIAL
+                display_user = get_user_display_name(item.get('user'))
+                st.markdown(f"**{item.get('date')}** | 👤 {display_user}")
+                st.info(item.get("message"))
+            with c2:
+                ts = item.get("timestamp")
+                if can_manage_entry(item.get("user"), ts):
+                    st.button(
+                        "🗑️", key=f"del_j_{item['id']}", type="primary",
+                        on_click=delete_document, args=(collection_name, item["id"])
+                    )
+
+    render_history_pager(state_key, pager, items_j, has_more)
+
+@st.fragment
+def render_search():
+    text = st.text_input("🔍 Rechercher dans le journal et les observations", placeholder="ex. respirateur salle C")
+    if not text.strip():
+        return
+    unit_id = current_unit()
+    results = search_entries(text, unit_id)
+    if not search_index_ready(unit_id):
+        st.info("⏳ Index de recherche en construction : les résultats sont encore partiels.")
+    if not results:
+        st.info("Aucun résultat.")
+        return
+    st.caption(f"{len(results)} résultat(s), du plus récent au plus ancien (max {SEARCH_RESULTS_LIMIT}).")
+    for item in results:
+        with st.container(border=True):
+            source = "📒 Journal" if collection_kind(item["collection"]) == "journal" else f"📋 {item.get('salle')}"
+            st.markdown(
+                f"**{item.get('date')} {item.get('heure') or ''}** | 👤 {get_user_display_name(item.get('user'))} | {source}"
+            )
+            st.markdown(item["extrait"])
+
+def render_shift_reports(is_admin, unit_id):
+    """Rapports de fin de poste déjà produits : lecture de fichiers locaux uniquement"""
+    st.header("Rapports de fin de poste")
+    reports = list_shift_reports(unit_id)
+    if not reports:
+        st.info(
+            "Aucun rapport pour l'instant : ils sont produits automatiquement "
+            f"{REPORT_GRACE_MINUTES} min après la fin de chaque tournée "
+            f"({', '.join(f'{p} {t:%H:%M}' for p, t in SHIFT_END_TIMES.items())})."
+        )
+        return
+
+    c1, c2, c3 = st.columns(3)
+    date_str = c1.selectbox("Date", list(reports))
+    poste = c2.selectbox("Poste", list(reports[date_str]))
+    service = c3.selectbox("Secteur", reports[date_str][poste])
+    if not service:
+        st.info("Aucun rapport pour cette tournée.")
+        return
+
+    st.html(read_shift_report(date_str, poste, service, "HTML", unit_id))
+    cols = st.columns(len(REPORT_FORMATS) + 1)
+    for col, (fmt, (ext, mime)) in zip(cols, REPORT_FORMATS.items()):
+        col.download_button(
+            f"📥 {fmt}", read_shift_report(date_str, poste, service, fmt, unit_id).encode("utf-8"),
+            f"rapport_{date_str}_{poste}_{service}.{ext}", mime,
+        )
+    if is_admin and cols[-1].button("🔁 Régénérer", help="Relit les fiches de la tournée (fiches arrivées en retard)"):
+        build_shift_reports(date_str, poste, unit_id)
+        st.rerun()
+
+def render_user_admin():
+    """Panneau admin : création / mise à jour des comptes (aucune modification de code)"""
+    st.header("Utilisateurs")
+    users = load_user_directory()
+    units = load_units()
+
+    with st.form("user_form", clear_on_submit=True):
+        c1, c2 = st.columns(2)
+        username = c1.text_input("Identifiant").strip()
+        display_name = c2.text_input("Nom d'affichage").strip()
+        role = c1.selectbox("Rôle", USER_ROLES)
+        password = c2.text_input(
+            "Mot de passe", type="password", help="Laisser vide pour conserver le mot de passe d'un compte existant."
+        )
+        unit_id = c1.selectbox("Unité", list(units), format_func=lambda u: units[u]["name"])
+        if st.form_submit_button("Enregistrer"):
+            if not username or not display_name:
+                st.error("Identifiant et nom d'affichage obligatoires.")
+            elif username not in users and not password:
+                st.error("Mot de passe obligatoire pour un nouveau compte.")
+            else:
+                try:
+                    save_user(username, display_name, role, password, unit_id)
+                    st.success(f"Compte **{username}** enregistré.")
+                    users = load_user_directory()
+                except Exception as e:
+                    st.error(f"Erreur enregistrement utilisateur : {e}")
+
+    if users:
+        st.dataframe(pd.DataFrame([
+            {
+                "Identifiant": username,
+                "Nom d'affichage": get_user_display_name(username),
+                "Rôle": get_user_role(username),
+                "Unité": get_unit(get_user_unit(username))["name"],
+                "Mot de passe": "haché" if record.get("password_hash") else "en clair (migré à la connexion)",
+            }
+            for username, record in sorted(users.items())
+        ]), hide_index=True)
+
+def _parse_sectors(text):
+    """ "Secteur : Zone 1, Zone 2" par ligne -> {secteur: [zones]}"""
+    sectors = {}
+    for line in text.splitlines():
+        name, _, zones = line.partition(":")
+        zones = [zone.strip() for zone in zones.split(",") if zone.strip()]
+        if name.strip() and zones:
+            sectors[name.strip()] = zones
+    return sectors
+
+def _parse_zone_templates(text):
+    """ "Zone : gabarit" par ligne -> {zone: gabarit}"""
+    templates = {}
+    for line in text.splitlines():
+        zone, _, template = line.partition(":")
+        if zone.strip() and template.strip():
+            templates[zone.strip()] = template.strip()
+    return templates
+
+def _parse_item_lists(text):
+    """ "[liste]" puis un item par ligne -> {liste: [items]}"""
+    items, current = {}, None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("[") and line.endswith("]"):
+            current = items.setdefault(line[1:-1].strip(), [])
+        elif line and current is not None:
+            current.append(line)
+    return items
+
+def render_unit_admin():
+    """Panneau admin : unités, secteurs, zones, gabarits et listes d'items (aucune modification de code)"""
+    st.header("Unités")
+    units = load_units()
+
+    edited = st.selectbox(
+        "Unité à modifier", [None] + list(units),
+        format_func=lambda u: "➕ Nouvelle unité" if u is None else f"{units[u]['name']} ({u})",
+    )
+    current = units.get(edited, {"name": "", "sectors": {}, "templates": {}, "items": {}})
+    with st.form(f"unit_form_{edited}"):
+        c1, c2 = st.columns(2)
+        unit_id = c1.text_input("Identifiant", value=edited or "", disabled=edited is not None).strip()
+        name = c2.text_input("Nom", value=current["name"]).strip()
+        sectors_text = st.text_area(
+            "Secteurs (un par ligne : « Secteur : Zone 1, Zone 2 »)",
+            value="\n".join(f"{sector} : {', '.join(zones)}" for sector, zones in current["sectors"].items()),
+            height=150,
+        )
+        templates_text = st.text_area(
+            "Gabarit de chaque zone (un par ligne : « Zone : gabarit »)",
+            value="\n".join(f"{zone} : {template}" for zone, template in current["templates"].items()),
+            height=150,
+            help=f"Gabarits du catalogue : {', '.join(BUILTIN_ZONE_TEMPLATES)} ; ou une liste d'items de l'unité.",
+        )
+        items_text = st.text_area(
+            "Listes d'items de l'unité (« [liste] » puis un item par ligne)",
+            value="\n".join(
+                f"[{template}]\n" + "\n".join(versions[max(versions, key=int)])
+                for template, versions in current["items"].items()
+            ),
+            height=150,
+            help="Une liste modifiée devient une nouvelle version ; les fiches déjà saisies gardent la leur.",
+        )
+        if st.form_submit_button("Enregistrer"):
+            sectors = _parse_sectors(sectors_text)
+            if not unit_id or not name or not sectors:
+                st.error("Identifiant, nom et au moins un secteur obligatoires.")
+            elif not _is_config_id(unit_id):
+                st.error("Identifiant : lettres, chiffres, « - » ou « _ » uniquement.")
+            else:
+                try:
+                    save_unit(unit_id, name, sectors, _parse_zone_templates(templates_text), _parse_item_lists(items_text))
+                    st.success(f"Unité **{name}** enregistrée.")
+                    units = load_units()
+                except ValueError as e:
+                    st.error(str(e))
+                except Exception as e:
+                    st.error(f"Erreur enregistrement unité : {e}")
+
+    st.dataframe(pd.DataFrame([
+        {
+            "Identifiant": unit_id,
+            "Nom": unit["name"],
+            "Collections": "(racine)" if unit_id == DEFAULT_UNIT_ID else f"{UNITS_COLLECTION}/{unit_id}/…",
+            "Secteurs": ", ".join(unit["sectors"]),
+            "Zones": len(unit_zones(unit_id)),
+        }
+        for unit_id, unit in units.items()
+    ]), hide_index=True)
+
+def render_archive_admin():
+    """Panneau admin : archivage des mois hors rétention puis purge par lots"""
+    st.caption(
+        "Les mois entièrement antérieurs à la rétention sont écrits dans des archives compressées, "
+        "puis supprimés de la base. Les exports continuent de les inclure."
+    )
+    c1, c2 = st.columns(2)
+    retention = c1.number_input("Rétention (jours)", min_value=30, value=ARCHIVE_RETENTION_DAYS, step=30)
+    collections = [
+        unit_collection(name)
+        for name in c2.multiselect("Collections", ["checklists", "journal"], default=["checklists", "journal"])
+    ]
+
+    durable = archive_store_is_durable()
+    st.caption(f"Archives : {_get_archive_store().describe()}")
+    if not durable:
+        st.warning(
+            "Les archives seraient écrites sur le disque de l'instance, effacé à chaque redéploiement : "
+            "configurer CHECKLIST_ARCHIVE_BUCKET pour activer la purge."
+        )
+    confirmed = st.checkbox(
+        "Je confirme la suppression définitive de la base des documents archivés",
+        key="archive_confirm", disabled=not durable,
+    )
+    if st.button("🗄️ Archiver et purger", disabled=not (collections and confirmed and durable)):
+        bar = st.progress(0.0)
+
+        def on_progress(collection_name, month, done, total):
+            bar.progress(done / total if total else 1.0, text=f"{collection_name} {month} : {done}/{total} supprimé(s)")
+
+        for collection_name in collections:
+            try:
+                summary = archive_and_purge(collection_name, int(retention), on_progress)
+                st.success(
+                    f"{collection_name} : {summary['archived']} document(s) archivé(s) sur "
+                    f"{summary['months']} mois, {summary['deleted']} supprimé(s)."
+                )
+            except Exception as e:
+                st.error(f"Erreur archivage {collection_name} : {e}")
+
+    manifest = load_archive_manifest()
+    if manifest:
+        st.dataframe(pd.DataFrame([
+            {"Collection": collection_name, "Mois": month, "Statut": entry["status"],
+             "Documents": entry.get("rows"), "Supprimés": entry.get("deleted")}
+            for collection_name, months in sorted(manifest.items())
+            for month, entry in sorted(months.items(), reverse=True)
+        ]), hide_index=True)
+
+def render_diagnostics():
+    """Panneau admin : consommation Firestore et latences du processus"""
+    st.header("Diagnostics")
+    if not DIAGNOSTICS_ENABLED:
+        st.info("Instrumentation désactivée : lancer l'application avec CHECKLIST_DIAGNOSTICS=1.")
+
+    cache = get_cache_stats()
+    pending = get_pending_write_stats()
+    live = _get_live_state()
+    with live["lock"]:
+        listeners = sorted(name for name, watch in live["watches"].items() if getattr(watch, "is_active", True))
+        live_hits = live["hits"]
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Cache (hit ratio)", f"{cache['hit_ratio']:.0%}", help=f"{cache['hits']} hits / {cache['misses']} misses")
+    c2.metric("Entrées en cache", cache["entries"], help=f"{cache['evictions']} évictions")
+    c3.metric("Lectures servies en direct", live_hits)
+    c4.metric("Écritures en attente", pending["pending"])
+    st.caption(f"Listeners actifs : {', '.join(listeners) or 'aucun'}")
+
+    if pending["dead"]:
+        st.error(
+            f"{pending['dead']} écriture(s) abandonnée(s) après {WRITE_QUEUE_MAX_ATTEMPTS} essais : "
+            "elles restent dans la file locale jusqu'à un nouvel essai."
+        )
+        st.dataframe(pd.DataFrame(list_dead_writes()), hide_index=True)
+        st.button("Renvoyer les écritures abandonnées", on_click=retry_dead_writes)
+
+    if DIAGNOSTICS_ENABLED:
+        st.caption(
+            f"Depuis le {_get_metrics()['since']:%d/%m %H:%M:%S} — compteurs inclusifs "
+            "(main_app cumule les lectures de tout le rerun)."
+        )
+        table = get_metrics_snapshot()
+        if table.empty:
+            st.info("Aucun appel mesuré pour l'instant.")
+        else:
+            st.dataframe(table, hide_index=True)
+        st.button("Remettre à zéro", on_click=reset_metrics)
+
 # --- APPLICATION ---
+@instrumented("main_app")
 def main_app():
     # Sidebar avec NOM D'AFFICHAGE
     raw_user = st.session_state['user']
@@ -291,131 +3179,71 @@ def main_app():
     
     st.sidebar.title(f"Bonjour ! {display_name}")
     
-    is_admin = (raw_user == ADMIN_USER)
+    is_admin = is_admin_user(raw_user)
     
     if is_admin:
         st.sidebar.markdown("BADGE: 🛡️ **Super Admin**")
 
+    # Unité de travail : celle du compte ; un admin peut passer d'une unité à l'autre
+    units = load_units()
+    if is_admin and len(units) > 1:
+        user_unit = get_user_unit(raw_user)
+        st.sidebar.selectbox(
+            "Unité", list(units), key="unit", format_func=lambda u: units[u]["name"],
+            index=list(units).index(user_unit) if user_unit in units else 0,
+        )
+    unit_id = current_unit()
+    st.sidebar.caption(f"🏥 {get_unit(unit_id)['name']}")
+
+    pending_writes = get_pending_write_stats()
+    if pending_writes["pending"]:
+        st.sidebar.caption(f"⏳ {pending_writes['pending']} enregistrement(s) en attente d'envoi")
+        if pending_writes["failing"]:
+            st.sidebar.caption("📡 Réseau indisponible : nouvel essai automatique.")
+
     if st.sidebar.button("Déconnexion"):
         st.session_state["logged_in"] = False
         st.session_state.pop("user", None)
         st.rerun()
 
-    menu = st.sidebar.radio("Menu", ["📝 Nouvelle Checklist", "📒 Journal", "⚙️ Gestion & Historique"])
+    menu_items = [
+        "📝 Nouvelle Checklist", "📒 Journal", "📈 Conformité", "📊 Analyse", "⚙️ Gestion & Historique",
+        "🧾 Rapports de poste",
+    ]
+    if is_admin:
+        menu_items += ["👥 Utilisateurs", "🏥 Unités", "🩺 Diagnostics"]
+    menu = st.sidebar.radio("Menu", menu_items)
 
     # --- 1. CHECKLIST ---
     if menu == "📝 Nouvelle Checklist":
         st.header("Nouvelle Checklist Hygiène")
 
-        type_checklist = st.selectbox(
-            "Type de checklist",
-            ["Matin", "Après-midi", "Désinfection matériel", "Désinfection respi", "Désinfection salle"]
-        )
+        type_checklist = st.selectbox("Type de checklist", TYPES_CHECKLIST)
 
         if type_checklist in ["Matin", "Après-midi"]:
-            secteur = st.selectbox("Secteur", ["Réa Enfant", "Réa Femme"], key="secteur_selector")
+            secteur = st.selectbox("Secteur", list(unit_sectors(unit_id)), key="secteur_selector")
+            if secteur is None:
+                st.info("Aucun secteur configuré pour cette unité.")
+                return
 
-            if "current_rooms_status" not in st.session_state or st.session_state.get("current_sector_name") != secteur:
-                st.session_state["current_sector_name"] = secteur
-                if secteur == "Réa Enfant":
-                    items_to_check = ROOMS_ENFANT + ["Hall", "Lavabo 1", "Lavabo 2"]
-                else:
-                    items_to_check = ROOMS_FEMME + ["Hall", "Lavabo 3", "Lavabo 4"]
-                st.session_state["current_rooms_status"] = {item: False for item in items_to_check}
-
-            rooms_status = st.session_state["current_rooms_status"]
-            st.warning("⚠️ Merci de cocher l'état de chaque élément dans la salle (Oui/Non/Non Applicable).")
-
-            st.write("Progression :")
-            cols = st.columns(len(rooms_status))
-            for i, (room_name, is_done) in enumerate(rooms_status.items()):
-                with cols[i]:
-                    color = "✅" if is_done else "⏳"
-                    st.caption(f"{color} {room_name}")
-            st.divider()
-
-            salle_active = st.radio("Zone à contrôler :", list(rooms_status.keys()), horizontal=True)
-
-            if rooms_status[salle_active]:
-                st.success(f"✅ Checklist validée pour **{salle_active}**.")
-            else:
-                st.markdown(f"### 🩺 Contrôle : {salle_active}")
-                theoretical_items = []
-                isolement_active = False
-                
-                if salle_active.startswith("Salle"):
-                    if st.checkbox("⚠️ Salle en isolement ?", key=f"iso_{salle_active}"):
-                        isolement_active = True
-
-                if salle_active.startswith("Salle"):
-                    theoretical_items = list(CHECKLIST_ITEMS_ROOM)
-                    if isolement_active:
-                        iso_items_formatted = [f"[ISOLEMENT] {i}" for i in ISOLEMENT_ITEMS]
-                        theoretical_items.extend(iso_items_formatted)
-                elif salle_active == "Hall":
-                    theoretical_items = list(CHECKLIST_ITEMS_HALL)
-                elif salle_active.startswith("Lavabo"):
-                    theoretical_items = list(CHECKLIST_ITEMS_LAVABO)
-
-                with st.form(f"form_{salle_active}"):
-                    current_ok = []
-                    current_nok = []
-                    st.write("**Veuillez renseigner chaque point :**")
-
-                    for idx, item in enumerate(theoretical_items):
-                        st.markdown(f"**{item}**")
-                        choice = st.radio(
-                            label=f"Choix pour {item}",
-                            options=["Oui", "Non", "N/A"],
-                            horizontal=True,
-                            key=f"rad_{salle_active}_{idx}",
-                            label_visibility="collapsed",
-                            index=None 
-                        )
-                        if choice == "Oui":
-                            current_ok.append(item)
-                        elif choice == "N/A":
-                            current_ok.append(f"{item} (N/A)")
-                        elif choice == "Non":
-                            current_nok.append(item)
-                        else:
-                            current_nok.append(f"{item} (Non renseigné)")
-
-                    if salle_active.startswith("Salle") and not isolement_active:
-                        current_ok.append("Pas d'isolement (Auto)")
-
-                    st.markdown("---")
-                    obs_salle = st.text_input("Observation (Optionnel)")
-
-                    if st.form_submit_button(f"Valider {salle_active}", type="primary"):
-                        add_checklist_entry(
-                            user=st.session_state["user"],
-                            type_checklist=type_checklist,
-                            service=secteur,
-                            salle=salle_active,
-                            taches_ok=current_ok,
-                            taches_nok=current_nok,
-                            obs=obs_salle
-                        )
-                        st.session_state["current_rooms_status"][salle_active] = True
-                        st.rerun()
+            round_batch = st.toggle(
+                "📦 Envoi groupé du secteur",
+                value=True,
+                key="round_batch_mode",
+                help="Les zones validées sont envoyées en une seule fois à la fin du secteur."
+            )
 
-            if all(rooms_status.values()):
-                st.balloons()
-                st.success(f"🎉 Secteur {secteur} terminé !")
-                if st.button("Nouveau secteur"):
-                    del st.session_state["current_rooms_status"]
-                    st.rerun()
+            render_sector_round(type_checklist, secteur, round_batch)
 
         else:
             st.info("Checklist standard")
             with st.form("simple_check"):
-                taches = ["Désinfection effectuée", "Matériel rangé"]
-                checked = [t for t in taches if st.checkbox(t)]
-                unchecked = [t for t in taches if t not in checked]
+                statuses = "".join(
+                    STATUS_OUI if st.checkbox(t) else STATUS_NON for t in catalogue_labels("desinfection")
+                )
                 obs = st.text_input("Observation")
                 if st.form_submit_button("Valider"):
-                    add_checklist_entry(st.session_state["user"], type_checklist, "Autre", "N/A", checked, unchecked, obs)
+                    add_checklist_entry(st.session_state["user"], type_checklist, "Autre", "N/A", "desinfection", statuses, obs)
                     st.success("Enregistré")
 
     # --- 2. JOURNAL ---
@@ -427,15 +3255,97 @@ def main_app():
                 add_journal_entry(st.session_state["user"], msg)
                 st.success("Ajouté")
 
+        st.divider()
+        render_search()
+
         st.divider()
         st.subheader("Fil d'actualité")
-        items = get_data_with_ids("journal", limit=LIMIT_JOURNAL_FEED)
-        for item in items:
-            # Affichage NOM CONVIVIAL
-            display_user = get_user_display_name(item.get('user'))
-            st.info(f"**{display_user}** ({item.get('date')} {item.get('heure')}):\n\n{item.get('message')}")
+        auto_refresh = st.toggle("🔄 Actualisation automatique", key="live_refresh_journal")
+        st.fragment(run_every=LIVE_FEED_REFRESH_SECONDS if auto_refresh else None)(render_journal_feed)()
+
+    # --- 3. TABLEAU DE BORD CONFORMITÉ ---
+    elif menu == "📈 Conformité":
+        st.header("Tableau de bord Conformité")
+        c1, c2 = st.columns(2)
+        r_start = c1.date_input("Date début", value=datetime.now() - timedelta(days=7), key="rollup_start")
+        r_end = c2.date_input("Date fin", value=datetime.now(), key="rollup_end")
+
+        try:
+            df_r = load_rollups(r_start, r_end, unit_id)
+        except Exception as e:
+            st.error(f"Erreur lecture des agrégats : {e}")
+            df_r = pd.DataFrame()
 
-    # --- 3. GESTION & EXPORT ---
+        if df_r.empty:
+            st.info("Aucun agrégat sur cette période.")
+        else:
+            counters = ["rounds", "items_ok", "items_nok", "items_na", "isolement"]
+            df_r = df_r.reindex(columns=["date", "service", "salle"] + counters)
+            df_r[counters] = df_r[counters].fillna(0)
+            totals = df_r[counters].sum()
+            evaluated = totals["items_ok"] + totals["items_nok"]
+
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Contrôles", int(totals["rounds"]))
+            m2.metric("Conformité", f"{totals['items_ok'] / evaluated:.1%}" if evaluated else "-")
+            m3.metric("Non-conformités", int(totals["items_nok"]))
+            m4.metric("Salles en isolement", int(totals["isolement"]))
+
+            by_zone = df_r.groupby(["service", "salle"])[counters].sum()
+            zone_evaluated = by_zone["items_ok"] + by_zone["items_nok"]
+            by_zone["conformité"] = (by_zone["items_ok"] / zone_evaluated.where(zone_evaluated > 0)).round(3)
+            st.subheader("Par secteur et zone")
+            st.dataframe(by_zone, use_container_width=True)
+
+            by_day = df_r.groupby("date")[["items_ok", "items_nok"]].sum()
+            day_evaluated = by_day["items_ok"] + by_day["items_nok"]
+            st.subheader("Évolution du taux de conformité")
+            st.line_chart(by_day["items_ok"] / day_evaluated.where(day_evaluated > 0))
+
+        if is_admin:
+            with st.expander("🛠️ Zone Admin : Reconstruire les agrégats"):
+                st.caption("Recalcule les agrégats de la période sélectionnée depuis l'historique des fiches.")
+                if st.button("🔁 Reconstruire"):
+                    with st.spinner("Recalcul en cours..."):
+                        try:
+                            nb_docs = rebuild_rollups(r_start, r_end, unit_id)
+                            st.success(f"{nb_docs} agrégat(s) reconstruit(s).")
+                        except Exception as e:
+                            st.error(f"Erreur reconstruction : {e}")
+
+    # --- 4. ANALYSE ---
+    elif menu == "📊 Analyse":
+        st.header("Analyse de conformité")
+        c1, c2, c3 = st.columns(3)
+        a_start = c1.date_input("Date début", value=datetime.now() - timedelta(days=30), key="analyse_start")
+        a_end = c2.date_input("Date fin", value=datetime.now(), key="analyse_end")
+        a_service = c3.selectbox("Secteur", ["Tous"] + list(unit_sectors(unit_id)), key="analyse_service")
+
+        with st.spinner("Calcul des indicateurs..."):
+            try:
+                analytics = compute_compliance_analytics(
+                    a_start, a_end, None if a_service == "Tous" else a_service, unit_id
+                )
+            except Exception as e:
+                st.error(f"Erreur lecture des fiches : {e}")
+                analytics = None
+
+        if analytics == {}:
+            st.info("Aucune fiche sur cette période.")
+        elif analytics:
+            vue = st.radio("Vue", list(analytics), horizontal=True, key="analyse_vue")
+            table = analytics[vue]
+            if vue == "Tendance":
+                st.line_chart(table["taux_nc"])
+            elif vue == "Top non-conformités":
+                st.bar_chart(table, x="item", y="occurrences")
+            else:
+                if vue == "Par utilisateur":
+                    table = table.rename(index=get_user_display_name)
+                st.bar_chart(table["taux_nc"])
+            st.dataframe(table)
+
+    # --- 5. GESTION & EXPORT ---
     elif menu == "⚙️ Gestion & Historique":
         st.header("Historique & Gestion")
 
@@ -452,112 +3362,80 @@ def main_app():
                     d_start = c1.date_input("Date début", value=datetime.now())
                     d_end = c2.date_input("Date fin", value=datetime.now())
                     
+                    all_units = len(units) > 1 and st.checkbox(
+                        "Toutes les unités", key="export_all_units",
+                        help="Les unités sont lues en parallèle ; une colonne « unite » est ajoutée. "
+                             "Secteur et zone propres à chaque unité : pas de filtre sur ces champs."
+                    )
+                    export_filters = render_query_filters(
+                        "checklists", "export_flt", with_date=False, unit_filters=not all_units
+                    )
+                    fmt_admin = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key="export_fmt_admin")
+                    compress_admin = fmt_admin == "CSV" and st.checkbox("Compresser (gzip)", key="export_gzip_admin")
+
                     if st.button("Rechercher et Préparer le téléchargement"):
                         with st.spinner("Récupération des données depuis le Cloud..."):
-                            df_admin = export_data_by_date("checklists", d_start, d_end)
-                            if not df_admin.empty:
-                                cols_to_drop = ['timestamp']
-                                df_admin = df_admin.drop(columns=[c for c in cols_to_drop if c in df_admin.columns], errors='ignore')
-                                
-                                st.success(f"{len(df_admin)} fiches trouvées.")
-                                fname = f"checklists_{d_start}_{d_end}.csv"
-                                st.download_button(
-                                    "📥 Télécharger le fichier CSV",
-                                    df_admin.to_csv(index=False).encode("utf-8-sig"),
-                                    fname,
-                                    "text/csv"
-                                )
+                            rows = render_streaming_export(
+                                "checklists" if all_units else unit_collection("checklists", unit_id),
+                                d_start, d_end, f"checklists_{d_start}_{d_end}",
+                                fmt_admin, compress_admin, export_filters, list(units) if all_units else None
+                            )
+                            if rows:
+                                st.success(f"{rows} fiches trouvées.")
                             else:
                                 st.warning("Aucune donnée sur cette période.")
+
+                with st.expander("🗄️ Zone Admin : Archivage et purge"):
+                    render_archive_admin()
             else:
                 # Utilisateur Standard
                 st.info("Vous pouvez télécharger les données des dernières 48h.")
+                fmt_user = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key="export_fmt_user")
                 if st.button("📥 Télécharger (48h)"):
                     with st.spinner("Chargement..."):
                         now = datetime.now()
                         start_48 = now - timedelta(days=2)
-                        df_user = export_data_by_date("checklists", start_48, now)
-                        
-                        if not df_user.empty:
-                            cols_to_drop = ['timestamp']
-                            df_user = df_user.drop(columns=[c for c in cols_to_drop if c in df_user.columns], errors='ignore')
-                            
-                            st.download_button(
-                                "📥 Cliquer pour sauvegarder le CSV",
-                                df_user.to_csv(index=False).encode("utf-8-sig"),
-                                "checklists_48h.csv",
-                                "text/csv"
-                            )
-                        else:
+                        if not render_streaming_export(
+                            unit_collection("checklists", unit_id), start_48, now, "checklists_48h", fmt_user, False
+                        ):
                             st.warning("Pas de données récentes.")
 
             st.divider()
-            st.subheader("Aperçu en direct (50 derniers)")
-            
-            # Affichage "Léger" pour consultation rapide
-            items_c = get_data_with_ids("checklists", limit=LIMIT_HISTORY)
-            for item in items_c:
-                with st.container(border=True):
-                    c1, c2 = st.columns([4, 1])
-                    with c1:
-                        salle_info = f" | 📍 {item.get('salle')}" if item.get("salle") else ""
-                        # Affichage NOM CONVIVIAL
-                        display_user = get_user_display_name(item.get('user'))
-                        st.markdown(f"**{item.get('date')} - {item.get('heure')}** | 👤 {display_user}")
-                        st.caption(f"Type : {item.get('poste')} | Secteur : {item.get('service')}{salle_info}")
-
-                        if item.get("observation"):
-                            st.warning(f"📝 Note : {item.get('observation')}")
-
-                        with st.expander("Voir détails Conformité"):
-                            t_ok = item.get("taches_ok", item.get("taches", ""))
-                            t_nok = item.get("taches_nok", "")
-
-                            if t_ok:
-                                st.success(f"✅ **Validé :**\n\n{t_ok}")
-                            if t_nok:
-                                st.error(f"❌ **NON Validé / Manquant :**\n\n{t_nok}")
-                            elif not t_ok and not t_nok:
-                                st.info(f"Détails : {item.get('taches')}")
-
-                    with c2:
-                        ts = item.get("timestamp")
-                        if can_manage_entry(item.get("user"), ts):
-                            if st.button("🗑️", key=f"del_c_{item['id']}", type="primary"):
-                                delete_document("checklists", item["id"])
-                                st.rerun()
-                        else:
-                            st.caption("🔒")
+            st.subheader("Historique des fiches")
+            auto_refresh = st.toggle("🔄 Actualisation automatique", key="live_refresh_checklists")
+            st.fragment(run_every=LIVE_FEED_REFRESH_SECONDS if auto_refresh else None)(render_checklist_history)()
 
         # --- ONGLET JOURNAL ---
         with tab_journ:
             st.subheader("Journal de transmission")
-            items_j = get_data_with_ids("journal", limit=LIMIT_HISTORY)
-            
-            if items_j:
-                df_j = pd.DataFrame(items_j).drop(columns=["id", "timestamp"], errors="ignore")
-                st.download_button("📥 Télécharger Journal (50 derniers)", df_j.to_csv(index=False).encode("utf-8-sig"), "journal.csv", "text/csv")
-
-            for item in items_j:
-                with st.container(border=True):
-                    c1, c2 = st.columns([4, 1])
-                    with c1:
-                        # Affichage NOM CONVIVIAL
-                        display_user = get_user_display_name(item.get('user'))
-                        st.markdown(f"**{item.get('date')}** | 👤 {display_user}")
-                        st.info(item.get("message"))
-                    with c2:
-                        ts = item.get("timestamp")
-                        if can_manage_entry(item.get("user"), ts):
-                            if st.button("🗑️", key=f"del_j_{item['id']}", type="primary"):
-                                delete_document("journal", item["id"])
-                                st.rerun()
+            render_journal_history()
+
+    # --- 6. RAPPORTS DE FIN DE POSTE ---
+    elif menu == "🧾 Rapports de poste":
+        render_shift_reports(is_admin, unit_id)
+
+    # --- 7. UTILISATEURS (admin) ---
+    elif menu == "👥 Utilisateurs":
+        render_user_admin()
+
+    # --- 8. UNITÉS (admin) ---
+    elif menu == "🏥 Unités":
+        render_unit_admin()
+
+    # --- 9. DIAGNOSTICS (admin) ---
+    elif menu == "🩺 Diagnostics":
+        render_diagnostics()
 
 # --- LANCEMENT ---
-if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = False
+# (`streamlit run` exécute le script en __main__ ; l'import seul sert aux benchmarks)
+if __name__ == "__main__":
+    if "logged_in" not in st.session_state:
+        st.session_state["logged_in"] = False
 
-if st.session_state["logged_in"]:
-    main_app()
-else:
-    login()
+    if st.session_state["logged_in"]:
+        start_report_scheduler()
+        start_search_indexer()
+        main_app()
+    else:
+        login()
+        warm_storage_async()
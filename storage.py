@@ -0,0 +1,521 @@
+"""Backends de stockage des fiches et du journal.
+
+Firestore en production ; mémoire et SQLite pour les tests de charge et les
+benchmarks (aucun projet Firebase nécessaire). Les valeurs spéciales
+(SERVER_TIMESTAMP, Increment, DELETE_FIELD) sont définies ici et traduites
+vers celles de Firestore au commit : le client Firestore n'est importé
+qu'à la première utilisation du backend Firestore (démarrage rapide).
+
+Les documents sont renvoyés sous forme de dict avec leur identifiant dans "id".
+Les lectures « récentes » sont triées par `timestamp` décroissant.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import copy
+import json
+import re
+import sqlite3
+import threading
+import uuid
+
+BACKENDS = ("firestore", "memory", "sqlite")
+
+# Nom de champ utilisable dans un chemin JSON SQLite
+_FIELD_NAME = re.compile(r"^\w+$")
+
+
+class _Sentinel:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+SERVER_TIMESTAMP = _Sentinel("SERVER_TIMESTAMP")
+DELETE_FIELD = _Sentinel("DELETE_FIELD")
+
+
+class PreconditionFailed(Exception):
+    """Commit refusé : un document à supprimer (delete_existing) n'existe plus ; rien n'a été écrit"""
+
+
+class Increment:
+    """Incrément atomique d'un compteur numérique"""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _firestore():
+    from firebase_admin import firestore
+    return firestore
+
+
+def _docs_to_items(docs):
+    items = []
+    for doc in docs:
+        item = doc.to_dict()
+        item["id"] = doc.id
+        items.append(item)
+    return items
+
+
+def _as_utc(value):
+    # Comme le client Firestore : un datetime naïf est lu comme UTC
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _apply_write(old, data, now):
+    """Résout les valeurs spéciales de Firestore ; `old` est le document existant (merge) ou None"""
+    result = dict(old or {})
+    for key, value in data.items():
+        if value is DELETE_FIELD:
+            result.pop(key, None)
+        elif value is SERVER_TIMESTAMP:
+            result[key] = now
+        elif isinstance(value, Increment):
+            current = result.get(key)
+            result[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif isinstance(value, dict):
+            current = result.get(key)
+            result[key] = _apply_write(current if isinstance(current, dict) else None, value, now)
+        else:
+            result[key] = _as_utc(value)
+    return result
+
+
+class Storage(ABC):
+    """Interface commune : ajout, lecture des plus récents, plage, lecture ponctuelle, suppression.
+
+    `commit(ops)` applique atomiquement une liste d'opérations ("set", collection, doc_id, data, merge),
+    ("delete", collection, doc_id, None, None) ou ("delete_existing", collection, doc_id, None, None).
+    "delete_existing" fait lever PreconditionFailed au commit entier si le document n'existe plus.
+    """
+
+    def add(self, collection, data, doc_id=None):
+        doc_id = doc_id or uuid.uuid4().hex
+        self.commit([("set", collection, doc_id, data, False)])
+        return doc_id
+
+    @abstractmethod
+    def get(self, collection, doc_id):
+        """Document ou None"""
+
+    def existing_ids(self, keys):
+        """Identifiants déjà présents parmi les (collection, doc_id) demandés"""
+        return {doc_id for collection, doc_id in keys if self.get(collection, doc_id) is not None}
+
+    @abstractmethod
+    def stream_all(self, collection):
+        """Tous les documents d'une petite collection (annuaire, configuration)"""
+
+    @abstractmethod
+    def stream_latest(self, collection, limit, filters=None, before=None, after=None):
+        """Les `limit` plus récents (timestamp puis id décroissants), filtrés par égalité.
+
+        `before` : curseur (timestamp, doc_id) du dernier document de la page précédente ;
+        `after` : timestamp, seuls les documents strictement plus récents sont lus.
+        """
+
+    @abstractmethod
+    def iter_range(self, collection, field, start, end, filters=None, fields=None, page_size=500):
+        """Pages des documents avec start <= field <= end, triés par `field` décroissant.
+
+        `fields` : projection (l'identifiant est toujours renvoyé).
+        """
+
+    def delete(self, collection, doc_id):
+        self.commit([("delete", collection, doc_id, None, None)])
+
+    @abstractmethod
+    def commit(self, ops):
+        """Applique les opérations en une fois (voir la docstring de la classe)"""
+
+    def watch_latest(self, collection, limit, callback):
+        """Abonnement à la fenêtre des `limit` plus récents : callback(items, nb_changements).
+
+        Retourne un objet exposant `is_active` et `unsubscribe()`, ou None si non supporté.
+        """
+        return None
+
+
+# --- FIRESTORE ---
+
+def _to_firestore(value):
+    """Valeurs spéciales locales -> équivalents du client Firestore"""
+    firestore = _firestore()
+    if value is SERVER_TIMESTAMP:
+        return firestore.SERVER_TIMESTAMP
+    if value is DELETE_FIELD:
+        return firestore.DELETE_FIELD
+    if isinstance(value, Increment):
+        return firestore.Increment(value.value)
+    if isinstance(value, dict):
+        return {key: _to_firestore(item) for key, item in value.items()}
+    return value
+
+
+class FirestoreStorage(Storage):
+    def __init__(self, client):
+        self.client = client
+
+    def _query(self, collection, filters):
+        query = self.client.collection(collection)
+        for field, value in sorted((filters or {}).items()):
+            query = query.where(field, "==", value)
+        return query
+
+    def get(self, collection, doc_id):
+        snap = self.client.collection(collection).document(doc_id).get()
+        return snap.to_dict() if snap.exists else None
+
+    def existing_ids(self, keys):
+        refs = [self.client.collection(collection).document(doc_id) for collection, doc_id in keys]
+        return {snap.id for snap in self.client.get_all(refs) if snap.exists}
+
+    def stream_all(self, collection):
+        return _docs_to_items(self.client.collection(collection).stream())
+
+    def stream_latest(self, collection, limit, filters=None, before=None, after=None):
+        descending = _firestore().Query.DESCENDING
+        query = self._query(collection, filters).order_by("timestamp", direction=descending)
+        if after is not None:
+            query = query.where("timestamp", ">", after)
+        if before is not None:
+            # Départage par id : les documents d'un même WriteBatch partagent le timestamp serveur
+            timestamp, doc_id = before
+            query = query.order_by("__name__", direction=descending).start_after(
+                {"timestamp": timestamp, "__name__": doc_id}
+            )
+        return _docs_to_items(query.limit(limit).stream())
+
+    def iter_range(self, collection, field, start, end, filters=None, fields=None, page_size=500):
+        query = (
+            self._query(collection, filters)
+            .where(field, ">=", start)
+            .where(field, "<=", end)
+            .order_by(field, direction=_firestore().Query.DESCENDING)
+        )
+        if fields:
+            query = query.select(list(fields))
+
+        last_doc = None
+        while True:
+            page_query = query.start_after(last_doc) if last_doc is not None else query
+            docs = list(page_query.limit(page_size).stream())
+            if not docs:
+                return
+            yield _docs_to_items(docs)
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+
+    def delete(self, collection, doc_id):
+        self.client.collection(collection).document(doc_id).delete()
+
+    def commit(self, ops):
+        from google.api_core.exceptions import NotFound
+
+        batch = self.client.batch()
+        for op, collection, doc_id, data, merge in ops:
+            ref = self.client.collection(collection).document(doc_id)
+            if op == "delete":
+                batch.delete(ref)
+            elif op == "delete_existing":
+                batch.delete(ref, option=self.client.write_option(exists=True))
+            else:
+                batch.set(ref, _to_firestore(data), merge=merge)
+        try:
+            batch.commit()
+        except NotFound as e:
+            raise PreconditionFailed(str(e)) from e
+
+    def watch_latest(self, collection, limit, callback):
+        query = (
+            self.client.collection(collection)
+            .order_by("timestamp", direction=_firestore().Query.DESCENDING)
+            .limit(limit)
+        )
+        return query.on_snapshot(
+            lambda docs, changes, read_time: callback(_docs_to_items(docs), len(changes))
+        )
+
+
+# --- MÉMOIRE ---
+
+class _LocalWatch:
+    def __init__(self, collection, limit, callback):
+        self.collection, self.limit, self.callback = collection, limit, callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+
+class MemoryStorage(Storage):
+    """Dictionnaires en mémoire du processus ; index par timestamp trié à la demande"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._order = {}  # collection -> [(timestamp, doc_id)] croissant, None si à retrier
+        self._watches = []
+
+    def _latest_keys(self, collection):
+        order = self._order.get(collection)
+        if order is None:
+            docs = self._docs.get(collection, {})
+            order = sorted(
+                (data["timestamp"], doc_id) for doc_id, data in docs.items()
+                if isinstance(data.get("timestamp"), datetime)
+            )
+            self._order[collection] = order
+        return order
+
+    @staticmethod
+    def _matches(data, filters):
+        return all(data.get(field) == value for field, value in filters.items())
+
+    def get(self, collection, doc_id):
+        with self._lock:
+            data = self._docs.get(collection, {}).get(doc_id)
+            return copy.deepcopy(data)
+
+    def stream_all(self, collection):
+        with self._lock:
+            return [dict(copy.deepcopy(data), id=doc_id) for doc_id, data in self._docs.get(collection, {}).items()]
+
+    def stream_latest(self, collection, limit, filters=None, before=None, after=None):
+        filters = filters or {}
+        if before is not None:
+            before = (_as_utc(before[0]), before[1])
+        after = _as_utc(after)
+        items = []
+        with self._lock:
+            docs = self._docs.get(collection, {})
+            for ts, doc_id in reversed(self._latest_keys(collection)):
+                if before is not None and (ts, doc_id) >= before:
+                    continue
+                if after is not None and ts <= after:
+                    break
+                data = docs[doc_id]
+                if self._matches(data, filters):
+                    items.append(dict(data, id=doc_id))
+                    if len(items) >= limit:
+                        break
+        return items
+
+    def iter_range(self, collection, field, start, end, filters=None, fields=None, page_size=500):
+        filters = filters or {}
+        start, end = _as_utc(start), _as_utc(end)
+        with self._lock:
+            matches = sorted(
+                (
+                    (data[field], doc_id, data)
+                    for doc_id, data in self._docs.get(collection, {}).items()
+                    if data.get(field) is not None and start <= data[field] <= end and self._matches(data, filters)
+                ),
+                key=lambda row: (row[0], row[1]),
+                reverse=True,
+            )
+        for i in range(0, len(matches), page_size):
+            page = []
+            for _, doc_id, data in matches[i:i + page_size]:
+                row = {name: data[name] for name in fields if name in data} if fields else dict(data)
+                row["id"] = doc_id
+                page.append(row)
+            yield page
+
+    def commit(self, ops):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for op, collection, doc_id, _, _ in ops:
+                if op == "delete_existing" and doc_id not in self._docs.get(collection, {}):
+                    raise PreconditionFailed(f"{collection}/{doc_id} n'existe plus")
+            touched = {}
+            for op, collection, doc_id, data, merge in ops:
+                docs = self._docs.setdefault(collection, {})
+                if op in ("delete", "delete_existing"):
+                    docs.pop(doc_id, None)
+                else:
+                    docs[doc_id] = _apply_write(docs.get(doc_id) if merge else None, data, now)
+                self._order[collection] = None
+                touched[collection] = touched.get(collection, 0) + 1
+            watches = [w for w in self._watches if w.is_active and w.collection in touched]
+        for watch in watches:
+            watch.callback(self.stream_latest(watch.collection, watch.limit), touched[watch.collection])
+
+    def watch_latest(self, collection, limit, callback):
+        watch = _LocalWatch(collection, limit, callback)
+        with self._lock:
+            self._watches = [w for w in self._watches if w.is_active] + [watch]
+        items = self.stream_latest(collection, limit)
+        callback(items, len(items))
+        return watch
+
+
+# --- SQLITE ---
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$ts": value.isoformat()}
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def _json_object(obj):
+    if len(obj) == 1 and "$ts" in obj:
+        return datetime.fromisoformat(obj["$ts"])
+    return obj
+
+
+class SQLiteStorage(Storage):
+    """Un fichier SQLite (WAL), documents en JSON ; timestamp indexé pour les lectures récentes"""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "collection TEXT NOT NULL, doc_id TEXT NOT NULL, ts REAL, data TEXT NOT NULL, "
+            "PRIMARY KEY (collection, doc_id))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS documents_latest ON documents (collection, ts DESC, doc_id DESC)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _where(collection, filters):
+        clauses, params = ["collection = ?"], [collection]
+        for field, value in sorted((filters or {}).items()):
+            if not _FIELD_NAME.match(field):
+                raise ValueError(f"Nom de champ invalide : {field}")
+            clauses.append(f"json_extract(data, '$.{field}') = ?")
+            params.append(value)
+        return clauses, params
+
+    @staticmethod
+    def _ts(value):
+        value = _as_utc(value)
+        return value.timestamp() if isinstance(value, datetime) else None
+
+    def _load(self, doc_id, payload):
+        item = json.loads(payload, object_hook=_json_object)
+        item["id"] = doc_id
+        return item
+
+    def get(self, collection, doc_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+            ).fetchone()
+        return json.loads(row[0], object_hook=_json_object) if row else None
+
+    def stream_all(self, collection):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, data FROM documents WHERE collection = ?", (collection,)
+            ).fetchall()
+        return [self._load(doc_id, payload) for doc_id, payload in rows]
+
+    def stream_latest(self, collection, limit, filters=None, before=None, after=None):
+        clauses, params = self._where(collection, filters)
+        clauses.append("ts IS NOT NULL")
+        if before is not None:
+            clauses.append("(ts, doc_id) < (?, ?)")
+            params += [self._ts(before[0]), before[1]]
+        if after is not None:
+            clauses.append("ts > ?")
+            params.append(self._ts(after))
+        sql = f"SELECT doc_id, data FROM documents WHERE {' AND '.join(clauses)} ORDER BY ts DESC, doc_id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit]).fetchall()
+        return [self._load(doc_id, payload) for doc_id, payload in rows]
+
+    def iter_range(self, collection, field, start, end, filters=None, fields=None, page_size=500):
+        clauses, params = self._where(collection, filters)
+        if field == "timestamp":
+            column, start, end = "ts", self._ts(start), self._ts(end)
+        elif _FIELD_NAME.match(field):
+            column = f"json_extract(data, '$.{field}')"
+        else:
+            raise ValueError(f"Nom de champ invalide : {field}")
+        clauses.append(f"{column} BETWEEN ? AND ?")
+        params += [start, end]
+
+        last = None
+        while True:
+            page_clauses, page_params = list(clauses), list(params)
+            if last is not None:
+                # Pagination par clé (valeur, id) : coût constant quelle que soit la page
+                page_clauses.append(f"({column}, doc_id) < (?, ?)")
+                page_params += list(last)
+            sql = (
+                f"SELECT {column}, doc_id, data FROM documents WHERE {' AND '.join(page_clauses)} "
+                f"ORDER BY {column} DESC, doc_id DESC LIMIT ?"
+            )
+            with self._lock:
+                rows = self._conn.execute(sql, page_params + [page_size]).fetchall()
+            if not rows:
+                return
+            page = []
+            for _, doc_id, payload in rows:
+                item = self._load(doc_id, payload)
+                if fields:
+                    item = {name: item[name] for name in list(fields) + ["id"] if name in item}
+                page.append(item)
+            yield page
+            if len(rows) < page_size:
+                return
+            last = (rows[-1][0], rows[-1][1])
+
+    def commit(self, ops):
+        now = datetime.now(timezone.utc)
+        with self._lock, self._conn:
+            for op, collection, doc_id, data, merge in ops:
+                if op in ("delete", "delete_existing"):
+                    deleted = self._conn.execute(
+                        "DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+                    ).rowcount
+                    if op == "delete_existing" and not deleted:
+                        # Sortie du bloc `with self._conn` : la transaction est annulée
+                        raise PreconditionFailed(f"{collection}/{doc_id} n'existe plus")
+                    continue
+                old = None
+                if merge:
+                    row = self._conn.execute(
+                        "SELECT data FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+                    ).fetchone()
+                    old = json.loads(row[0], object_hook=_json_object) if row else None
+                doc = _apply_write(old, data, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (collection, doc_id, ts, data) VALUES (?, ?, ?, ?)",
+                    (collection, doc_id, self._ts(doc.get("timestamp")),
+                     json.dumps(doc, default=_json_default, ensure_ascii=False)),
+                )
+
+
+# Magasins mémoire nommés, partagés par tout le processus (y compris entre reruns)
+_MEMORY_STORES = {}
+_MEMORY_STORES_LOCK = threading.Lock()
+
+
+def open_storage(backend, location=None, firestore_client=None):
+    """Backend `backend` ("firestore", "memory" ou "sqlite").
+
+    `location` : chemin du fichier SQLite, ou nom du magasin mémoire partagé.
+    """
+    if backend == "firestore":
+        return FirestoreStorage(firestore_client)
+    if backend == "memory":
+        with _MEMORY_STORES_LOCK:
+            return _MEMORY_STORES.setdefault(location or "default", MemoryStorage())
+    if backend == "sqlite":
+        return SQLiteStorage(location or "checklists.sqlite3")
+    raise ValueError(f"Backend de stockage inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
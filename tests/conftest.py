@@ -0,0 +1,63 @@
+"""Tests sur le backend mémoire : aucun projet Firebase nécessaire.
+
+    python -m pytest -q
+
+Le module de l'application est importé une fois, depuis un répertoire
+temporaire (file d'écriture, index et archives y sont créés).
+"""
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="checklists-tests-")
+
+os.environ["CHECKLIST_STORAGE"] = "memory"
+os.environ["CHECKLIST_ARCHIVE_DIR"] = os.path.join(WORK_DIR, "archives")
+os.environ["CHECKLIST_SEARCH_INDEX"] = os.path.join(WORK_DIR, "search_index.sqlite3")
+os.environ["CHECKLIST_REPORTS_DIR"] = os.path.join(WORK_DIR, "reports")
+os.chdir(WORK_DIR)
+sys.path.insert(0, ROOT)
+
+
+# Caches de processus vidés entre deux tests
+RESET_CACHES = (
+    "get_storage", "_get_shared_cache", "_get_live_state", "_get_unit_registry", "_get_user_directory",
+    "load_rollups", "load_item_results", "compute_compliance_analytics", "_get_archive_store", "_get_archive_state",
+    "_get_search_index", "_get_search_wake",
+)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    return importlib.import_module("checklists_hygiene")
+
+
+@pytest.fixture
+def app(app_module):
+    """Module de l'application avec un magasin mémoire et des caches vides"""
+    import storage
+
+    storage._MEMORY_STORES.clear()
+    for cached in RESET_CACHES:
+        getattr(app_module, cached).clear()
+    yield app_module
+
+
+@pytest.fixture
+def write_queue(app, tmp_path, monkeypatch):
+    """File d'écriture propre au test, sans thread d'envoi : on la vide avec drain()"""
+    queue = app._open_write_queue(str(tmp_path / "write_queue.sqlite3"))
+    monkeypatch.setattr(app, "_get_write_queue", lambda: queue)
+    return queue
+
+
+@pytest.fixture
+def drain(app, write_queue):
+    def run():
+        while app._drain_write_queue_once(write_queue):
+            pass
+    return run
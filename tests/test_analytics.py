@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+
+def test_top_nonconformities_count_missing_answers(app, write_queue, drain):
+    width = len(app.catalogue_labels("salle", app.ITEM_CATALOGUE_VERSION))
+    entries = [
+        app._build_checklist_data("alice", "Matin", "Réa Enfant", "Salle A", "salle", statuses.ljust(width, app.STATUS_OUI), "")
+        for statuses in (
+            app.STATUS_NON,
+            app.STATUS_VIDE,
+            app.STATUS_NA + app.STATUS_VIDE,
+        )
+    ]
+    app.enqueue_writes([("checklists", data) for data in entries])
+    drain()
+
+    today = date.today()
+    analytics = app.compute_compliance_analytics(today, today)
+    top = analytics["Top non-conformités"]
+    assert int(top["occurrences"].sum()) == 3
+    assert int(analytics["Par secteur"]["non_conformes"].sum()) == 3
+
+
+def test_read_errors_are_not_cached(app, monkeypatch):
+    today = date.today()
+    backend = app.get_storage()
+    real_iter_range = backend.iter_range
+
+    def failing_iter_range(*args, **kwargs):
+        raise ConnectionError("quota dépassé")
+
+    monkeypatch.setattr(backend, "iter_range", failing_iter_range)
+    with pytest.raises(ConnectionError):
+        app.load_item_results(today, today)
+
+    monkeypatch.setattr(backend, "iter_range", real_iter_range)
+    statuses = app.STATUS_OUI * len(app.catalogue_labels("salle", app.ITEM_CATALOGUE_VERSION))
+    app.storage.add("checklists", app._build_checklist_data("alice", "Matin", "Réa Enfant", "Salle A", "salle", statuses, ""))
+    assert len(app.load_item_results(today, today)) == len(statuses)
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def old_entries(app, tmp_path, monkeypatch):
+    """Trois fiches d'il y a deux ans (agrégats compris) et une fiche du jour"""
+    monkeypatch.setattr(app, "ARCHIVE_DIR", str(tmp_path / "archives"))
+    old = datetime.now(timezone.utc) - timedelta(days=730)
+    ops = []
+    for i, when in enumerate([old, old, old, datetime.now(timezone.utc)]):
+        data = app._build_checklist_data("alice", "Matin", "Réa Enfant", f"Salle {i}", "salle", app.STATUS_OUI, "")
+        data.update(timestamp=when, date=when.strftime("%Y-%m-%d"))
+        ops.append(("set", "checklists", f"fiche{i}", data, False))
+        ops += [("set", c, d, f, True) for c, d, f in app._derived_writes("checklists", f"fiche{i}", data)]
+    app.get_storage().commit(ops)
+    return old
+
+
+def test_purge_keeps_months_readable_from_archives(app, old_entries):
+    summary = app.archive_and_purge("checklists", 365)
+    assert summary == {"months": 1, "archived": 3, "deleted": 3}
+
+    backend = app.get_storage()
+    assert backend.get("checklists", "fiche0") is None
+    assert backend.get("checklists", "fiche3") is not None
+    assert old_entries.strftime("%Y-%m") in app.archived_months("checklists")
+
+    pages = app.iter_export_pages("checklists", old_entries.date(), datetime.now().date())
+    assert sum(len(page) for page in pages) == 4
+
+
+def test_rebuild_refuses_archived_months(app, old_entries):
+    app.archive_and_purge("checklists", 365)
+    day = old_entries.date()
+    with pytest.raises(ValueError):
+        app.rebuild_rollups(day, day)
+    app.load_rollups.clear()
+    assert app.load_rollups(day, day)["rounds"].sum() == 3
+
+
+def test_purge_refused_when_archives_would_stay_on_instance_disk(app, old_entries, monkeypatch):
+    monkeypatch.setattr(app, "STORAGE_BACKEND", "firestore")
+    with pytest.raises(RuntimeError):
+        app.archive_and_purge("checklists", 365)
+    assert app.get_storage().get("checklists", "fiche0") is not None
@@ -0,0 +1,8 @@
+def test_each_fetch_counts_one_miss(app):
+    app.storage.add("notes", {"message": "a", "timestamp": app.SERVER_TIMESTAMP})
+    app.get_data_with_ids("notes", limit=5)
+    app.get_data_with_ids("notes", limit=5)
+
+    stats = app.get_cache_stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,54 @@
+def _add_note(app, message):
+    app.storage.add("notes", {"message": message, "timestamp": app.SERVER_TIMESTAMP})
+    app._bump_write_version("notes")
+
+
+def _spy_stream_latest(app, monkeypatch):
+    calls = []
+    backend = app.get_storage()
+    real = backend.stream_latest
+
+    def spy(collection, limit, *args, **kwargs):
+        calls.append(kwargs.get("after"))
+        return real(collection, limit, *args, **kwargs)
+
+    monkeypatch.setattr(backend, "stream_latest", spy)
+    return calls
+
+
+def test_new_documents_are_merged_into_cached_window(app, monkeypatch):
+    for message in ("a", "b", "c"):
+        _add_note(app, message)
+    first = app.get_data_with_ids("notes", limit=3)
+    calls = _spy_stream_latest(app, monkeypatch)
+
+    _add_note(app, "d")
+    window = app.get_data_with_ids("notes", limit=3)
+
+    assert calls == [first[0]["timestamp"]], "seuls les documents plus récents sont relus"
+    assert [item["message"] for item in window] == ["d", "c", "b"]
+
+
+def test_empty_delta_keeps_cached_window(app, monkeypatch):
+    _add_note(app, "a")
+    first = app.get_data_with_ids("notes", limit=5)
+    calls = _spy_stream_latest(app, monkeypatch)
+
+    app._bump_write_version("notes")
+    window = app.get_data_with_ids("notes", limit=5)
+
+    assert len(calls) == 1 and calls[0] is not None
+    assert window == first
+
+
+def test_old_window_is_fully_reloaded(app, monkeypatch):
+    _add_note(app, "a")
+    app.get_data_with_ids("notes", limit=5)
+    entry = app._cache_peek(app._cache_key("notes", 5))
+    entry["full_at"] -= app.DELTA_FULL_RESYNC_SECONDS + 1
+    calls = _spy_stream_latest(app, monkeypatch)
+
+    app._bump_write_version("notes")
+    app.get_data_with_ids("notes", limit=5)
+
+    assert calls == [None], "relecture complète pour réconcilier les suppressions externes"
@@ -0,0 +1,63 @@
+import datetime as dt
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+
+def _add_checklist(app, salle="Box 1"):
+    data = app._build_checklist_data("alice", "Matin", "Réa Enfant", salle, "salle", app.STATUS_OUI, "RAS")
+    app.storage.add("checklists", dict(data, timestamp=app.SERVER_TIMESTAMP))
+    return data
+
+
+def test_rows_are_coerced_to_schema_types(app):
+    schema = {"date": "date", "heure": "time", "nb_ok": "int", "has_nok": "bool", "user": "string"}
+    row = app._coerce_export_row({"date": "2024-03-01", "heure": "07:30:00", "nb_ok": "12", "has_nok": 0, "user": 7},
+                                 schema)
+    assert row == {"date": dt.date(2024, 3, 1), "heure": dt.time(7, 30), "nb_ok": 12, "has_nok": False, "user": "7"}
+
+
+def test_invalid_or_missing_values_become_empty(app):
+    schema = {"date": "date", "nb_ok": "int", "observation": "string"}
+    assert app._coerce_export_row({"date": "01/03/2024", "nb_ok": "beaucoup"}, schema) == {
+        "date": None, "nb_ok": None, "observation": None,
+    }
+
+
+def test_parquet_export_has_typed_columns(app):
+    data = _add_checklist(app)
+    today = dt.date.today()
+
+    out, rows = app.stream_export("checklists", today, today, fmt="Parquet")
+    table = pq.read_table(out)
+
+    assert rows == 1
+    assert table.column_names == list(app.EXPORT_SCHEMAS["checklists"])
+    assert table.schema.field("date").type == pa.date32()
+    assert pa.types.is_time(table.schema.field("heure").type)  # Parquet stocke les secondes en millisecondes
+    assert table.schema.field("nb_ok").type == pa.int32()
+    assert table.schema.field("has_nok").type == pa.bool_()
+    exported = table.to_pylist()[0]
+    assert exported["date"] == today
+    assert exported["nb_ok"] == data["nb_ok"]
+    assert exported["has_nok"] is False
+
+
+def test_excel_export_writes_native_cells(app):
+    _add_checklist(app)
+    today = dt.date.today()
+
+    out, rows = app.stream_export("journal", today, today, fmt="Excel")
+    assert rows == 0
+    header = next(load_workbook(out, read_only=True)["export"].iter_rows(values_only=True))
+    assert list(header) == list(app.EXPORT_SCHEMAS["journal"])
+
+    out, rows = app.stream_export("checklists", today, today, fmt="Excel")
+    sheet = load_workbook(out, read_only=True)["export"]
+    header, values = list(sheet.iter_rows(values_only=True))
+    cells = dict(zip(header, values))
+    assert rows == 1
+    assert cells["date"].date() == today
+    assert isinstance(cells["nb_taches"], int)
+    assert cells["has_nok"] is False
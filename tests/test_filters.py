@@ -0,0 +1,44 @@
+import pytest
+
+
+def _save(app, write_queue, drain, *entries):
+    app.enqueue_writes([
+        ("checklists", app._build_checklist_data("alice", poste, service, salle, "salle", statuses, ""))
+        for poste, service, salle, statuses in entries
+    ])
+    drain()
+
+
+def test_history_filters_are_pushed_to_storage(app, write_queue, drain):
+    _save(
+        app, write_queue, drain,
+        ("Matin", "Réa Enfant", "Salle 1", app.STATUS_OUI),
+        ("Matin", "Réa Enfant", "Salle 2", app.STATUS_NON),
+        ("Après-midi", "Réa Adulte", "Salle 3", app.STATUS_NON),
+    )
+
+    page, has_more = app.get_history_page("checklists", None, {"service": "Réa Enfant"})
+    assert {item["salle"] for item in page} == {"Salle 1", "Salle 2"} and not has_more
+
+    page, _ = app.get_history_page("checklists", None, {"has_nok": True, "poste": "Matin"})
+    assert [item["salle"] for item in page] == ["Salle 2"]
+
+
+def test_filtered_pages_are_cached_per_filter_set(app, write_queue, drain):
+    _save(app, write_queue, drain, ("Matin", "Réa Enfant", "Salle 1", app.STATUS_OUI))
+    app.get_history_page("checklists", None, {"service": "Réa Enfant"})
+    app.get_history_page("checklists", None, {"service": "Réa Adulte"})
+    app.get_history_page("checklists", None, {"service": "Réa Enfant"})
+
+    stats = app.get_cache_stats()
+    assert (stats["misses"], stats["hits"]) == (2, 1)
+
+
+def test_unindexed_filters_are_rejected(app):
+    assert app.checked_filters("journal", {"user": "alice"}) == {"user": "alice"}
+    assert app.checked_filters("checklists") == {}
+    assert app.checked_filters("units/neo/checklists", {"salle": "Box 1"}) == {"salle": "Box 1"}
+    with pytest.raises(ValueError):
+        app.checked_filters("journal", {"service": "Réa Enfant"})
+    with pytest.raises(ValueError):
+        app.checked_filters("checklists", {"observation": "RAS"})
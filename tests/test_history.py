@@ -0,0 +1,48 @@
+def test_round_spanning_a_page_boundary_is_fully_listed(app, write_queue, drain):
+    size = app.HISTORY_PAGE_SIZE
+    earlier = app.enqueue_writes([("journal", {"user": "alice", "message": "avant"})])
+    drain()
+    # Une tournée envoyée en un seul commit : tous ses documents ont le même timestamp
+    round_ids = app.enqueue_writes([("journal", {"user": "alice", "message": f"zone {i}"}) for i in range(size + 5)])
+    drain()
+
+    seen, cursor = [], None
+    for _ in range(5):
+        page, has_more = app.get_history_page("journal", cursor, {"user": "alice"})
+        seen += [item["id"] for item in page]
+        if not has_more:
+            break
+        cursor = app.history_cursor(page[-1])
+
+    assert len(seen) == len(set(seen))
+    assert set(seen) == set(round_ids + earlier)
+    assert seen[-1] == earlier[0]
+
+
+def _journal_pages(app, write_queue, drain, count):
+    app.enqueue_writes([("journal", {"user": "alice", "message": f"message {i}"}) for i in range(count)])
+    drain()
+    first, _ = app.get_history_page("journal", None, {"user": "alice"})
+    cursor = app.history_cursor(first[-1])
+    return cursor, app.get_history_page("journal", cursor, {"user": "alice"})
+
+
+def test_delete_on_a_cached_page_keeps_the_next_page_reachable(app, write_queue, drain):
+    size = app.HISTORY_PAGE_SIZE
+    cursor, (page, has_more) = _journal_pages(app, write_queue, drain, 2 * size + 2)
+    assert len(page) == size and has_more
+
+    app.delete_document("journal", page[0]["id"])
+    page, has_more = app.get_history_page("journal", cursor, {"user": "alice"})
+    assert len(page) == size and has_more
+
+
+def test_last_page_has_no_next_page(app, write_queue, drain):
+    size = app.HISTORY_PAGE_SIZE
+    _, (page, has_more) = _journal_pages(app, write_queue, drain, 2 * size)
+    assert len(page) == size and not has_more
+
+
+def test_fetch_locks_are_released_after_loading(app, write_queue, drain):
+    _journal_pages(app, write_queue, drain, 3)
+    assert app._get_shared_cache()["inflight"] == {}
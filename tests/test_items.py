@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+
+def _statuses(app, template):
+    """Statuts couvrant les quatre codes, à la largeur du gabarit"""
+    width = len(app.catalogue_labels(template))
+    cycle = app.STATUS_OUI + app.STATUS_NON + app.STATUS_NA + app.STATUS_VIDE
+    return (cycle * width)[:width]
+
+
+def _legacy(app, salle, template, statuses):
+    """Ancienne fiche : libellés en clair, sans encodage compact"""
+    encoded = app._build_checklist_data("alice", "Matin", "Réa Enfant", salle, template, statuses, "")
+    taches_ok, taches_nok = app.decode_checklist_items(encoded)
+    return {"user": "alice", "date": encoded["date"], "heure": encoded["heure"], "poste": "Matin",
+            "service": "Réa Enfant", "salle": salle, "taches_ok": taches_ok, "taches_nok": taches_nok}
+
+
+@pytest.mark.parametrize("salle, template", [
+    ("Salle 3", "salle"),
+    ("Salle 4", "salle+isolement"),
+    ("Hall", "hall"),
+    ("Lavabo 1", "lavabo"),
+    ("N/A", "desinfection"),
+])
+def test_legacy_strings_round_trip_to_statuses(app, salle, template):
+    statuses = _statuses(app, template)
+    assert app.legacy_item_statuses(_legacy(app, salle, template, statuses)) == (template, statuses)
+
+
+def test_legacy_documents_are_decoded_as_stored(app):
+    assert app.decode_checklist_items({"taches_ok": "A, B", "taches_nok": "C"}) == ("A, B", "C")
+    assert app.decode_checklist_items({"taches": "A"}) == ("A", "")
+
+
+def test_encoded_documents_are_decoded_from_catalogue(app):
+    labels = app.catalogue_labels("hall")
+    item = {"items_v": 1, "items_tpl": "hall", "items": app.STATUS_OUI + app.STATUS_NA + app.STATUS_VIDE}
+    assert app.decode_checklist_items(item) == (
+        f"{labels[0]}, {labels[1]} (N/A)", f"{labels[2]} (Non renseigné)"
+    )
+
+
+def test_export_and_analytics_mix_old_and_new_documents(app):
+    statuses = _statuses(app, "salle")
+    old = _legacy(app, "Salle 1", "salle", statuses)
+    new = app._build_checklist_data("alice", "Matin", "Réa Enfant", "Salle 2", "salle", statuses, "")
+    app.storage.add("checklists", dict(old, timestamp=app.SERVER_TIMESTAMP))
+    app.storage.add("checklists", new)
+
+    today = date.today()
+    rows = [row for page in app.iter_export_pages("checklists", today, today) for row in page]
+    by_salle = {row["salle"]: row for row in rows}
+    assert (by_salle["Salle 1"]["taches_ok"], by_salle["Salle 1"]["taches_nok"]) == \
+        (by_salle["Salle 2"]["taches_ok"], by_salle["Salle 2"]["taches_nok"])
+
+    results = app.load_item_results(today, today)
+    per_salle = results.groupby("salle", observed=True)["status"].apply(lambda s: "".join(s.astype(str)))
+    assert per_salle["Salle 1"] == per_salle["Salle 2"] == statuses
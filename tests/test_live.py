@@ -0,0 +1,11 @@
+import threading
+
+
+def test_live_listener_starts_without_deadlock(app):
+    app.storage.add("journal", {"user": "alice", "message": "Premier message", "timestamp": app.SERVER_TIMESTAMP})
+    result = []
+    worker = threading.Thread(target=lambda: result.append(app._get_live_window("journal", 10)), daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive(), "le premier snapshot ne doit pas bloquer l'abonnement"
+    assert [item["message"] for item in result[0]] == ["Premier message"]
@@ -0,0 +1,28 @@
+import json
+import logging
+
+
+def test_instrumented_calls_emit_one_json_line(app, monkeypatch, capsys):
+    monkeypatch.setattr(app.metrics_logger, "handlers", [])
+    app._configure_metrics_logger()
+    try:
+        app._record_call("get_data_with_ids", 12.345, {"reads": 3, "writes": 0}, False)
+    finally:
+        app.metrics_logger.setLevel(logging.NOTSET)
+
+    lines = capsys.readouterr().err.strip().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0]) == {
+        "event": "call", "op": "get_data_with_ids", "ms": 12.35, "reads": 3, "writes": 0, "error": False,
+    }
+
+
+def test_logger_is_configured_once(app, monkeypatch):
+    monkeypatch.setattr(app.metrics_logger, "handlers", [])
+    try:
+        app._configure_metrics_logger()
+        app._configure_metrics_logger()
+        assert len(app.metrics_logger.handlers) == 1
+        assert app.metrics_logger.isEnabledFor(logging.INFO)
+    finally:
+        app.metrics_logger.setLevel(logging.NOTSET)
@@ -0,0 +1,75 @@
+import os
+from datetime import date, datetime
+
+import pytest
+
+
+@pytest.fixture
+def reports(app, tmp_path, monkeypatch, write_queue, drain):
+    monkeypatch.setattr(app, "REPORTS_DIR", str(tmp_path / "reports"))
+    return app
+
+
+def _round(app, drain, poste, *zones):
+    entries = []
+    for salle, statuses, obs in zones:
+        width = len(app.catalogue_labels("salle"))
+        entries.append(app._build_checklist_data(
+            "alice", poste, "Réa Enfant", salle, "salle", statuses.ljust(width, app.STATUS_OUI), obs
+        ))
+    app.enqueue_writes([("checklists", data) for data in entries])
+    drain()
+
+
+def test_report_lists_missing_zones_and_nonconformities(reports, drain):
+    app = reports
+    today = date.today().strftime("%Y-%m-%d")
+    _round(app, drain, "Matin", ("Salle A", app.STATUS_NON, "Aspiration HS"), ("Salle B", app.STATUS_OUI, ""))
+    _round(app, drain, "Après-midi", ("Salle C", app.STATUS_OUI, ""))
+
+    assert app.build_shift_reports(today, "Matin") == list(app.SECTOR_ZONES)
+    csv_text = app.read_shift_report(today, "Matin", "Réa Enfant", "CSV")
+    lines = csv_text.lstrip("﻿").splitlines()
+    assert len(lines) == 1 + len(app.SECTOR_ZONES["Réa Enfant"])
+    statut = {line.split(",")[0]: line.split(",")[1] for line in lines[1:]}
+    assert statut["Salle A"] == statut["Salle B"] == "faite"
+    assert statut["Salle C"] == "manquante", "la tournée de l'après-midi ne compte pas"
+
+    page = app.read_shift_report(today, "Matin", "Réa Enfant", "HTML")
+    assert "Aspiration HS" in page
+    assert app.catalogue_labels("salle")[0] in page
+    assert app.list_shift_reports() == {today: {"Matin": sorted(app.SECTOR_ZONES)}}
+
+
+def test_zone_checked_twice_keeps_the_latest_entry(app):
+    entries = [
+        {"salle": "Salle A", "heure": "09:00:00", "user": "alice", "nb_nok": 1, "observation": "avant"},
+        {"salle": "Salle A", "heure": "11:00:00", "user": "bob", "nb_nok": 0, "observation": "après"},
+        {"salle": "Box 9", "heure": "10:00:00", "user": "alice", "nb_nok": 0},
+    ]
+    rows = app._shift_report(["Salle A", "Salle B"], entries)
+    assert [(r["salle"], r["statut"]) for r in rows] == [
+        ("Salle A", "faite"), ("Salle B", "manquante"), ("Box 9", "faite"),
+    ]
+    assert rows[0]["observation"] == "après"
+
+
+@pytest.mark.parametrize("now, expected", [
+    (datetime(2024, 3, 2, 8, 0), [("2024-03-01", "Matin"), ("2024-03-01", "Après-midi")]),
+    (datetime(2024, 3, 2, 14, 10), [("2024-03-01", "Matin"), ("2024-03-01", "Après-midi")]),
+    (datetime(2024, 3, 2, 14, 20), [("2024-03-01", "Matin"), ("2024-03-01", "Après-midi"), ("2024-03-02", "Matin")]),
+])
+def test_due_shifts_wait_for_the_grace_period(app, now, expected):
+    assert list(app._due_shifts(now)) == expected
+
+
+def test_due_reports_are_written_once(reports, drain, monkeypatch):
+    app = reports
+    _round(app, drain, "Matin", ("Salle A", app.STATUS_OUI, ""))
+    now = datetime.combine(date.today(), app.SHIFT_END_TIMES["Matin"]).replace(minute=30)
+    first = app.run_due_reports(now)
+    assert first >= len(app.SECTOR_ZONES)
+    assert os.path.exists(app._report_path(date.today().strftime("%Y-%m-%d"), "Matin", "Réa Enfant", "HTML"))
+
+    monkeypatch.setattr(app, "build_shift_reports", lambda *args: pytest.fail("rapport déjà écrit"))
+    assert app.run_due_reports(now) == 0
@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+
+
+def _entry(app, salle, statuses, poste="Matin", service="Réa Enfant"):
+    return app._build_checklist_data("alice", poste, service, salle, "salle", statuses, "")
+
+
+def _rollups(app):
+    today = date.today()
+    app.load_rollups.clear()
+    table = app.load_rollups(today, today)
+    return {row["salle"]: row for row in table.to_dict("records")}
+
+
+@pytest.fixture
+def saved_round(app, write_queue, drain):
+    entries = [
+        _entry(app, "Salle A", app.STATUS_OUI + app.STATUS_NON + app.STATUS_NA),
+        _entry(app, "Salle B", app.STATUS_OUI * 2 + app.STATUS_VIDE),
+    ]
+    doc_ids = app.enqueue_writes([("checklists", data) for data in entries])
+    drain()
+    return doc_ids
+
+
+def test_rollups_are_incremented_with_each_entry(app, saved_round):
+    rollups = _rollups(app)
+    assert rollups["Salle A"]["rounds"] == 1
+    assert (rollups["Salle A"]["items_ok"], rollups["Salle A"]["items_nok"], rollups["Salle A"]["items_na"]) == (1, 1, 1)
+    assert (rollups["Salle B"]["items_ok"], rollups["Salle B"]["items_nok"]) == (2, 1)
+
+
+def test_delete_decrements_rollups_once(app, saved_round):
+    app.delete_document("checklists", saved_round[0])
+    app.delete_document("checklists", saved_round[0])
+
+    rollups = _rollups(app)
+    assert rollups["Salle A"]["rounds"] == 0
+    assert rollups["Salle A"]["items_nok"] == 0
+    assert rollups["Salle B"]["rounds"] == 1
+
+
+def test_concurrent_delete_does_not_replay_decrements(app, saved_round, monkeypatch):
+    """Deux sessions lisent la fiche avant que l'une d'elles ne la supprime"""
+    backend = app.get_storage()
+    snapshot = backend.get("checklists", saved_round[0])
+    monkeypatch.setattr(backend, "get", lambda collection, doc_id: snapshot)
+
+    app.delete_document("checklists", saved_round[0])
+    app.delete_document("checklists", saved_round[0])
+    assert _rollups(app)["Salle A"]["rounds"] == 0
+
+
+def test_rebuild_matches_incremental_rollups(app, saved_round):
+    app.delete_document("checklists", saved_round[1])
+    incremental = _rollups(app)
+
+    backend = app.get_storage()
+    backend.commit([("set", "rollups_daily", "parasite", {"date": date.today().strftime("%Y-%m-%d"), "rounds": 9}, False)])
+    today = date.today()
+    assert app.rebuild_rollups(today, today) == 1
+
+    rebuilt = _rollups(app)
+    assert set(rebuilt) == {"Salle A"}
+    for name in ("rounds", "items_ok", "items_nok", "items_na", "isolement"):
+        assert rebuilt["Salle A"][name] == incremental["Salle A"][name]
@@ -0,0 +1,11 @@
+def test_zone_check_reads_progress_past_the_cache(app, write_queue, drain):
+    data = app._build_checklist_data("alice", "Matin", "Réa Enfant", "Salle A", "salle", app.STATUS_OUI, "")
+    assert app.load_round_progress(data["date"], "Matin", "Réa Enfant") == {}
+
+    # Fiche envoyée par un autre appareil : le cache local de la progression ne le sait pas
+    app.get_storage().commit(
+        [("set", collection, doc_id, fields, True) for collection, doc_id, fields in app._round_progress_writes("autre", data)]
+    )
+    assert "Salle A" not in app.load_round_progress(data["date"], "Matin", "Réa Enfant")
+    assert app.zone_done_best_effort(data["date"], "Matin", "Réa Enfant", "Salle A")
+    assert not app.zone_done_best_effort(data["date"], "Matin", "Réa Enfant", "Salle B")
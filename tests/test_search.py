@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def search(app, tmp_path, monkeypatch, write_queue, drain):
+    monkeypatch.setattr(app, "SEARCH_INDEX_PATH", str(tmp_path / "search_index.sqlite3"))
+    return app
+
+
+def _checklist(app, salle, obs):
+    return ("checklists", app._build_checklist_data("alice", "Matin", "Réa Enfant", salle, "salle", app.STATUS_OUI, obs))
+
+
+def test_incremental_sync_reads_only_checklists_with_observation(search, drain, monkeypatch):
+    app = search
+    app.enqueue_writes([_checklist(app, "Salle A", "Respirateur à changer"), _checklist(app, "Salle B", "")])
+    app.enqueue_writes([("journal", {"user": "alice", "message": "Stock de gants épuisé"})])
+    drain()
+    assert not app.search_index_ready()
+    assert app.sync_search_index() == 2
+    assert app.search_index_ready()
+
+    backend = app.get_storage()
+    queries, iter_range = [], backend.iter_range
+
+    def recording_iter_range(collection, field, start, end, filters=None, **kwargs):
+        queries.append((collection, filters))
+        return iter_range(collection, field, start, end, filters=filters, **kwargs)
+
+    monkeypatch.setattr(backend, "iter_range", recording_iter_range)
+    app.enqueue_writes([_checklist(app, "Salle C", "Lavabo fuit"), _checklist(app, "Salle D", "")])
+    drain()
+    app.sync_search_index()
+
+    assert ("checklists", {"has_observation": True}) in queries
+    assert [item["salle"] for item in app.search_entries("lavabo")] == ["Salle C"]
+    assert [item["salle"] for item in app.search_entries("respirateur")] == ["Salle A"]
+    assert app.search_entries("gants")[0]["collection"] == "journal"
+
+
+def test_search_never_syncs_in_the_request(search, monkeypatch):
+    app = search
+    wake = threading.Event()
+    monkeypatch.setattr(app, "sync_search_index", lambda *args: pytest.fail("synchronisation dans la requête"))
+    monkeypatch.setattr(app, "start_search_indexer", lambda: {"wake": wake})
+    assert app.search_entries("respirateur") == []
+    assert wake.is_set()
+
+
+def test_local_writes_wake_the_indexer_for_their_collection_only(search, drain):
+    app = search
+    index = app._get_search_index()
+    app.sync_search_index()
+    index["versions"] = {name: app._get_write_version(name) for name in app._search_collections()}
+    index["synced_at"] = datetime.now().timestamp()
+    wake = app._get_search_wake()
+    wake.clear()
+    assert app._stale_search_collections(index) == []
+
+    app.enqueue_writes([("journal", {"user": "alice", "message": "Stock de gants épuisé"})])
+    drain()
+    assert wake.is_set()
+    assert app._stale_search_collections(index) == ["journal"]
+
+
+def test_index_is_resynced_after_the_fallback_interval(search):
+    app = search
+    index = app._get_search_index()
+    index["versions"] = {name: app._get_write_version(name) for name in app._search_collections()}
+    index["synced_at"] = datetime.now().timestamp() - app.SEARCH_SYNC_FALLBACK_SECONDS - 1
+    assert app._stale_search_collections(index) == app._search_collections()
+
+
+def test_empty_sync_queries_count_one_read(search, monkeypatch):
+    app = search
+    collections = app._search_collections()  # configuration des unités lue hors mesure
+    monkeypatch.setattr(app, "DIAGNOSTICS_ENABLED", True)
+    frame = {"reads": 0, "writes": 0}
+    app._metrics_frames().append(frame)
+    try:
+        app.sync_search_index()
+    finally:
+        app._metrics_frames().remove(frame)
+    assert frame["reads"] == len(collections)
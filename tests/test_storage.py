@@ -0,0 +1,57 @@
+import pytest
+
+import storage
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return storage.MemoryStorage()
+    return storage.SQLiteStorage(str(tmp_path / "documents.sqlite3"))
+
+
+def test_conditional_delete_rejects_the_whole_commit(backend):
+    backend.commit([("set", "compteurs", "c", {"n": 1}, False)])
+    ops = [
+        ("delete_existing", "fiches", "absente", None, None),
+        ("set", "compteurs", "c", {"n": storage.Increment(-1)}, True),
+    ]
+    with pytest.raises(storage.PreconditionFailed):
+        backend.commit(ops)
+    assert backend.get("compteurs", "c") == {"n": 1}
+
+
+def test_conditional_delete_of_existing_document(backend):
+    backend.commit([("set", "fiches", "f", {"x": 1}, False)])
+    backend.commit([("delete_existing", "fiches", "f", None, None)])
+    assert backend.get("fiches", "f") is None
+
+
+def test_latest_pages_break_timestamp_ties_by_id(backend):
+    backend.commit([("set", "journal", f"d{i:02}", {"timestamp": storage.SERVER_TIMESTAMP}, False) for i in range(7)])
+    first = backend.stream_latest("journal", 3)
+    second = backend.stream_latest("journal", 3, before=(first[-1]["timestamp"], first[-1]["id"]))
+    third = backend.stream_latest("journal", 3, before=(second[-1]["timestamp"], second[-1]["id"]))
+    assert [item["id"] for item in first + second + third] == [f"d{i:02}" for i in reversed(range(7))]
+
+
+def test_plain_delete_ignores_missing_documents(backend):
+    backend.commit([("delete", "fiches", "absente", None, None), ("set", "fiches", "f", {"x": 1}, False)])
+    assert backend.get("fiches", "f") == {"x": 1}
+
+
+def test_first_snapshot_counts_the_documents_it_contains():
+    backend = storage.MemoryStorage()
+    backend.add("journal", {"timestamp": storage.SERVER_TIMESTAMP})
+    snapshots = []
+    backend.watch_latest("journal", 50, lambda items, changed: snapshots.append((len(items), changed)))
+    assert snapshots == [(1, 1)]
+
+
+def test_backends_must_implement_the_interface():
+    class Incomplete(storage.Storage):
+        def get(self, collection, doc_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
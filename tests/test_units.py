@@ -0,0 +1,111 @@
+import threading
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def two_units(app, write_queue, drain):
+    app.save_unit("neo", "Néonatalogie", {"Néo": ["Box 1", "Box 2"]}, {"Box 1": "salle", "Box 2": "salle"})
+    for unit_id, service, salle in (("rea", "Réa Enfant", "Salle A"), ("neo", "Néo", "Box 1"), ("neo", "Néo", "Box 2")):
+        data = app._build_checklist_data("alice", "Matin", service, salle, "salle", app.STATUS_OUI, "")
+        app.enqueue_writes([(app.unit_collection("checklists", unit_id), data)])
+    drain()
+    return ["rea", "neo"]
+
+
+def test_each_unit_writes_its_own_collections(app, two_units):
+    backend = app.get_storage()
+    assert [item["salle"] for item in backend.stream_latest("checklists", 10)] == ["Salle A"]
+    assert {item["salle"] for item in backend.stream_latest("units/neo/checklists", 10)} == {"Box 1", "Box 2"}
+
+    today = date.today()
+    assert set(app.load_rollups(today, today, "rea")["salle"]) == {"Salle A"}
+    assert set(app.load_rollups(today, today, "neo")["salle"]) == {"Box 1", "Box 2"}
+    assert app.load_round_progress(today.strftime("%Y-%m-%d"), "Matin", "Néo", "neo").keys() == {"Box 1", "Box 2"}
+    assert app.unit_sectors("neo") == {"Néo": ["Box 1", "Box 2"]}
+
+
+def test_units_export_tags_rows_with_their_unit(app, two_units):
+    today = date.today()
+    rows = [row for page in app.iter_units_export_pages("checklists", two_units, today, today) for row in page]
+    assert sorted((row["unite"], row["salle"]) for row in rows) == [("neo", "Box 1"), ("neo", "Box 2"), ("rea", "Salle A")]
+
+
+def test_units_export_rejects_unit_scoped_filters(app, two_units):
+    today = date.today()
+    with pytest.raises(ValueError):
+        next(app.iter_units_export_pages("checklists", two_units, today, today, {"service": "Néo"}))
+
+
+def test_abandoned_units_export_stops_its_readers(app, monkeypatch):
+    produced, finished = [], threading.Event()
+
+    def endless_pages(collection_name, start_date, end_date, filters=None):
+        try:
+            for i in range(10_000):
+                produced.append(i)
+                yield [{"id": f"{collection_name}-{i}"}]
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(app, "iter_export_pages", endless_pages)
+    today = date.today()
+    pages = app.iter_units_export_pages("checklists", ["rea", "neo"], today, today)
+    next(pages)
+    pages.close()  # attend la fin des lecteurs
+
+    assert finished.is_set()
+    assert len(produced) < 100
+
+
+def test_unit_zones_use_configured_templates_and_item_lists(app):
+    app.save_unit(
+        "neo", "Néonatalogie", {"Néo": ["Box 1", "Couveuse 1"]},
+        {"Box 1": "salle", "Couveuse 1": "couveuse"},
+        {"couveuse": ["Couveuse propre", "Température vérifiée"]},
+    )
+    assert app.unit_zone_template("neo", "Box 1") == "salle"
+    assert app.unit_zone_template("neo", "Box 1", isolement_active=True) == "salle+isolement"
+    template = app.unit_zone_template("neo", "Couveuse 1")
+    assert template == "neo:couveuse@1"
+    assert app.catalogue_labels(template) == ["Couveuse propre", "Température vérifiée"]
+    assert app.unit_zone_template(app.DEFAULT_UNIT_ID, "Hall") == "hall"
+
+
+def test_edited_item_list_is_published_as_a_new_version(app):
+    sectors, templates = {"Néo": ["Couveuse 1"]}, {"Couveuse 1": "couveuse"}
+    app.save_unit("neo", "Néonatalogie", sectors, templates, {"couveuse": ["Couveuse propre"]})
+    old = app._build_checklist_data("alice", "Matin", "Néo", "Couveuse 1", app.unit_zone_template("neo", "Couveuse 1"),
+                                    app.STATUS_NON, "")
+
+    app.save_unit("neo", "Néonatalogie", sectors, templates, {"couveuse": ["Couveuse propre", "Alarme testée"]})
+    assert app.unit_zone_template("neo", "Couveuse 1") == "neo:couveuse@2"
+    assert app.decode_checklist_items(old) == ("", "Couveuse propre")
+
+    app.save_unit("neo", "Néonatalogie", sectors, templates, {"couveuse": ["Couveuse propre", "Alarme testée"]})
+    assert app.unit_zone_template("neo", "Couveuse 1") == "neo:couveuse@2", "liste inchangée : pas de version"
+
+
+@pytest.mark.parametrize("templates, items", [
+    ({"Box 1": "salle"}, {}),
+    ({"Box 1": "salle", "Box 2": "inconnu"}, {}),
+    ({"Box 1": "salle", "Box 2": "salle"}, {"hall": ["Item"]}),
+    ({"Box 1": "salle", "Box 2": "vide"}, {"vide": []}),
+])
+def test_save_rejects_zones_without_template(app, templates, items):
+    with pytest.raises(ValueError):
+        app.save_unit("neo", "Néonatalogie", {"Néo": ["Box 1", "Box 2"]}, templates, items)
+    assert app.get_storage().get(app.UNITS_COLLECTION, "neo") is None
+
+
+def test_save_replaces_removed_sectors(app):
+    app.save_unit("neo", "Néonatalogie", {"Néo": ["Box 1"], "Néo 2": ["Box 2"]}, {"Box 1": "salle", "Box 2": "salle"})
+    app.save_unit("neo", "Néonatalogie", {"Néo": ["Box 1"]}, {"Box 1": "salle", "Box 2": "salle"})
+
+    assert app.unit_sectors("neo") == {"Néo": ["Box 1"]}
+    assert app.get_unit("neo")["templates"] == {"Box 1": "salle"}
+
+
+def test_unit_config_is_the_parent_of_its_collections(app):
+    assert app.unit_collection("checklists", "neo").startswith(f"{app.UNITS_COLLECTION}/neo/")
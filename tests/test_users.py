@@ -0,0 +1,56 @@
+from datetime import datetime
+
+
+def test_failed_directory_load_is_retried_soon(app, monkeypatch):
+    backend = app.get_storage()
+    backend.commit([("set", app.USERS_COLLECTION, "alice", {"display_name": "Alice"}, False)])
+
+    def unavailable(collection):
+        raise ConnectionError("réseau indisponible")
+
+    monkeypatch.setattr(backend, "stream_all", unavailable)
+    assert app.load_user_directory() == {}
+    directory = app._get_user_directory()
+    assert directory["expires_at"] - datetime.now().timestamp() <= app.USER_DIRECTORY_RETRY_SECONDS
+
+    monkeypatch.undo()
+    directory["expires_at"] = 0.0  # délai de nouvel essai écoulé
+    assert app.load_user_directory()["alice"]["display_name"] == "Alice"
+
+
+def test_password_changed_elsewhere_takes_effect_at_once(app):
+    app.save_user("alice", "Alice", "soignant", password="ancien")
+    assert app.check_login_db("alice", "ancien")
+    app.load_user_directory()
+
+    # Changement fait par une autre instance : l'annuaire de ce processus n'est pas invalidé
+    app.get_storage().commit([("set", app.USERS_COLLECTION, "alice", {"password_hash": app.hash_password("nouveau")}, True)])
+    assert app.check_login_db("alice", "nouveau")
+    assert not app.check_login_db("alice", "ancien")
+
+
+def test_old_password_expires_with_the_cached_entry(app):
+    app.save_user("alice", "Alice", "soignant", password="ancien")
+    assert app.check_login_db("alice", "ancien")
+
+    app.get_storage().commit([("set", app.USERS_COLLECTION, "alice", {"password_hash": app.hash_password("nouveau")}, True)])
+    directory = app._get_user_directory()
+    directory["read_at"] = {"alice": datetime.now().timestamp() - app.USER_RECORD_MAX_AGE_SECONDS}
+    assert not app.check_login_db("alice", "ancien")
+
+
+def test_login_with_a_recent_cached_entry_reads_nothing(app, monkeypatch):
+    app.save_user("alice", "Alice", "soignant", password="secret")
+    assert app.check_login_db("alice", "secret")
+
+    def unexpected_read(collection, doc_id):
+        raise AssertionError("le compte ne doit pas être relu")
+
+    monkeypatch.setattr(app.get_storage(), "get", unexpected_read)
+    assert app.check_login_db("alice", "secret")
+
+
+def test_unknown_account_created_elsewhere_is_read_at_login(app):
+    app.load_user_directory()
+    app.get_storage().commit([("set", app.USERS_COLLECTION, "bob", {"password_hash": app.hash_password("pwd")}, False)])
+    assert app.check_login_db("bob", "pwd")
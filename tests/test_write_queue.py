@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def commits(app, monkeypatch):
+    """Enregistre les opérations de chaque commit envoyé au backend"""
+    backend = app.get_storage()
+    sent, commit = [], backend.commit
+
+    def recording_commit(ops):
+        sent.append(list(ops))
+        commit(ops)
+
+    monkeypatch.setattr(backend, "commit", recording_commit)
+    return sent
+
+
+def _journal(message):
+    return ("journal", {"user": "alice", "message": message})
+
+
+def test_round_is_never_split_across_commits(app, write_queue, drain, commits):
+    app.enqueue_writes([_journal("seul")])
+    round_ids = app.enqueue_writes([_journal(f"zone {i}") for i in range(app.WRITE_QUEUE_BATCH_SIZE + 20)])
+    app.enqueue_writes([_journal("après")])
+    drain()
+
+    assert len(commits) == 3
+    assert [len(ops) for ops in commits] == [1, app.WRITE_QUEUE_BATCH_SIZE + 20, 1]
+    assert {op[2] for op in commits[1]} == set(round_ids)
+    assert app.get_pending_write_stats() == {"pending": 0, "failing": 0, "dead": 0}
+
+
+def test_small_rounds_share_a_commit(app, write_queue, drain, commits):
+    for i in range(3):
+        app.enqueue_writes([_journal(f"{i}-a"), _journal(f"{i}-b")])
+    drain()
+    assert [len(ops) for ops in commits] == [6]
+
+
+def test_poison_write_is_dead_lettered_without_blocking_others(app, write_queue, drain, commits, monkeypatch):
+    monkeypatch.setattr(app, "WRITE_QUEUE_RETRY_MAX_SECONDS", 0)
+    (poison_id,) = app.enqueue_writes([_journal("rejeté")])
+    backend = app.get_storage()
+    commit = backend.commit
+
+    def rejecting_commit(ops):
+        if any(op[2] == poison_id for op in ops):
+            raise ValueError("document invalide")
+        commit(ops)
+
+    monkeypatch.setattr(backend, "commit", rejecting_commit)
+    (healthy_id,) = app.enqueue_writes([_journal("valide")])
+    for _ in range(app.WRITE_QUEUE_MAX_ATTEMPTS + 2):
+        drain()
+
+    assert backend.get("journal", healthy_id) is not None
+    assert app.get_pending_write_stats() == {"pending": 0, "failing": 0, "dead": 1}
+    (dead,) = app.list_dead_writes()
+    assert dead["doc_id"] == poison_id
+    assert dead["attempts"] == app.WRITE_QUEUE_MAX_ATTEMPTS
+    assert "document invalide" in dead["last_error"]
+
+    monkeypatch.setattr(backend, "commit", commit)
+    app.retry_dead_writes()
+    drain()
+    assert backend.get("journal", poison_id) is not None
+    assert app.get_pending_write_stats()["dead"] == 0
+
+
+def test_discard_waits_for_in_flight_commit(app, write_queue, monkeypatch):
+    (doc_id,) = app.enqueue_writes([_journal("en vol")])
+    backend = app.get_storage()
+    commit, started, release = backend.commit, threading.Event(), threading.Event()
+
+    def slow_commit(ops):
+        started.set()
+        release.wait(5)
+        commit(ops)
+
+    monkeypatch.setattr(backend, "commit", slow_commit)
+    sender = threading.Thread(target=app._drain_write_queue_once, args=(write_queue,))
+    sender.start()
+    assert started.wait(5)
+
+    deleter = threading.Thread(target=app.delete_document, args=("journal", doc_id))
+    deleter.start()
+    deleter.join(0.2)
+    assert deleter.is_alive(), "la suppression doit attendre la fin de l'envoi"
+
+    release.set()
+    sender.join(5)
+    deleter.join(5)
+    assert not deleter.is_alive()
+    assert backend.get("journal", doc_id) is None
+